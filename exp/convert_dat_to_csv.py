@@ -1,77 +1,198 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import csv
+import hashlib
+import json
+import os
 
 
 # Set this to the folder (under exp/) that contains your .dat files.
 SOURCE_SUBFOLDER = "data_written"
 
 MIN_TAB_COLUMNS = 10
+MANIFEST_NAME = ".convert_manifest.json"
+HASH_CHUNK_SIZE = 1 << 20
 
 
-def find_table_start(lines: list[str], min_cols: int = MIN_TAB_COLUMNS) -> tuple[int, int]:
-    """Return (header_idx, n_cols) for the first tabular section."""
-    for i, line in enumerate(lines):
-        parts = line.rstrip("\n").split("\t")
-        if len(parts) < min_cols:
-            continue
-        for j in range(i + 1, len(lines)):
-            next_line = lines[j].strip()
-            if not next_line:
-                continue
-            if len(lines[j].rstrip("\n").split("\t")) == len(parts):
-                return i, len(parts)
-            break
-    raise ValueError("Could not find a tabular header line in .dat file.")
-
-
-def convert_one(dat_path: Path, out_csv: Path) -> None:
-    with dat_path.open("r", encoding="utf-8", errors="replace") as f:
-        lines = f.readlines()
-
-    header_idx, n_cols = find_table_start(lines)
+def iter_table_rows(lines, min_cols: int = MIN_TAB_COLUMNS):
+    """Yield the header and data rows of the first tabular section, one line at a time.
 
-    rows = []
-    for raw in lines[header_idx:]:
+    The header is the first line with at least min_cols fields whose next
+    non-empty line has the same number of fields.
+    """
+    header = None
+    candidate = None
+    for raw in lines:
         stripped = raw.strip()
-        if not stripped:
+        parts = raw.rstrip("\r\n").split("\t")
+        if header is None:
+            if candidate is not None:
+                if not stripped:
+                    continue
+                if len(parts) == len(candidate):
+                    header = candidate
+                    yield header
+                    yield parts
+                    continue
+                candidate = None
+            if len(parts) >= min_cols:
+                candidate = parts
+            continue
+        if stripped and len(parts) == len(header):
+            yield parts
+    if header is None:
+        raise ValueError("Could not find a tabular header line in .dat file.")
+
+
+def _decoded_lines(fp, digest):
+    """Yield text lines of a binary file while feeding the raw bytes to digest."""
+    for raw in fp:
+        digest.update(raw)
+        yield raw.decode("utf-8", errors="replace")
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def convert_one(dat_path: Path, out_csv: Path) -> str:
+    """Convert one .dat file, streaming it line by line. Returns the sha256 of the .dat content."""
+    digest = hashlib.sha256()
+    tmp_csv = out_csv.with_name(out_csv.name + ".tmp")
+    try:
+        with dat_path.open("rb") as src, tmp_csv.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerows(iter_table_rows(_decoded_lines(src, digest)))
+        os.replace(tmp_csv, out_csv)
+    finally:
+        if tmp_csv.exists():
+            tmp_csv.unlink()
+    return digest.hexdigest()
+
+
+def _convert_task(dat_path: Path, out_csv: Path) -> tuple[str, str | None, str | None]:
+    """Worker entry point: (dat path, content hash or None, error message or None)."""
+    try:
+        return str(dat_path), convert_one(dat_path, out_csv), None
+    except Exception as e:
+        return str(dat_path), None, str(e)
+
+
+def load_manifest(out_dir: Path) -> dict:
+    path = out_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(out_dir: Path, manifest: dict) -> None:
+    path = out_dir / MANIFEST_NAME
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def convert_all(source_dir: Path, out_dir: Path, jobs: int | None = None, force: bool = False) -> dict:
+    """Convert every .dat under source_dir whose content changed since the last run.
+
+    The manifest in out_dir records (size, mtime, sha256) per .dat file. A file is
+    skipped when size and mtime match; when only the mtime moved, its hash is
+    compared before converting again. A CSV that exists without a manifest entry
+    (written before the manifest, or by hand) is kept and its .dat recorded as is;
+    force=True converts everything again. CSVs are named by the .dat stem, so a .dat
+    whose stem was already taken by another file is skipped. Conversions run in a
+    process pool.
+    """
+    source_dir = Path(source_dir)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {} if force else load_manifest(out_dir)
+
+    summary = {"converted": 0, "unchanged": 0, "errors": 0, "duplicates": 0, "total": 0}
+    todo = []
+    csv_owner = {}  # CSV name -> key of the .dat that writes it
+    for dat_path in sorted(source_dir.rglob("*.dat")):
+        summary["total"] += 1
+        key = dat_path.relative_to(source_dir).as_posix()
+        out_csv = out_dir / f"{dat_path.stem}.csv"
+        if out_csv.name in csv_owner:
+            summary["duplicates"] += 1
+            print(f"Skip (duplicate name): {key} -> {out_csv.name} already written for {csv_owner[out_csv.name]}")
+            continue
+        csv_owner[out_csv.name] = key
+        stat = dat_path.stat()
+        entry = manifest.get(key)
+        if entry is None and out_csv.exists() and not force:
+            manifest[key] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": file_digest(dat_path),
+                "csv": out_csv.name,
+            }
+            summary["unchanged"] += 1
             continue
-        parts = raw.rstrip("\n").split("\t")
-        if len(parts) == n_cols:
-            rows.append(parts)
+        if entry is not None and out_csv.exists():
+            if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                summary["unchanged"] += 1
+                continue
+            if entry["size"] == stat.st_size and file_digest(dat_path) == entry["sha256"]:
+                entry["mtime_ns"] = stat.st_mtime_ns  # touched, not changed
+                summary["unchanged"] += 1
+                continue
+        todo.append((key, dat_path, out_csv, stat))
+
+    if todo:
+        if jobs == 1 or len(todo) == 1:
+            results = [_convert_task(dat_path, out_csv) for _, dat_path, out_csv, _ in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(_convert_task, [t[1] for t in todo], [t[2] for t in todo]))
+        for (key, dat_path, out_csv, stat), (_, sha, error) in zip(todo, results):
+            if error is not None:
+                summary["errors"] += 1
+                manifest.pop(key, None)
+                print(f"Skip (error): {dat_path.name} -> {error}")
+                continue
+            manifest[key] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha,
+                "csv": out_csv.name,
+            }
+            summary["converted"] += 1
 
-    with out_csv.open("w", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerows(rows)
+    save_manifest(out_dir, manifest)
+    return summary
 
 
-def main() -> None:
+def main(argv: list[str] | None = None) -> None:
     exp_dir = Path(__file__).resolve().parent
-    source_dir = exp_dir / SOURCE_SUBFOLDER
-    out_dir = source_dir / "extracted data"
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    dat_files = sorted(source_dir.rglob("*.dat"))
-    if not dat_files:
+    parser = argparse.ArgumentParser(description="Convert experiment .dat files to CSV (only new or changed files).")
+    parser.add_argument("--source", type=Path, default=exp_dir / SOURCE_SUBFOLDER, help="folder searched recursively for .dat files")
+    parser.add_argument("--out", type=Path, default=None, help="output folder (default: <source>/extracted data)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count, 1 = no pool)")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and convert everything")
+    args = parser.parse_args(argv)
+
+    source_dir = args.source
+    out_dir = args.out or source_dir / "extracted data"
+    if not any(source_dir.rglob("*.dat")):
         print(f"No .dat files found in: {source_dir}")
         return
 
-    converted = 0
-    skipped_existing = 0
-    skipped_error = 0
-
-    for dat_path in dat_files:
-        out_csv = out_dir / f"{dat_path.stem}.csv"
-        if out_csv.exists():
-            skipped_existing += 1
-            continue
-        try:
-            convert_one(dat_path, out_csv)
-            converted += 1
-        except Exception as e:
-            skipped_error += 1
-            print(f"Skip (error): {dat_path.name} -> {e}")
-
-    print(f"Done. Converted: {converted}, skipped existing: {skipped_existing}, skipped errors: {skipped_error}")
+    summary = convert_all(source_dir, out_dir, jobs=args.jobs, force=args.force)
+    print(
+        f"Done. Converted: {summary['converted']}, unchanged: {summary['unchanged']}, "
+        f"skipped errors: {summary['errors']}, skipped duplicate names: {summary['duplicates']}"
+    )
     print(f"Output folder: {out_dir}")
 
 
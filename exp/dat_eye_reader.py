@@ -0,0 +1,140 @@
+from pathlib import Path
+from collections import namedtuple
+import argparse
+import os
+
+import numpy as np
+
+from convert_dat_to_csv import MIN_TAB_COLUMNS, SOURCE_SUBFOLDER
+
+
+# Last per-trial column before the eye samples in the legacy paradigm's .dat files
+EYE_COUNT_COLUMN = "NumberEyeSamples"
+EYE_FIELDS = ("EyeT", "EyeX", "EyeY", "EyeP")
+INITIAL_TRIAL_CAPACITY = 64
+
+# One session: per-trial columns (name -> list of strings), eye samples (n_trials, n_samples, 4)
+# with NaN after each trial's last sample, and the number of samples of each trial
+EyeSession = namedtuple("EyeSession", ["columns", "samples", "counts"])
+
+
+def _find_eye_header(fp):
+    """Skip the .dat preamble; return the header fields of the trial table (as strings)."""
+    for raw in fp:
+        parts = raw.rstrip(b"\r\n").split(b"\t")
+        if len(parts) >= MIN_TAB_COLUMNS and EYE_COUNT_COLUMN.encode() in parts:
+            return [p.decode("utf-8", errors="replace") for p in parts]
+    raise ValueError(f"Could not find a tabular header with a {EYE_COUNT_COLUMN} column in .dat file.")
+
+
+def _sample_count(fields, samples):
+    """Number of recorded samples: NumberEyeSamples, or the last non-zero EyeT if it is unusable.
+
+    Padded samples are written as EyeX - DriftCorrectX, so only EyeT is reliably
+    zero after the last recorded sample.
+    """
+    try:
+        count = int(fields[EYE_COUNT_COLUMN])
+    except ValueError:
+        count = -1
+    if 0 <= count <= len(samples):
+        return count
+    nonzero = np.flatnonzero(samples[:, 0])
+    return int(nonzero[-1]) + 1 if nonzero.size else 0
+
+
+def _iter_rows(fp, header):
+    """Yield (fields, samples) for the rows after header, reusing one sample buffer."""
+    n_fields = header.index(EYE_COUNT_COLUMN) + 1
+    names = header[:n_fields]
+    n_tabs = len(header) - 1
+    buffer = np.zeros(((len(header) - n_fields) // len(EYE_FIELDS), len(EYE_FIELDS)))
+    flat = buffer.reshape(-1)
+    for raw in fp:
+        if raw.count(b"\t") != n_tabs or not raw.strip():
+            continue
+        parts = raw.split(b"\t", n_fields)
+        fields = dict(zip(names, (p.decode("utf-8", errors="replace") for p in parts[:n_fields])))
+        if flat.size:
+            values = np.fromstring(parts[n_fields], sep="\t")
+            if values.size < flat.size:
+                raise ValueError(f"Trial row with unreadable eye samples: expected {flat.size} values, parsed {values.size}.")
+            flat[:] = values[:flat.size]
+        yield fields, buffer[:_sample_count(fields, buffer)]
+
+
+def iter_eye_trials(dat_path: Path):
+    """Yield (fields, samples) per trial while holding one row of eye data in memory.
+
+    fields maps the per-trial column names (everything up to NumberEyeSamples) to
+    their string values. samples is a (count, 4) float view of a buffer that is
+    reused for the next trial - copy it if it has to outlive the iteration.
+    Eye values are parsed straight from the raw bytes with np.fromstring, so the
+    ~8000 sample fields of a row never become Python strings.
+    """
+    with Path(dat_path).open("rb") as fp:
+        yield from _iter_rows(fp, _find_eye_header(fp))
+
+
+def read_eye_dat(dat_path: Path) -> EyeSession:
+    """Read a whole session into one (n_trials, n_samples, 4) block.
+
+    The block is allocated at full row width and grown by doubling along the
+    trial axis; n_samples is then trimmed to the longest trial so the trailing
+    zero padding of the fixed-width rows is dropped.
+    """
+    with Path(dat_path).open("rb") as fp:
+        header = _find_eye_header(fp)
+        width = (len(header) - header.index(EYE_COUNT_COLUMN) - 1) // len(EYE_FIELDS)
+        columns = {name: [] for name in header[:header.index(EYE_COUNT_COLUMN) + 1]}
+        samples = np.full((INITIAL_TRIAL_CAPACITY, width, len(EYE_FIELDS)), np.nan)
+        counts = np.zeros(INITIAL_TRIAL_CAPACITY, dtype=np.int64)
+        n = 0
+        for fields, trial_samples in _iter_rows(fp, header):
+            if n == len(counts):
+                samples = np.concatenate([samples, np.full_like(samples, np.nan)])
+                counts = np.concatenate([counts, np.zeros_like(counts)])
+            for name, value in fields.items():
+                columns[name].append(value)
+            samples[n, :len(trial_samples)] = trial_samples
+            counts[n] = len(trial_samples)
+            n += 1
+
+    counts = counts[:n]
+    return EyeSession(columns, samples[:n, :int(counts.max(initial=0))].copy(), counts)
+
+
+def save_eye_session(session: EyeSession, out_path: Path) -> None:
+    """Write a session as .npz: the trial columns, EyeSamples and EyeSampleCounts (atomic replace)."""
+    out_path = Path(out_path)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    arrays = {name: np.array(values, dtype=np.str_) for name, values in session.columns.items()}
+    arrays["EyeSamples"] = session.samples
+    arrays["EyeSampleCounts"] = session.counts
+    with tmp_path.open("wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, out_path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    exp_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Extract the eye samples of legacy .dat files into .npz blocks.")
+    parser.add_argument("--source", type=Path, default=exp_dir / SOURCE_SUBFOLDER, help="folder searched recursively for .dat files")
+    parser.add_argument("--out", type=Path, default=None, help="output folder (default: <source>/extracted data)")
+    args = parser.parse_args(argv)
+
+    source_dir = args.source
+    out_dir = args.out or source_dir / "extracted data"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for dat_path in sorted(source_dir.rglob("*.dat")):
+        try:
+            session = read_eye_dat(dat_path)
+        except Exception as e:
+            print(f"Skip (error): {dat_path.name} -> {e}")
+            continue
+        save_eye_session(session, out_dir / f"{dat_path.stem}_eye.npz")
+        print(f"{dat_path.name}: {len(session.counts)} trials, up to {session.samples.shape[1]} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Response box emulator on a Linux pseudo-terminal, for running and benchmarking the serial paths without hardware
+
+Serve a box (point testmain.py / test_*_box.py at it with RESPONSE_BOX_PORT):
+    python emulate_response_box.py --device self-made --interval 0.8 --jitter 0.2
+    RESPONSE_BOX_PORT=/tmp/response-box python testmain.py
+
+Benchmark the response path (pty -> reader thread -> parser) and the parser alone:
+    python emulate_response_box.py --device self-made --bench 2000 --burst 5 --burst-rate 500
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import tty
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from box_emulator import CedrusEmulator, ResponseBoxEmulator
+from response_device import CedrusPacketParser, SelfMadeLineParser, SerialResponseReader
+
+PORT_ENV = "RESPONSE_BOX_PORT"  # String: environment variable the port-discovery functions honour
+DEFAULT_LINK = "/tmp/response-box"  # String: symlink to the pty slave
+SELF_MADE_PINS = (6, 7, 8, 9)  # Tuple: pins of the self-made box (testmain.SELF_MADE_PIN_TO_COLOR_ID)
+CEDRUS_BUTTONS = (1, 2, 3, 4)  # Tuple: buttons used on the Cedrus box
+
+
+class PtyBridge:
+    """
+    Connect an emulator to the master side of a pty
+
+    Host writes arrive on the master fd and are passed to emulator.write(); bytes
+    the emulator queues are written to the master fd, optionally with line noise
+    (each byte replaced by a random one with probability noise).
+    """
+
+    def __init__(self, emulator, noise=0.0, seed=None):
+        """
+        Args:
+            emulator: ResponseBoxEmulator or CedrusEmulator - device behaviour
+            noise: Float - probability that a byte is corrupted on the way to the host
+            seed: Integer or None - seed of the noise generator
+        """
+        self.emulator = emulator
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.slave_name = os.ttyname(self.slave)
+        self.corrupted_bytes = 0  # Integer: bytes replaced by noise
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.emulator.timeout = 0.05
+        for target, name in ((self._host_to_device, "pty-in"), (self._device_to_host, "pty-out")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.emulator.close()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _host_to_device(self):
+        os.set_blocking(self.master, False)
+        while not self._stop.is_set():
+            try:
+                data = os.read(self.master, 256)
+            except BlockingIOError:
+                time.sleep(0.0002)
+                continue
+            except OSError:
+                return
+            self.emulator.write(data)
+
+    def _device_to_host(self):
+        while not self._stop.is_set():
+            data = self.emulator.read(self.emulator.in_waiting or 1)
+            if not data:
+                continue
+            if self.noise > 0:
+                data = bytearray(data)
+                for i in range(len(data)):
+                    if self.rng.random() < self.noise:
+                        data[i] = self.rng.randrange(256)
+                        self.corrupted_bytes += 1
+            try:
+                os.write(self.master, data)
+            except OSError:
+                return
+
+
+def make_emulator(args):
+    if args.device == "cedrus":
+        return CedrusEmulator()
+    return ResponseBoxEmulator(binary=not args.ascii, drift_ppm=args.drift_ppm)
+
+
+def press_times(n_presses, interval, jitter, burst, burst_rate, rng):
+    """
+    Yield the offsets (seconds from the start) of n_presses presses
+
+    Bursts of burst presses burst_rate per second apart start every interval
+    seconds, plus Gaussian jitter (SD jitter) per burst.
+    """
+    sent = 0
+    start = 0.0
+    while sent < n_presses:
+        start += max(0.0, rng.gauss(interval, jitter))
+        for i in range(min(burst, n_presses - sent)):
+            yield start + i / burst_rate
+            sent += 1
+
+
+def press(emulator, device, rng):
+    if device == "cedrus":
+        emulator.press(rng.choice(CEDRUS_BUTTONS))
+    else:
+        emulator.press(rng.choice(SELF_MADE_PINS))
+
+
+def serve(args):
+    rng = random.Random(args.seed)
+    emulator = make_emulator(args)
+    bridge = PtyBridge(emulator, args.noise, args.seed).start()
+    if os.path.lexists(args.link):
+        os.remove(args.link)
+    os.symlink(bridge.slave_name, args.link)
+    print(f"Emulating {args.device} on {bridge.slave_name} (symlink {args.link}).")
+    print(f"Run the experiment with {PORT_ENV}={args.link}; Ctrl+C to quit.")
+    try:
+        start = time.perf_counter()
+        if args.interval > 0:
+            for offset in press_times(sys.maxsize, args.interval, args.jitter, args.burst, args.burst_rate, rng):
+                time.sleep(max(0.0, start + offset - time.perf_counter()))
+                press(emulator, args.device, rng)
+        else:
+            while True:
+                time.sleep(1.0)
+    except KeyboardInterrupt:
+        print("\nDone.")
+    finally:
+        bridge.stop()
+        os.remove(args.link)
+
+
+def _percentiles(values_ms):
+    values = np.asarray(values_ms)
+    return "median %.3f ms, p95 %.3f ms, p99 %.3f ms, max %.3f ms" % (
+        np.median(values), np.percentile(values, 95), np.percentile(values, 99), values.max(),
+    )
+
+
+def bench_path(args):
+    """End-to-end latency: emulator press -> pty -> SerialResponseReader event"""
+    import serial
+
+    rng = random.Random(args.seed)
+    emulator = make_emulator(args)
+    bridge = PtyBridge(emulator, args.noise, args.seed).start()
+    box = serial.Serial(bridge.slave_name, baudrate=115200, timeout=0.001)
+    parser = CedrusPacketParser() if args.device == "cedrus" else SelfMadeLineParser()
+    reader = SerialResponseReader(box, parser).start()
+    reader.send_sync()
+
+    latencies = []
+    received = 0
+    start = time.perf_counter()
+    for offset in press_times(args.bench, args.interval, args.jitter, args.burst, args.burst_rate, rng):
+        time.sleep(max(0.0, start + offset - time.perf_counter()))
+        sent = time.perf_counter()
+        press(emulator, args.device, rng)
+        event = reader.get(timeout=0.5)
+        if event is not None:
+            received += 1
+            latencies.append((event.host_time - sent) * 1000)
+        while reader.get(timeout=0) is not None:  # Burst presses already queued
+            received += 1
+    reader.stop()
+    box.close()
+    bridge.stop()
+
+    print(f"Response path ({args.device}, {args.bench} presses, noise {args.noise}):")
+    print(f"  events received: {received} / {args.bench}, bytes corrupted: {bridge.corrupted_bytes}")
+    if latencies:
+        print(f"  press -> reader event latency: {_percentiles(latencies)}")
+    if args.device != "cedrus":
+        print(f"  link stats: {parser.link_stats()}")
+
+
+def bench_parser(args, n_events=200000, chunk=64):
+    """Parser throughput on a pre-built byte stream fed in serial-read-sized chunks"""
+    rng = random.Random(args.seed)
+    if args.device == "cedrus":
+        source = CedrusEmulator()
+        for _ in range(n_events):
+            source.press(rng.choice(CEDRUS_BUTTONS))
+        parser = CedrusPacketParser()
+    else:
+        source = ResponseBoxEmulator(binary=not args.ascii)
+        for _ in range(n_events):
+            source.press(rng.choice(SELF_MADE_PINS), rng.randrange(100000, 2000000))
+        parser = SelfMadeLineParser()
+    stream = source.read(source.in_waiting)
+    start = time.perf_counter()
+    decoded = 0
+    for pos in range(0, len(stream), chunk):
+        decoded += len(parser.feed(stream[pos:pos + chunk], 0.0))
+    elapsed = time.perf_counter() - start
+    print(f"Parser ({type(parser).__name__}, {len(stream)} bytes in {chunk}-byte reads):")
+    print(f"  {decoded} events in {elapsed:.3f} s = {decoded / elapsed:,.0f} events/s, "
+          f"{len(stream) / elapsed / 1e6:.2f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response box emulator on a pseudo-terminal.")
+    parser.add_argument("--device", choices=["self-made", "cedrus"], default="self-made")
+    parser.add_argument("--ascii", action="store_true", help="self-made: send legacy ASCII lines instead of binary frames")
+    parser.add_argument("--interval", type=float, default=0.0, help="seconds between (bursts of) presses; 0 = no presses")
+    parser.add_argument("--jitter", type=float, default=0.0, help="SD of the interval (seconds)")
+    parser.add_argument("--burst", type=int, default=1, help="presses per burst")
+    parser.add_argument("--burst-rate", type=float, default=1000.0, help="presses per second within a burst")
+    parser.add_argument("--noise", type=float, default=0.0, help="probability that a byte is corrupted")
+    parser.add_argument("--drift-ppm", type=float, default=0.0, help="self-made: device clock drift (ppm)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--link", default=DEFAULT_LINK, help="symlink created to the pty slave")
+    parser.add_argument("--bench", type=int, default=0, help="run a benchmark with this many presses instead of serving")
+    args = parser.parse_args()
+    if args.bench:
+        if args.interval <= 0:
+            args.interval = 0.01
+        bench_path(args)
+        bench_parser(args)
+    else:
+        serve(args)
+
+
+if __name__ == "__main__":
+    main()
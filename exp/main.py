@@ -2,15 +2,17 @@
 Main experiment script for Cued Color Response Paradigm (CCRP)
 """
 from psychopy import core, visual, event
+from psychopy.tools.monitorunittools import deg2pix
 import sys
 import os
 import random as rnd
+import numpy as np
 from numpy import random
 
 # Add src directory to path - allows importing modules from src folder
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))  # String: add "exp/src" to Python path
 
-from config import EXPERIMENT_CONFIG, WINDOW_CONFIG  # Import: configuration settings
+from config import EXPERIMENT_CONFIG, WINDOW_CONFIG, DISPLAY_CACHE_CONFIG  # Import: configuration settings
 from experiment_params import (
     ExpCueSet, PracCueSet, ExpCueSetVal, PracCueSetVal,  # Lists: cue combinations
     ExpCueSOAconds, PracCueSOAconds, ExpStimED, PracStimED,  # Integers/lists: timing parameters
@@ -20,10 +22,17 @@ from experiment_params import (
     ResponseKeys, TrialStartJitterOffsetTime, TrialStartJitterMeanTime, TrialStartJitterMaxTime,  # Lists/floats: response and timing
     PracShowAllTargets, PracCueArrowResponseAssociations, CueBgColor  # Lists/floats: practice session display settings and colors
 )
-from display import setup_monitor, create_window  # Functions: window setup
+from display import setup_monitor, create_window, measure_refresh_rate  # Functions: window setup
+from capture_pool import CapturePool  # Class: reusable textures for full-window captures
+from display_cache import DisplayCache  # Class: pre-rendered cue/color displays
+from feedback_text import GlyphAtlas, TextCache, TextLine  # Classes: pre-rendered feedback text
+from frame_scheduler import FrameScheduler  # Class: frame-locked phase presentation
 from stimuli import create_cue_locations, create_target_locations, create_stimuli  # Functions: stimulus creation
 from trial import generate_block_trials  # Function: trial generation
-from data_handler import create_data_file, save_trial_data  # Functions: data file management
+from data_handler import (  # Functions: data file management
+    create_data_file, create_timing_file, create_texture_file, save_trial_data, save_phase_timing, save_texture_stats
+)
+from session_plan import derive_seed, trial_list_hash  # Functions: reproducible seed per subject/session, session hash
 
 # Initialize clock - monotonic clock for precise timing
 trial_clock = core.monotonicClock  # Clock: system clock that always increases
@@ -32,10 +41,9 @@ trial_clock = core.monotonicClock  # Clock: system clock that always increases
 mon = setup_monitor()  # Monitor: configured monitor object
 win = create_window(mon)  # Window: display window object
 
-# Get refresh rate and timing parameters
-# refresh_rate = 100  # Integer: screen refresh rate in Hz (100 Hz = 10ms per frame)
-# delta_t = (1 / refresh_rate) / 2  # Float: timing adjustment in seconds (0.005 = 5ms)
-# isi = StaticPeriod(None)  # StaticPeriod: object for precise frame timing
+# Get refresh rate - timed phases (jitter, feedback) last a whole number of frames
+refresh_rate = measure_refresh_rate(win)  # Float: screen refresh rate in Hz (100 Hz = 10ms per frame)
+scheduler = FrameScheduler(win, refresh_rate)  # FrameScheduler: flips frame by frame, records phase timing
 
 # Generate stimulus locations
 cue_locations = create_cue_locations()  # List: [[x1,y1], [x2,y2], [x3,y3], [x4,y4]] cue positions
@@ -44,6 +52,18 @@ target_locations = create_target_locations()  # List: [[x1,y1], [x2,y2], [x3,y3]
 # Create stimuli objects
 stimuli = create_stimuli(win, cue_locations, target_locations)  # Dict: all stimulus objects
 
+# Feedback text - rendered once here, never re-laid out per trial
+FEEDBACK_HEIGHT = 0.5  # Float: feedback text height in degrees
+FEEDBACK_LINE_OFFSET = 0.35  # Float: vertical distance of each feedback line from the center in degrees
+feedback_outcomes = TextCache(  # TextCache: every "expected / max" reward string, pre-rendered
+    win,
+    [f"{e} / {m}" for e in range(sum(CueValue) + 1) for m in [0] + CueValue],
+    FEEDBACK_HEIGHT, (0, FEEDBACK_LINE_OFFSET), (1, 1, 1),
+)
+feedback_total = TextLine(  # TextLine: cumulative reward, composed from cached digit glyphs
+    win, GlyphAtlas(deg2pix(FEEDBACK_HEIGHT, win.monitor)), (0, -FEEDBACK_LINE_OFFSET), (1, 1, 1),
+)
+
 # Determine session type - practice or experimental
 session = EXPERIMENT_CONFIG['session']  # Integer: session number (1-5 = practice, 6+ = experimental)
 no_prac_sessions = len(PracCueSet)  # Integer: number of practice sessions (5)
@@ -65,11 +85,19 @@ else:  # Experimental session
     no_blocks = ExpNoBlocks  # Integer: number of blocks (4)
     repetitions = ExpRepetitions  # Integer: repetitions per condition (5)
 
-# Generate all trials
-all_trials = []  # List: will contain all Trial objects
+# Seed both random sources - same subject/session (or configured seed) gives the same trials and jitter
+seed = EXPERIMENT_CONFIG['seed']  # Integer or None: configured seed
+if seed is None:
+    seed = derive_seed(EXPERIMENT_CONFIG['subject'], session)  # Integer: derived from subject and session
+rnd.seed(seed)  # Seed: trial order and color/cue shuffles (trial.py)
+random.seed(seed % 2**32)  # Seed: numpy jitter draws (legacy global generator takes 32-bit seeds)
+
+# Generate all trials - every block is drawn, also those before start_block, so a resumed
+# session gets the same trials and jitter as the original run from the same seed
+session_trials = []  # List: Trial objects of the whole session
 start_block = EXPERIMENT_CONFIG['start_block']  # Integer: which block to start from (1)
 
-for block in range(start_block - 1, no_blocks):  # Loop: through blocks
+for block in range(no_blocks):  # Loop: through blocks
     block_num = block + 1  # Integer: block number (1, 2, 3, ...)
     
     # Generate experimental trials for this block
@@ -78,31 +106,59 @@ for block in range(start_block - 1, no_blocks):  # Loop: through blocks
         NoCueLocations, cue_set, cue_set_val,  # Integer/lists: cue parameters
         StimulusTargetColors, NoTargets, stim_ed  # String/integer: color and timing parameters
     )
-    all_trials.extend(block_trials)  # Add: trials to main list
+    session_trials.extend(block_trials)  # Add: trials to session list
+
+# Draw the jitter of every trial up front - min(offset + Exp(mean), max), in seconds (1.0-5.0s)
+session_jitter = np.minimum(
+    TrialStartJitterOffsetTime + random.exponential(TrialStartJitterMeanTime, len(session_trials)),
+    TrialStartJitterMaxTime,
+)  # Array: fixation jitter per trial of the session
+plan_hash = trial_list_hash(seed, session_trials, session_jitter)  # String: identifies trials + jitter of this seed
+
+# Resume - run the trials from start_block on, numbered as in the full session
+first_trial = next((i for i, t in enumerate(session_trials) if t.block >= start_block), len(session_trials))  # Integer: index of the first trial run
+all_trials = session_trials[first_trial:]  # List: Trial objects run by this script
+jitter_times = session_jitter[first_trial:]  # Array: jitter of the trials run
 
 # Create data file
 data_file, data_filename = create_data_file(
-    "CCRP", EXPERIMENT_CONFIG['subject'], session, practice  # String/integers/boolean: experiment name, subject, session, practice flag
+    "CCRP", EXPERIMENT_CONFIG['subject'], session, practice,  # String/integers/boolean: experiment name, subject, session, practice flag
+    seed=seed,  # Integer: logged in the header so the session can be regenerated
+    plan_hash=plan_hash,  # String: compare with the original run's header before resuming
+    start_block=start_block,  # Integer: first block in this file
 )
+timing_file = create_timing_file(data_filename)  # File: per-phase timing log (intended vs achieved flips)
+texture_file = create_texture_file(data_filename)  # File: per-trial capture texture counts (memory stays flat)
 
 # Create fixation display buffer - pre-rendered fixation point
-fixation_display = visual.BufferImageStim(win, stim=[stimuli['fixation']])  # BufferImageStim: cached fixation point
+capture_pool = CapturePool(win)  # CapturePool: every full-window capture of the session, textures reused
+fixation_display = capture_pool.capture("fixation", [stimuli['fixation']])  # ImageStim: cached fixation point
 
-# Main experiment loop
-for trial_num, trial in enumerate(all_trials):  # Loop: through each trial
-    
+# Session-level display settings - identical for every trial of the session
+show_all_targets = not (session <= no_prac_sessions and PracShowAllTargets[session - 1] == 0)  # Boolean: False = single cue+target in center (first practice session)
+show_color_response = session <= no_prac_sessions and PracCueArrowResponseAssociations[session - 1] == 1  # Boolean: whether to show color-response mapping
+
+
+def configure_trial_display(trial):
+    """
+    Set up the cue/color stimuli for one trial
+
+    Args:
+        trial: Trial object - trial to be displayed
+
+    Returns:
+        List - stimuli making up the cue/color display (cues AND colors appear together)
+    """
     # Set cue text - display cue numbers in boxes
     for i in range(NoCueLocations):  # Loop: through 4 cue positions
         if trial.cues[i] > 0:  # Check: cue present at this position?
             stimuli['cue_texts'][i].setText(str(CueSymbols[trial.cues[i] - 1]))  # String: set text to cue number ("1", "2", "3", or "4")
         else:  # No cue
             stimuli['cue_texts'][i].setText("")  # String: empty text (no cue shown)
-    
+
     # Set color targets - assign colors to target positions
     # Handle first practice session: show single cue+target in center if PracShowAllTargets[0] == 0
-    show_all_targets = True  # Boolean: whether to show all targets or just one in center
-    if session <= no_prac_sessions and PracShowAllTargets[session - 1] == 0:  # Check: first practice session?
-        show_all_targets = False  # Boolean: show only single cue+target in center
+    if not show_all_targets:  # Check: first practice session?
         for i in range(NoTargets):  # Loop: through 4 target positions
             if trial.cues[i] == 0:  # Check: no cue at this position?
                 # Hide this target - move off screen
@@ -126,37 +182,48 @@ for trial_num, trial in enumerate(all_trials):  # Loop: through each trial
             stimuli['cue_texts'][i].setPos(cue_locations[i])  # Tuple: reset to normal position
             stimuli['cue_boxes'][i].setPos(cue_locations[i])  # Tuple: reset to normal position
             stimuli['color_targets'][i].setPos(target_locations[i])  # Tuple: reset to normal position
-    
+
     # Set color-response instruction display - show which keys map to which colors
-    show_color_response = False  # Boolean: whether to show color-response mapping
-    if session <= no_prac_sessions:  # Check: practice session?
-        if PracCueArrowResponseAssociations[session - 1] == 1:  # Check: show mapping for this session?
-            show_color_response = True  # Boolean: show the mapping
     for i in range(StimulusColorNoResponses):  # Loop: through 4 colors
         if show_color_response:  # Check: show instruction?
             stimuli['color_response_instruction'][i].setColor(StimulusTargetColorsRGB[i])  # Tuple: set to color (red, green, blue, yellow)
         else:  # Hide instruction
             stimuli['color_response_instruction'][i].setColor(WINDOW_CONFIG['bg_color'])  # Tuple: set to background (invisible)
+
+    return [stimuli['fixation']] + stimuli['cue_arrows'] + stimuli['color_targets'] + stimuli['cue_boxes'] + stimuli['cue_texts'] + stimuli['color_response_instruction']  # List: all stimuli together
+
+
+# Pre-render cue/color displays - every trial is known up front, so the captures happen before the first trial
+display_cache = DisplayCache(
+    win, configure_trial_display, show_color_response,  # Window/function/boolean: capture target, stimulus setup, instruction visibility
+    max_entries=DISPLAY_CACHE_CONFIG['max_entries'],  # Integer: maximum number of displays kept in memory
+    pool=capture_pool,  # CapturePool: evicted displays hand their textures to new captures
+)
+display_cache.warm(all_trials)  # Capture: distinct displays in order of first use
+
+# Main experiment loop
+pending_timing = None  # Tuple: (trial number, phase records) of the previous trial, written once its feedback has ended
+for trial_num, trial in enumerate(all_trials):  # Loop: through each trial
     
-    # Create display buffer - cues AND colors appear together simultaneously
-    cue_color_stim_list = [stimuli['fixation']] + stimuli['cue_arrows'] + stimuli['color_targets'] + stimuli['cue_boxes'] + stimuli['cue_texts'] + stimuli['color_response_instruction']  # List: all stimuli together
-    cue_color_display = visual.BufferImageStim(win, stim=cue_color_stim_list)  # BufferImageStim: cached display with cues and colors
+    # Get display buffer - pre-rendered at session start (captured now only if it was not cached)
+    cue_color_display = display_cache.get(trial)  # ImageStim: cached display with cues and colors
     
     # Present fixation
-    fixation_display.draw()  # Draw: fixation point
-    win.flip()  # Flip: show on screen
+    scheduler.show(fixation_display.draw, "fixation_wait")  # Flip: show fixation point until a keypress
+    if pending_timing is not None:  # Check: previous trial's feedback just ended with this flip?
+        save_phase_timing(timing_file, *pending_timing)  # Write: intended vs achieved phase timing (feedback included)
+        pending_timing = None
     
     # Wait for keypress to start trial
     event.clearEvents()  # Clear: remove any pending keypresses
     event.waitKeys()  # Wait: for any keypress to continue
     
     # Calculate trial start jitter - random delay before display
-    jitter_time = min([TrialStartJitterOffsetTime + random.exponential(TrialStartJitterMeanTime), TrialStartJitterMaxTime])  # Float: jitter duration in seconds (1.0-5.0s)
-    core.wait(jitter_time)  # Wait: jitter duration
+    jitter_time = float(jitter_times[trial_num])  # Float: jitter duration in seconds (drawn with the session)
+    scheduler.present(fixation_display.draw, jitter_time, "fixation")  # Flip: fixation for the jitter, frame by frame
     
     # Present cues AND colors together - they appear simultaneously
-    cue_color_display.draw()  # Draw: cues + colors + arrows + instructions
-    win.flip()  # Flip: show everything on screen
+    scheduler.show(cue_color_display.draw, "cue")  # Flip: show cues + colors + arrows + instructions
     trial.cue_time = trial_clock.getTime()  # Float: record timestamp (seconds)
     trial.color_target_time = trial_clock.getTime()  # Float: same time (colors appear with cues)
     
@@ -230,29 +297,36 @@ for trial_num, trial in enumerate(all_trials):  # Loop: through each trial
     trial.cum_reward = round(trial.cum_reward, 2)  # Float: round to 2 decimal places
     
     # Save trial data
-    save_trial_data(data_file, trial, trial_num + 1)  # Write: trial data to file
+    save_trial_data(data_file, trial, first_trial + trial_num + 1)  # Write: trial data to file
     
     # Show feedback - display reward and cumulative total
-    feedback_text = visual.TextStim(
-        win, text=f"{trial.expected_reward} / {trial.max_reward}\n{trial.cum_reward:.2f}",  # String: "4 / 4\n0.40"
-        height=0.5, units='deg', color=(1, 1, 1)  # TextStim: white text, 0.5 deg height
-    )
-    feedback_text.draw()  # Draw: feedback text
-    win.flip()  # Flip: show feedback on screen
-    
-    event.clearEvents()  # Clear: remove any pending keypresses
-    core.wait(1.0)  # Wait: 1 second before next trial
+    feedback_outcome = feedback_outcomes[f"{trial.expected_reward} / {trial.max_reward}"]  # ImageStim: e.g. "4 / 4"
+    feedback_total.set_text(f"{trial.cum_reward:.2f}")  # Compose: e.g. "0.40" from cached glyphs
 
-# Close data file
-data_file.close()  # Close: file handle
+    def draw_feedback():
+        feedback_outcome.draw()
+        feedback_total.draw()
+
+    event.clearEvents()  # Clear: remove any pending keypresses
+    scheduler.present(draw_feedback, 1.0, "feedback")  # Flip: feedback for 1 second (whole frames)
+    pending_timing = (first_trial + trial_num + 1, scheduler.pop_records())  # Tuple: written after the next flip ends the feedback
+    save_texture_stats(texture_file, first_trial + trial_num + 1, capture_pool.stats())  # Write: live capture textures and bytes
 
-# End screen
+# End screen - its flip ends the last feedback phase
 end_text = visual.TextStim(
     win, text="End of session!\n\nContact the Experimenter",  # String: end message
     height=0.5, units='deg', color=(1, 1, 1)  # TextStim: white text, 0.5 deg height
 )
-end_text.draw()  # Draw: end message
-win.flip()  # Flip: show end message
+scheduler.show(end_text.draw, "end")  # Flip: show end message
+if pending_timing is not None:  # Check: last trial's timing not written yet?
+    save_phase_timing(timing_file, *pending_timing)  # Write: last trial's phases, feedback achieved duration included
+
+# Close data file
+data_file.close()  # Close: file handle
+timing_file.close()  # Close: file handle
+texture_file.close()  # Close: file handle
+capture_pool.close()  # Free: all capture textures, deterministically
+
 event.waitKeys()  # Wait: for keypress before closing
 
 core.quit()  # Quit: exit program
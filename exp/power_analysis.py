@@ -0,0 +1,78 @@
+"""
+Payout forecast and per-condition power for a CCRP session design from simulated participants (src/power_sim.py)
+
+    python power_analysis.py --session 6 --participants 5000 --group-sizes 10 20 30
+    python power_analysis.py --session 6 --n-blocks 6 --money-factor 0.04 --beta 0.8 --lapse 0.1 --json power.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from ccrp_design import REWARD_MONEY_FACTOR
+from power_sim import ParticipantModel, run_power_analysis
+
+
+def _power_text(power):
+    return "  ".join(f"n={n}: {p:.2f}" for n, p in power.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate participants to forecast payout and statistical power.")
+    parser.add_argument("--session", type=int, default=6, help="1-based session number (design from SESSION_CONFIG)")
+    parser.add_argument("--participants", type=int, default=2000, help="simulated participants")
+    parser.add_argument("--group-sizes", type=int, nargs="+", default=[10, 20, 30], help="participants per experiment")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--n-blocks", type=int, default=None, help="override the session's number of blocks")
+    parser.add_argument("--n-per-block", type=int, default=None, help="override the session's main trials per block")
+    parser.add_argument("--money-factor", type=float, default=REWARD_MONEY_FACTOR, help="DKK per reward point")
+    parser.add_argument("--beta", type=float, default=2.0, help="choice inverse temperature per reward point")
+    parser.add_argument("--beta-sd", type=float, default=0.5)
+    parser.add_argument("--lapse", type=float, default=0.05, help="probability of a random key press")
+    parser.add_argument("--lapse-sd", type=float, default=0.02)
+    parser.add_argument("--rt-mu", type=float, default=0.45, help="ex-Gaussian mu (seconds)")
+    parser.add_argument("--rt-mu-sd", type=float, default=0.05)
+    parser.add_argument("--rt-sigma", type=float, default=0.08, help="ex-Gaussian sigma (seconds)")
+    parser.add_argument("--rt-tau", type=float, default=0.15, help="ex-Gaussian tau (seconds)")
+    parser.add_argument("--rt-value-slope", type=float, default=0.02, help="mu shortening per reward point (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count, 1 = no pool)")
+    parser.add_argument("--json", default=None, help="also write the full summary to this JSON file")
+    args = parser.parse_args()
+
+    model = ParticipantModel(
+        beta=args.beta, lapse=args.lapse, rt_mu_s=args.rt_mu, rt_sigma_s=args.rt_sigma, rt_tau_s=args.rt_tau,
+        rt_value_slope_s=args.rt_value_slope, beta_sd=args.beta_sd, lapse_sd=args.lapse_sd, rt_mu_sd_s=args.rt_mu_sd,
+    )
+    start = time.perf_counter()
+    summary = run_power_analysis(
+        model, args.session, args.participants, group_sizes=tuple(args.group_sizes), alpha=args.alpha,
+        money_factor=args.money_factor, n_blocks=args.n_blocks, n_per_block=args.n_per_block, seed=args.seed,
+        jobs=args.jobs,
+    )
+    elapsed = time.perf_counter() - start
+
+    payout = summary["payout_dkk"]
+    print(f"Session {summary['session']}: {summary['n_blocks']} blocks x {summary['n_per_block']} trials, "
+          f"{summary['n_participants']} simulated participants in {elapsed:.2f} s")
+    print(f"Payout ({payout['money_factor']} DKK/point): mean {payout['mean']:.2f}, SD {payout['sd']:.2f}, "
+          f"5-95% {payout['p5']:.2f}-{payout['p95']:.2f}, range {payout['min']:.2f}-{payout['max']:.2f} DKK")
+    print(f"Power (alpha {summary['alpha']}, two-sided one-sample t-test across participants):")
+    for entry in summary["conditions"]:
+        print(f"  {entry['condition']:<6} ACC {entry['mean_accuracy']:.3f}, RT {entry['mean_rt_ms']:.0f} ms, "
+              f"above chance: {_power_text(entry['power_accuracy_above_chance'])}")
+        if "power_value_preference" in entry:
+            print(f"         better-cue preference {entry['mean_value_preference']:+.3f}: "
+                  f"{_power_text(entry['power_value_preference'])}")
+        if "power_distractor_cost" in entry:
+            print(f"         distractor cost {entry['mean_distractor_cost']:+.3f}: "
+                  f"{_power_text(entry['power_distractor_cost'])}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fp:
+            json.dump(summary, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Run CCRP sessions headless in virtual time (src/session_sim.py): no window, no devices, no waiting
+
+One session to CSV + metadata JSON + npz, as testmain.py would write them:
+    python simulate_session.py --participant sim01 --session 6 --device self-made-response-box --out data_simulated
+
+Many sessions in memory (design checks), e.g. 200 simulated participants:
+    python simulate_session.py --session 6 --n-sessions 200 --p-best 0.8
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from ccrp_design import RESPONSE_DEVICE_CEDRUS, RESPONSE_DEVICE_KEYBOARD, RESPONSE_DEVICE_SELF_MADE
+from ccrp_rows import DAT_COLUMN_DESCRIPTIONS
+from session_sim import SIM_REFRESH_HZ, simulate_session
+
+
+def check_rows(result):
+    """Raise if the rows do not have the column order and count testmain.py writes"""
+    expected = list(DAT_COLUMN_DESCRIPTIONS)
+    n_trials = result.metadata["trial_timing_and_design"]["total_trials_warmup_plus_main"]
+    for row in result.rows:
+        if list(row) != expected:
+            raise ValueError(f"Trial {row.get('Trial')}: columns differ from DAT_COLUMN_DESCRIPTIONS")
+    if len(result.rows) != n_trials:
+        raise ValueError(f"{len(result.rows)} rows written, {n_trials} trials planned")
+
+
+def summarize(result):
+    rows = result.rows
+    answered = [row for row in rows if row["Response"] != "timeout"]
+    return {
+        "trials": len(rows),
+        "accuracy": np.mean([row["ACC"] for row in rows]),
+        "timeouts": len(rows) - len(answered),
+        "mean_rt_ms": np.mean([row["RT"] for row in answered]) if answered else float("nan"),
+        "earnings": rows[-1]["CumReward"] if rows else 0.0,
+        "compromised": result.metadata["session_timing_summary"]["compromised_trials"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate CCRP sessions in virtual time.")
+    parser.add_argument("--participant", default="sim", help="participant ID (numbered when --n-sessions > 1)")
+    parser.add_argument("--session", type=int, default=6, help="1-based session number")
+    parser.add_argument("--n-sessions", type=int, default=1, help="simulated participants to run")
+    parser.add_argument("--device", default=RESPONSE_DEVICE_KEYBOARD,
+                        choices=[RESPONSE_DEVICE_KEYBOARD, RESPONSE_DEVICE_CEDRUS, RESPONSE_DEVICE_SELF_MADE])
+    parser.add_argument("--out", default=None, help="output folder for CSV/JSON/npz (default: keep in memory)")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the simulated responses (default: plan seed)")
+    parser.add_argument("--refresh-hz", type=float, default=SIM_REFRESH_HZ)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="probability that a flip misses a refresh")
+    parser.add_argument("--p-best", type=float, default=0.9, help="probability of choosing the highest reward")
+    parser.add_argument("--rt-mu", type=float, default=0.45, help="ex-Gaussian mu (seconds)")
+    parser.add_argument("--rt-sigma", type=float, default=0.08, help="ex-Gaussian sigma (seconds)")
+    parser.add_argument("--rt-tau", type=float, default=0.15, help="ex-Gaussian tau (seconds)")
+    args = parser.parse_args()
+
+    participant_params = {
+        "p_best": args.p_best, "rt_mu_s": args.rt_mu, "rt_sigma_s": args.rt_sigma, "rt_tau_s": args.rt_tau,
+    }
+    start = time.perf_counter()
+    summaries = []
+    for i in range(args.n_sessions):
+        participant = args.participant if args.n_sessions == 1 else f"{args.participant}{i + 1:03d}"
+        result = simulate_session(
+            participant, args.session, out_dir=args.out, seed=None if args.seed is None else args.seed + i,
+            response_device=args.device, participant_params=participant_params, refresh_hz=args.refresh_hz,
+            drop_rate=args.drop_rate,
+        )
+        check_rows(result)
+        summary = summarize(result)
+        summaries.append(summary)
+        if args.n_sessions == 1:
+            print(f"Session {args.session}, {participant}, {args.device}: {summary['trials']} trials, "
+                  f"{result.virtual_s / 60:.1f} virtual min in {result.wall_s * 1000:.0f} ms")
+            print(f"  accuracy {summary['accuracy']:.3f}, timeouts {summary['timeouts']}, "
+                  f"mean RT {summary['mean_rt_ms']:.0f} ms, earnings {summary['earnings']:.2f} DKK, "
+                  f"timing-compromised trials {summary['compromised']}")
+            if result.csv_path is not None:
+                print(f"  {result.csv_path}\n  {result.metadata_path}\n  {result.columns_path}")
+    elapsed = time.perf_counter() - start
+    if args.n_sessions > 1:
+        earnings = np.array([s["earnings"] for s in summaries])
+        accuracy = np.array([s["accuracy"] for s in summaries])
+        print(f"{args.n_sessions} sessions of session {args.session} in {elapsed:.2f} s "
+              f"({elapsed / args.n_sessions * 1000:.0f} ms per session)")
+        print(f"  accuracy mean {accuracy.mean():.3f} (SD {accuracy.std(ddof=1):.3f})")
+        print(f"  earnings mean {earnings.mean():.2f} DKK, range {earnings.min():.2f}-{earnings.max():.2f} DKK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Reference emulators of the response boxes (self-made firmware, Cedrus XID), as serial-port stand-ins
+"""
+import struct
+import threading
+import time
+
+from box_protocol import PING_REPLY_PIN, SEQ_MODULO, encode_frame
+
+
+class _SerialStandIn:
+    """The subset of the pyserial API the response readers use, over an in-memory output buffer"""
+
+    def __init__(self, time_fn=time.perf_counter):
+        self.time_fn = time_fn
+        self.timeout = None  # Float or None: read() timeout (seconds), as serial.Serial
+        self._out = bytearray()  # Bytearray: bytes waiting to be read by the host
+        self._cond = threading.Condition()
+        self.closed = False
+
+    def inject(self, data):
+        """Queue raw bytes for the host (e.g. corrupt or repeated frames)"""
+        with self._cond:
+            self._out += data
+            self._cond.notify_all()
+
+    @property
+    def in_waiting(self):
+        return len(self._out)
+
+    def flush(self):
+        pass
+
+    def read(self, size=1):
+        with self._cond:
+            if not self._out and not self.closed:
+                self._cond.wait(self.timeout)
+            data = bytes(self._out[:size])
+            del self._out[:size]
+        return data
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._out.clear()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class ResponseBoxEmulator(_SerialStandIn):
+    """
+    What the firmware does, behind the subset of the pyserial API the reader uses
+
+    Commands written by the host: b"S" restarts the latency timer, b"P" queues a
+    ping reply with the device clock. press(pin) queues a button event with the
+    latency since the last b"S". The device clock runs at (1 - drift_ppm * 1e-6)
+    times host speed from clock_start_us and wraps like micros(). With
+    binary=False the legacy ASCII lines are sent instead of frames.
+    """
+
+    def __init__(self, binary=True, drift_ppm=0.0, clock_start_us=0, time_fn=time.perf_counter):
+        """
+        Args:
+            binary: Boolean - send binary frames (True) or ASCII lines (False)
+            drift_ppm: Float - device clock slower than the host by this much (ppm)
+            clock_start_us: Integer - device micros() when the emulator is created
+            time_fn: Function - host clock (seconds)
+        """
+        super().__init__(time_fn)
+        self.binary = binary
+        self.drift_ppm = drift_ppm
+        self._t0 = time_fn()
+        self._clock_start_us = clock_start_us
+        self._sync_us = None  # Integer: device clock at the last b"S"
+        self._seq = 0  # Integer: next sequence number
+
+    def micros(self):
+        """Integer: device clock (us), wrapping at 2**32"""
+        elapsed = self.time_fn() - self._t0
+        return int(self._clock_start_us + elapsed * (1 - self.drift_ppm * 1e-6) * 1e6) % 2 ** 32
+
+    def _send(self, pin, value):
+        if self.binary:
+            data = encode_frame(self._seq, pin, value)
+        else:
+            data = ("%s,%d\n" % ("P" if pin == PING_REPLY_PIN else pin, value)).encode("ascii")
+        self._seq = (self._seq + 1) % SEQ_MODULO
+        self.inject(data)
+
+    def skip_sequence(self, count=1):
+        """Drop the next count frames on the "wire": the host should report them as lost"""
+        self._seq = (self._seq + count) % SEQ_MODULO
+
+    def press(self, pin, latency_us=None):
+        """
+        Send a button event
+
+        Args:
+            pin: Integer - button pin
+            latency_us: Integer or None - latency to report; None = time since the last b"S"
+        """
+        if latency_us is None:
+            latency_us = 0 if self._sync_us is None else (self.micros() - self._sync_us) % 2 ** 32
+        self._send(pin, latency_us)
+
+    def write(self, data):
+        for command in bytes(data):
+            if command == ord("S"):
+                self._sync_us = self.micros()
+            elif command == ord("P"):
+                self._send(PING_REPLY_PIN, self.micros())
+        return len(data)
+
+
+class CedrusEmulator(_SerialStandIn):
+    """
+    A Cedrus XID box (RB series) as far as the experiment uses it
+
+    Commands: b"_c1" answers b"_xid0", b"e1" resets the base timer, b"e5" the
+    reaction-time timer; other bytes are ignored. press(button) sends a key-down
+    packet and, after hold_s, the key-up packet (b"k", info byte, RT in ms).
+    """
+
+    COMMANDS = (b"_c1", b"e1", b"e5")  # Tuple of bytes: commands understood
+
+    def __init__(self, port=0, time_fn=time.perf_counter):
+        """
+        Args:
+            port: Integer - XID port number reported in the packets (0-15)
+            time_fn: Function - host clock (seconds)
+        """
+        super().__init__(time_fn)
+        self.port = port
+        self._rt_zero = time_fn()  # Float: host time of the last b"e5"
+        self._pending = bytearray()  # Bytearray: command bytes not matched yet
+
+    def _packet(self, button, pressed, rt_ms):
+        info = ((button % 8) << 5) | (0x10 if pressed else 0) | (self.port & 0x0F)
+        return b"k" + struct.pack("<BI", info, int(rt_ms) % 2 ** 32)
+
+    def press(self, button, hold_s=0.0):
+        """
+        Send a key-down packet (and the key-up packet hold_s later; 0 = at once)
+
+        Args:
+            button: Integer - button 1-8
+            hold_s: Float - time the button is held (seconds); the release is sent from a timer thread
+        """
+        rt_ms = (self.time_fn() - self._rt_zero) * 1000
+        self.inject(self._packet(button, True, rt_ms))
+        if hold_s > 0:
+            threading.Timer(hold_s, self.release, (button,)).start()
+        else:
+            self.release(button)
+
+    def release(self, button):
+        self.inject(self._packet(button, False, (self.time_fn() - self._rt_zero) * 1000))
+
+    def write(self, data):
+        self._pending += data
+        while self._pending:
+            for command in self.COMMANDS:
+                if self._pending.startswith(command):
+                    del self._pending[:len(command)]
+                    if command == b"_c1":
+                        self.inject(b"_xid0")
+                    elif command == b"e5":
+                        self._rt_zero = self.time_fn()
+                    break
+            else:
+                if any(command.startswith(bytes(self._pending)) for command in self.COMMANDS):
+                    break  # Wait: rest of the command not written yet
+                del self._pending[:1]  # Unknown byte
+        return len(data)
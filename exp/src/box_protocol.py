@@ -0,0 +1,192 @@
+"""
+Self-made response box wire format: binary frames with sequence numbers and CRC8, and the legacy ASCII lines
+
+Binary frame (8 bytes):
+    0xA5 sync | seq (u8) | pin (u8) | value (u32, little-endian) | CRC8 of seq..value
+
+value is the latency since the last sync command (us) for a button pin, or the
+device clock micros() for pin PING_REPLY_PIN. The box numbers every frame it
+sends (seq wraps at 256), so lost and repeated frames can be counted on the host.
+Legacy ASCII lines "pin,latency_us\n" and "P,micros\n" are still accepted and
+carry no sequence number.
+"""
+import struct
+from collections import namedtuple
+
+FRAME_SYNC = 0xA5  # Integer: first byte of every binary frame (never part of an ASCII line)
+FRAME_SIZE = 8  # Integer: sync, seq, pin, 4-byte value, CRC8
+PING_REPLY_PIN = 0xFF  # Integer: pin value marking a ping reply (value = device micros())
+SEQ_MODULO = 256  # Integer: sequence numbers wrap after this many frames
+MAX_ASCII_LINE = 24  # Integer: longest legal ASCII line; a longer run without newline is skipped
+_FRAME = struct.Struct("<xBBIB")  # Struct: skip sync, seq, pin, value, crc
+_BODY = struct.Struct("<BBI")  # Struct: seq, pin, value (the CRC-covered part)
+_LINE_START = b"0123456789P"  # Bytes: first characters of a legal ASCII line
+
+# One decoded frame: pin (0xFF = ping reply), value (us), seq (None for ASCII lines), host time of arrival (seconds)
+BoxFrame = namedtuple("BoxFrame", ["pin", "value", "seq", "host_time"])
+
+
+def _crc8_table(poly=0x07):
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+_CRC8_TABLE = _crc8_table()  # Bytes: CRC-8/SMBUS (poly 0x07, init 0) lookup table
+
+
+def crc8(data, start=0, end=None):
+    """CRC-8 (poly 0x07, init 0) of data[start:end], computed without slicing"""
+    crc = 0
+    table = _CRC8_TABLE
+    for i in range(start, len(data) if end is None else end):
+        crc = table[crc ^ data[i]]
+    return crc
+
+
+def encode_frame(seq, pin, value):
+    """
+    Build one binary frame (what the firmware sends)
+
+    Args:
+        seq: Integer - sequence number (taken modulo 256)
+        pin: Integer - button pin, or PING_REPLY_PIN
+        value: Integer - latency (us) or device micros() (taken modulo 2**32)
+
+    Returns:
+        Bytes - FRAME_SIZE bytes
+    """
+    body = _BODY.pack(seq % SEQ_MODULO, pin, value % 2 ** 32)
+    return bytes([FRAME_SYNC]) + body + bytes([crc8(body)])
+
+
+class BoxFrameDecoder:
+    """
+    Parse binary frames and ASCII lines in place from a growing byte stream
+
+    Same buffering as xid.XidDecoder: one bytearray, parsed at a read offset with
+    struct.unpack_from and compacted in one move. A binary frame whose CRC does not
+    match is counted and the decoder resynchronizes one byte later; malformed ASCII
+    lines are counted instead of silently dropped.
+    """
+
+    def __init__(self, compact_threshold=4096):
+        """
+        Args:
+            compact_threshold: Integer - consumed bytes kept before the buffer is compacted
+        """
+        self._buffer = bytearray()  # Bytearray: received bytes, parsed from self._pos onwards
+        self._pos = 0  # Integer: offset of the first unparsed byte
+        self.compact_threshold = compact_threshold
+        self.crc_errors = 0  # Integer: binary frames rejected by the CRC
+        self.malformed_lines = 0  # Integer: ASCII lines that could not be parsed
+        self.skipped_bytes = 0  # Integer: bytes discarded while resynchronizing
+
+    def __len__(self):
+        return len(self._buffer) - self._pos  # Integer: bytes waiting for the rest of a frame
+
+    def feed(self, data, host_time):
+        """
+        Add received bytes and decode every complete frame or line
+
+        Args:
+            data: Bytes - raw bytes read from the port
+            host_time: Float - host time when the bytes arrived (seconds)
+
+        Returns:
+            List of BoxFrame - frames completed by this data, in order
+        """
+        self._buffer += data
+        return list(self._decode(host_time))
+
+    def _decode(self, host_time):
+        buffer = self._buffer
+        end = len(buffer)
+        pos = self._pos
+        while pos < end:
+            byte = buffer[pos]
+            if byte == FRAME_SYNC:
+                if end - pos < FRAME_SIZE:  # Wait: rest of the frame not received yet
+                    break
+                seq, pin, value, crc = _FRAME.unpack_from(buffer, pos)
+                if crc8(buffer, pos + 1, pos + FRAME_SIZE - 1) != crc:
+                    self.crc_errors += 1
+                    self.skipped_bytes += 1
+                    pos += 1
+                    continue
+                pos += FRAME_SIZE
+                yield BoxFrame(pin, value, seq, host_time)
+            elif byte not in _LINE_START:  # Line ends, or stray bytes of a corrupt frame
+                if byte not in b"\r\n":
+                    self.skipped_bytes += 1
+                pos += 1
+            else:
+                limit = min(end, pos + MAX_ASCII_LINE + 1)
+                sync = buffer.find(FRAME_SYNC, pos, limit)  # A line never spans a binary frame
+                stop = limit if sync < 0 else sync
+                newline = buffer.find(b"\n", pos, stop)
+                if newline < 0:
+                    if sync < 0 and end - pos <= MAX_ASCII_LINE:
+                        break  # Wait: line not complete yet
+                    self.skipped_bytes += stop - pos  # Resync: garbage up to the next frame
+                    pos = stop
+                    continue
+                frame = self._parse_line(buffer, pos, newline, host_time)
+                pos = newline + 1
+                if frame is None:
+                    self.malformed_lines += 1
+                else:
+                    yield frame
+        self._pos = pos
+        if pos >= self.compact_threshold or pos == end:  # Compact: drop consumed bytes in one move
+            del buffer[:pos]
+            self._pos = 0
+
+    @staticmethod
+    def _parse_line(buffer, start, end, host_time):
+        """Parse "pin,value" or "P,value" in buffer[start:end] (trailing "\r" allowed); None if malformed"""
+        comma = buffer.find(b",", start, end)
+        if comma < 0:
+            return None
+        if end > start and buffer[end - 1] == 0x0D:
+            end -= 1
+        try:
+            value = int(buffer[comma + 1:end])
+            pin = PING_REPLY_PIN if buffer[start:comma] == b"P" else int(buffer[start:comma])
+        except ValueError:
+            return None
+        if value < 0 or not 0 <= pin <= PING_REPLY_PIN:
+            return None
+        return BoxFrame(pin, value, None, host_time)
+
+
+class SequenceTracker:
+    """
+    Count lost and repeated frames from their 8-bit sequence numbers
+
+    A frame whose sequence number is within half the range behind the last one is a
+    duplicate (a resend or a replayed buffer) and should be dropped; a jump forward
+    by more than one means frames were lost in between.
+    """
+
+    def __init__(self):
+        self.last_seq = None  # Integer: sequence number of the last accepted frame
+        self.frames = 0  # Integer: accepted frames
+        self.lost = 0  # Integer: frames missing between accepted ones
+        self.duplicates = 0  # Integer: frames rejected as repeats
+
+    def accept(self, seq):
+        """Record a sequence number; returns False if the frame is a duplicate"""
+        if self.last_seq is not None:
+            step = (seq - self.last_seq) % SEQ_MODULO
+            if step == 0 or step > SEQ_MODULO // 2:
+                self.duplicates += 1
+                return False
+            self.lost += step - 1
+        self.last_seq = seq
+        self.frames += 1
+        return True
@@ -0,0 +1,113 @@
+"""
+Pooled full-window captures: a fixed set of ImageStim textures reused instead of a new BufferImageStim per capture
+"""
+from psychopy import visual
+
+BYTES_PER_PIXEL = 4  # Integer: RGBA texel size used to estimate texture memory
+
+
+class CapturePool:
+    """
+    Keyed captures of the back buffer into reusable textures
+
+    capture(key, stimuli) draws the stimuli, copies the back buffer into the ImageStim
+    held for key (uploading into its existing GL texture) and clears the buffer again -
+    what BufferImageStim does, without creating a texture per call. release(key) hands
+    the texture to the next new key; close() deletes every texture. The number of live
+    textures is therefore the largest number of keys held at once, not the number of
+    captures, and stats() reports it.
+    """
+
+    def __init__(self, win):
+        """
+        Args:
+            win: Window object - window whose back buffer is captured
+        """
+        self.win = win
+        self._held = {}  # Dictionary: key -> ImageStim currently holding that capture
+        self._free = []  # List of ImageStims: released, texture kept for the next new key
+        self._bytes = {}  # Dictionary: id(ImageStim) -> estimated texture bytes
+        self.captures = 0  # Integer: capture() calls
+        self.textures_created = 0  # Integer: GL textures created (new ImageStims)
+        self.peak_live_textures = 0  # Integer: most textures alive at once
+        self.peak_texture_bytes = 0  # Integer: most texture bytes alive at once
+
+    def __contains__(self, key):
+        return key in self._held
+
+    def __len__(self):
+        return len(self._held)
+
+    def get(self, key):
+        """Return the capture held for key, or None"""
+        return self._held.get(key)
+
+    def capture(self, key, stimuli):
+        """
+        Capture stimuli into the texture held for key
+
+        Args:
+            key: Hashable - name of the capture (recapturing a key overwrites it in place)
+            stimuli: List - stimuli drawn, in order, into the cleared back buffer
+
+        Returns:
+            ImageStim - full-window image of the stimuli, drawn at the window centre
+        """
+        self.win.clearBuffer()
+        for stim in stimuli:
+            stim.draw()
+        region = self.win._getRegionOfFrame(buffer="back")  # PIL Image: full back buffer
+        self.win.clearBuffer()
+
+        display = self._held.get(key)
+        if display is None and self._free:
+            display = self._free.pop()
+        if display is None:
+            display = visual.ImageStim(
+                self.win, image=region, units="pix", size=region.size, pos=(0, 0), interpolate=False,
+            )
+            self.textures_created += 1
+        else:
+            display.image = region  # Upload: into the existing texture
+            display.size = region.size
+        self._held[key] = display
+        self._bytes[id(display)] = region.size[0] * region.size[1] * BYTES_PER_PIXEL
+        self.captures += 1
+        self.peak_live_textures = max(self.peak_live_textures, self.live_textures)
+        self.peak_texture_bytes = max(self.peak_texture_bytes, self.texture_bytes)
+        return display
+
+    def release(self, key):
+        """Stop holding the capture of key; its texture is reused by the next new key"""
+        display = self._held.pop(key, None)
+        if display is not None:
+            self._free.append(display)
+
+    def close(self):
+        """Delete every texture of the pool (captures returned earlier must not be drawn afterwards)"""
+        for display in list(self._held.values()) + self._free:
+            display.clearTextures()
+        self._held.clear()
+        self._free.clear()
+        self._bytes.clear()
+
+    @property
+    def live_textures(self):
+        """Integer: textures alive (held and free)"""
+        return len(self._held) + len(self._free)
+
+    @property
+    def texture_bytes(self):
+        """Integer: estimated bytes of all live textures"""
+        return sum(self._bytes.values())
+
+    def stats(self):
+        """Dictionary - capture counts and texture memory (current and peak)"""
+        return {
+            "captures": self.captures,
+            "textures_created": self.textures_created,
+            "live_textures": self.live_textures,
+            "texture_bytes": self.texture_bytes,
+            "peak_live_textures": self.peak_live_textures,
+            "peak_texture_bytes": self.peak_texture_bytes,
+        }
@@ -0,0 +1,115 @@
+"""
+CCRP session design: identity, conditions, timing and response mappings shared by testmain.py and the session simulator
+"""
+import math
+
+CODE_VERSION = "v2-2026-05-07"
+EXPERIMENT_NAME = "CCP"
+EXPERIMENT_NUMBER = 1001
+COLOR_KEY_MAPPING = "rgby"
+
+RESPONSE_DEVICE_KEYBOARD = "keyboard"
+RESPONSE_DEVICE_CEDRUS = "response_box_cedrus"
+RESPONSE_DEVICE_SELF_MADE = "self-made-response-box"
+CEDRUS_BUTTON_TO_COLOR_ID = {"2": 1, "3": 2, "4": 3, "5": 4}
+SELF_MADE_PIN_TO_COLOR_ID = {"6": 1, "7": 2, "8": 4, "9": 3}
+# Color-to-key mapping: Red→D, Green→C, Blue→K, Yellow→M
+COLOR_KEYS = ['d', 'c', 'k', 'm']  # key for position/color 0,1,2,3
+
+# Explicit cue-condition labels used in output. The trial generator chooses from
+# these configured conditions and writes the configured label directly.
+REWARD_CONDITIONS = [
+    {"values": (1,), "label": "(1)"},
+    {"values": (2,), "label": "(2)"},
+    {"values": (3,), "label": "(3)"},
+    {"values": (4,), "label": "(4)"},
+    {"values": (2, 1), "label": "(2,1)"},
+    {"values": (3, 1), "label": "(3,1)"},
+    {"values": (4, 1), "label": "(4,1)"},
+    {"values": (3, 2), "label": "(3,2)"},
+    {"values": (4, 2), "label": "(4,2)"},
+    {"values": (4, 3), "label": "(4,3)"},
+]
+SINGLE_REWARD_CONDITIONS = REWARD_CONDITIONS[:4]
+ALL_REWARD_CONDITIONS = REWARD_CONDITIONS
+
+# Per-session config (index = session - 1). Session 6+ uses config index 5.
+# reward_conditions: which reward values (1–4) appear in trials and the CueCondition label to write.
+# Color is always independent from reward value (each position gets a random color assignment).
+SESSION_CONFIG = [
+    {"reward_conditions": SINGLE_REWARD_CONDITIONS, "n_blocks": 10, "n_per_block": 20, "center": True, "color_map": True},
+    {"reward_conditions": SINGLE_REWARD_CONDITIONS, "n_blocks": 10, "n_per_block": 20, "center": False, "color_map": True},
+    {"reward_conditions": ALL_REWARD_CONDITIONS, "n_blocks": 4, "n_per_block": 50, "center": False, "color_map": True},
+    {"reward_conditions": ALL_REWARD_CONDITIONS, "n_blocks": 4, "n_per_block": 30, "center": False, "color_map": False},
+    {"reward_conditions": ALL_REWARD_CONDITIONS, "n_blocks": 4, "n_per_block": 50, "center": False, "color_map": False},
+    {"reward_conditions": ALL_REWARD_CONDITIONS, "n_blocks": 8, "n_per_block": 50, "center": False, "color_map": False},
+]
+MAX_WAIT_TIME = 4.0
+# Trial start jitter (match paradigm: TrialStartJitterOffsetTime, MeanTime, MaxTime)
+TRIAL_START_JITTER_OFFSET = 1.0
+TRIAL_START_JITTER_MEAN = 0.5
+TRIAL_START_JITTER_MAX = 5.0
+# Warm-up trials per block (match paradigm: FirstWarmUpTrials, OtherWarmUpTrials)
+FIRST_WARMUP_TRIALS = 4
+OTHER_WARMUP_TRIALS = 2
+FEEDBACK_WAIT_TIME = 1.5
+REWARD_MONEY_FACTOR = 0.05
+RESPONSE_DEADLINE = 2.0  # seconds, match paradigm ResponseDeadline
+# Per-trial timing check: a trial is flagged (TimingCompromised = 1) if fixation or feedback dropped
+# a frame or the cue onset missed its intended flip by more than this many refresh periods
+ONSET_ERROR_TOLERANCE_FRAMES = 0.5
+
+# Possible reward values (points 1–4).
+REWARD_VALUES = [1, 2, 3, 4]
+NUM_POSITIONS = 4
+
+# Cue positions (x, y) in deg: 4 locations at 2 deg, rotation 45° (TargetDistance=2, TargetLocRotation=pi/4)
+TARGET_DISTANCE_DEG = 2.0
+TARGET_LOC_ROTATION_RAD = math.pi / 4
+POSITIONS_DEG = [
+    (
+        TARGET_DISTANCE_DEG * math.cos(i * 2 * math.pi / 4 + TARGET_LOC_ROTATION_RAD),
+        TARGET_DISTANCE_DEG * math.sin(i * 2 * math.pi / 4 + TARGET_LOC_ROTATION_RAD)
+    )
+    for i in range(4)
+]
+
+# Index	    Angle	cos	sin	(x, y)	Screen location
+# 0	45°	    +0.707	+0.707	(1.414, 1.414)	top-right
+# 1	135°	-0.707	+0.707	(-1.414, 1.414)	top-left
+# 2	225°	-0.707	-0.707	(-1.414, -1.414)	bottom-left
+# 3	315°	+0.707	-0.707	(1.414, -1.414)	bottom-right
+
+
+def session_config_idx(session):
+    """Return config index for session (1-based). Session 6+ uses same config as session 6."""
+    return min(session - 1, len(SESSION_CONFIG) - 1)
+
+
+def session_design(session):
+    """
+    Block and trial counts of a session
+
+    Args:
+        session: Integer - 1-based session number
+
+    Returns:
+        Dictionary - cfg (SESSION_CONFIG entry), n_blocks, n_trials_per_block, total_warmup, total_trials
+    """
+    cfg = SESSION_CONFIG[session_config_idx(session)]
+    n_blocks = cfg["n_blocks"]
+    n_trials_per_block = cfg["n_per_block"]
+    # Total trials = warm-up (4 + 2*(n_blocks-1)) + main (n_blocks * n_trials_per_block)
+    total_warmup = FIRST_WARMUP_TRIALS + (n_blocks - 1) * OTHER_WARMUP_TRIALS
+    return {
+        "cfg": cfg,
+        "n_blocks": n_blocks,
+        "n_trials_per_block": n_trials_per_block,
+        "total_warmup": total_warmup,
+        "total_trials": total_warmup + n_blocks * n_trials_per_block,
+    }
+
+
+def trials_in_block(block, n_trials_per_block):
+    """Trials of a block including its warm-up trials"""
+    return (FIRST_WARMUP_TRIALS if block == 1 else OTHER_WARMUP_TRIALS) + n_trials_per_block
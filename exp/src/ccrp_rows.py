@@ -0,0 +1,430 @@
+"""
+CCRP trial data: trial rows, column descriptions and the design part of the metadata sidecar
+"""
+import numpy as np
+
+from ccrp_design import (
+    CODE_VERSION,
+    COLOR_KEY_MAPPING,
+    COLOR_KEYS,
+    EXPERIMENT_NAME,
+    EXPERIMENT_NUMBER,
+    FEEDBACK_WAIT_TIME,
+    FIRST_WARMUP_TRIALS,
+    MAX_WAIT_TIME,
+    NUM_POSITIONS,
+    ONSET_ERROR_TOLERANCE_FRAMES,
+    OTHER_WARMUP_TRIALS,
+    POSITIONS_DEG,
+    RESPONSE_DEADLINE,
+    TRIAL_START_JITTER_MAX,
+    TRIAL_START_JITTER_MEAN,
+    TRIAL_START_JITTER_OFFSET,
+)
+
+COLOR_NAMES = ["Red", "Green", "Blue", "Yellow"]  # Color ids 1-4
+LOCATION_NAMES = ["upper right", "upper left", "lower left", "lower right"]  # Location ids 1-4
+
+
+def run_columns(*, color_map_layout, response_device, participant, handedness, color_vision, eye_vision):
+    """Leading row columns that stay the same for a whole run (experiment, device, participant)"""
+    return {
+        "ExperimentName": EXPERIMENT_NAME,
+        "ExperimentNumber": EXPERIMENT_NUMBER,
+        "CodeVersion": CODE_VERSION,
+        "ColorMapLayout": color_map_layout,
+        "ColorKeyMapping": COLOR_KEY_MAPPING,
+        "ResponseDevice": response_device,
+        "Subject": participant,
+        "Handedness": handedness,
+        "ColorVision": color_vision,
+        "EyeVision": eye_vision,
+    }
+
+
+def trial_tables(trial_data):
+    """
+    Scoring tables of one trial
+
+    Args:
+        trial_data: TrialView - trial of the session plan
+
+    Returns:
+        Dictionary - colors_shown (list of color ids on screen), max_reward, position_by_color
+        (color id -> position showing it) and reward_by_color (color id -> reward there, 0 if none)
+    """
+    position_to_color_id = trial_data["position_to_color_id"]
+    position_to_reward = trial_data["position_to_reward"]
+    rewards_at_positions = [r for r in position_to_reward.values() if r is not None]
+    return {
+        "colors_shown": [c for c in position_to_color_id.values() if c is not None],
+        "max_reward": max(rewards_at_positions) if rewards_at_positions else 0,
+        "position_by_color": {c: p for p, c in position_to_color_id.items() if c is not None},
+        "reward_by_color": {c: position_to_reward.get(p) or 0 for p, c in position_to_color_id.items() if c is not None},
+    }
+
+
+def score_trials(reward_by_color, chosen_color):
+    """
+    Score many trials at once with the rules of the trial loop and build_trial_row
+
+    The reward is the reward at the position showing the chosen color (0 for a color
+    without reward or a timeout); ACC is 1 when it equals the trial's maximum reward
+    and that maximum is above 0.
+
+    Args:
+        reward_by_color: Array (..., NUM_POSITIONS) - reward shown in color id 1..NUM_POSITIONS (0 = none)
+        chosen_color: Integer array (...) - color id chosen, 0 = timeout
+
+    Returns:
+        Tuple of arrays - reward, max_reward and ACC (0/1) per trial
+    """
+    reward_by_color = np.asarray(reward_by_color)
+    padded = np.concatenate([np.zeros_like(reward_by_color[..., :1]), reward_by_color], axis=-1)
+    reward = np.take_along_axis(padded, np.asarray(chosen_color)[..., None], axis=-1)[..., 0]
+    max_reward = reward_by_color.max(axis=-1)
+    acc = ((reward == max_reward) & (max_reward > 0)).astype(np.int8)
+    return reward, max_reward, acc
+
+
+def timing_compromised(phase_stats, frame_s):
+    """
+    True if fixation or feedback dropped a frame or the cue onset missed its flip by more than
+    ONSET_ERROR_TOLERANCE_FRAMES refresh periods
+
+    Args:
+        phase_stats: Dictionary - phase name ("fixation", "cue", "feedback") -> PhaseStats
+        frame_s: Float - refresh period (seconds)
+    """
+    cue_onset_error_s = phase_stats["cue"].onset_error_s
+    return (
+        phase_stats["fixation"].dropped_frames > 0
+        or phase_stats["feedback"].dropped_frames > 0
+        or (cue_onset_error_s is not None and abs(cue_onset_error_s) > ONSET_ERROR_TOLERANCE_FRAMES * frame_s)
+    )
+
+
+def seconds_to_ms(value):
+    """Seconds -> ms rounded to 0.001 ms; NaN when the value is unknown."""
+    return round(value * 1000, 3) if value is not None else float("nan")
+
+
+def build_trial_row(
+    *,
+    run_columns,
+    position_to_color_id,
+    position_to_reward,
+    colors_shown,
+    selected_position,
+    selected_color,
+    pressed_key,
+    keys,
+    cue_time,
+    response_time,
+    rt_ms,
+    rt_computer_clock_ms,
+    end_trial_time,
+    actual_reward,
+    max_reward,
+    cum_reward,
+    session,
+    block,
+    trial_index,
+    trial_condition_label,
+    num_cues,
+    warm_up=0,
+    trial_start_jitter_time_ms=0,
+    trial_wall_clock_str="",
+    session_elapsed_sec=0.0,
+    fixation_phase=None,
+    cue_phase=None,
+    feedback_phase=None,
+    phase_stats=None,
+    timing_compromised=False,
+    sync_write_delay_ms=float("nan"),
+    host_to_device_delay_ms=float("nan"),
+    clock_sync_error_ms=float("nan"),
+    device_clock_drift_ppm=float("nan"),
+    clock_sync_samples=0,
+    box_link=None,
+):
+    """
+    Build a trial data row (trial-end fields via finish_trial_row, which can also be applied later)
+
+    run_columns (from run_columns()) are the leading columns that are the same for every
+    trial of a run; the remaining arguments are the trial's own values.
+    """
+    fixation_stats = (phase_stats or {}).get("fixation")  # PhaseStats or None
+    feedback_stats = (phase_stats or {}).get("feedback")
+    # Color layout: 4-digit strings (position 0..3). Rewards from position_to_reward.
+    colors = [position_to_color_id[i] or 0 for i in range(NUM_POSITIONS)]
+    reward_vals = [position_to_reward[i] or 0 for i in range(NUM_POSITIONS)]
+    sorted_reward_values = sorted((value for value in reward_vals if value), reverse=True)
+    reward_rank_by_value = {value: rank + 1 for rank, value in enumerate(sorted_reward_values)}
+    reward_ranks = [reward_rank_by_value.get(value, 4) if value else 4 for value in reward_vals]
+
+    # Response
+    sel = selected_position
+    has_response = sel is not None
+    sel_color = position_to_color_id[sel] if has_response else None
+
+    if rt_ms is None:
+        rt_ms = MAX_WAIT_TIME * 1000 if not keys else 0.0
+    if rt_computer_clock_ms is None:
+        rt_computer_clock_ms = rt_ms
+    rt_sec = rt_ms / 1000
+    rt_difference = rt_computer_clock_ms - rt_ms
+    late = rt_sec > RESPONSE_DEADLINE
+    intr = 1 if (has_response and sel_color is None) else 0
+    # ACC: correct = selected the circle with highest reward (color-to-key rule)
+    acc = 1 if actual_reward == max_reward and max_reward > 0 else 0
+    chosen_location_idx = next(
+        (i for i in range(NUM_POSITIONS) if position_to_color_id.get(i) == selected_color),
+        None,
+    ) if selected_color is not None else None
+    resp_loc = (chosen_location_idx + 1) if chosen_location_idx is not None else 0
+    point_target = "".join("1" if i == chosen_location_idx else "0" for i in range(NUM_POSITIONS)) if chosen_location_idx is not None else "0000"
+    cue_response_exp_value = reward_vals[chosen_location_idx] if chosen_location_idx is not None else 0
+    cue_rank_response = reward_ranks[chosen_location_idx] if chosen_location_idx is not None else 0
+    exp_reward = max((value for value in reward_vals if value), default=0)
+
+    row = {
+        **run_columns,
+        "Session": session + 1,
+        "Block": block,
+        "Trial": trial_index + 1,
+        "WarmUpTrial": warm_up,
+        "CueCondition": trial_condition_label,
+        "NumCues": num_cues,
+        "TrialStartJitterTime": round(trial_start_jitter_time_ms, 2),  # ms
+        "CueSOA": 0,
+        "Cues": "".join(str(c) for c in colors),
+        "CueValues": "".join(str(v) for v in reward_vals),
+        "CueRanks": "".join(str(r) for r in reward_ranks),
+        "Response": pressed_key or "timeout",
+
+        # RespLoc: location id of the participant's chosen cue.
+        "RespLoc": resp_loc,
+        # PointTargetResponse: 4-digit one-hot vector of chosen cue location.
+        "PointTargetResponse": point_target,
+
+        "RT": round(rt_ms, 2),  # ms
+        "RTComputerClock": round(rt_computer_clock_ms, 2),  # ms
+        "RTDifference": round(rt_difference, 2),  # RTComputerClock - RT
+        "SyncWriteDelayMs": round(sync_write_delay_ms, 3),  # cue flip -> sync command flushed
+        "HostToDeviceDelayMs": round(host_to_device_delay_ms, 3),  # sync command flushed -> at the box (estimate)
+        "ClockSyncErrorMs": round(clock_sync_error_ms, 3),  # error bound of the device RT mapped to host time
+        "DeviceClockDriftPpm": round(device_clock_drift_ppm, 3),  # fitted device clock drift
+        "ClockSyncSamples": clock_sync_samples,  # ping samples in the clock model
+        "BoxFramesLost": (box_link or {}).get("lost", float("nan")),  # sequence gaps since the last row
+        "BoxFramesDuplicated": (box_link or {}).get("duplicates", float("nan")),  # repeated frames dropped
+        "BoxFrameErrors": (box_link or {}).get("errors", float("nan")),  # CRC failures + malformed lines
+        "LateResponse": late, # 1 - late response, 0 - on time response
+        "ACC": acc, # 1 - correct response, 0 - incorrect response
+        "INTR": intr, # 1 - intrusion error, 0 - no intrusion error, if respond to the non-cued position
+        "CueResponseValue": actual_reward, # the value of the cue at the selected position
+        "CueResponseExpValue": cue_response_exp_value, # expected reward value at chosen location
+        "CueRankResponse": cue_rank_response, # reward-value rank at chosen location
+        "ExpectedReward": exp_reward, # the highest available reward for the trial
+        "Reward": actual_reward, # the actual reward for the trial
+        "MaxReward": max_reward, # the maximum reward for the trial
+        "CumReward": cum_reward, # the cumulative reward for the session
+        "CueTime": round(cue_time * 1000, 2),  # ms
+        "PointTargetTime": round((cue_time + rt_sec) * 1000, 2) if rt_sec else round(cue_time * 1000, 2),  # ms
+        "ColorTargetTime": round(cue_time * 1000, 2),  # ms
+        "EndTrialTime": None,  # set by finish_trial_row (known once feedback has ended)
+        "TrialWallClockTime": None,
+        "SessionElapsedSec": None,
+        # Frame-locked phases (FrameScheduler): frames requested, intended vs achieved durations/onsets
+        "FixationFrames": fixation_phase.n_frames if fixation_phase else 0,
+        "FixationIntendedMs": seconds_to_ms(fixation_phase.intended_s if fixation_phase else None),
+        "FixationAchievedMs": seconds_to_ms(fixation_phase.achieved_s if fixation_phase else None),
+        "CueOnsetErrorMs": seconds_to_ms(cue_phase.onset_error_s if cue_phase else None),
+        "FeedbackFrames": None,
+        "FeedbackIntendedMs": None,
+        # Frame-interval instrumentation per phase (see FrameScheduler.phase_stats)
+        "FixationMaxIntervalMs": seconds_to_ms(fixation_stats.max_interval_s if fixation_stats else None),
+        "FixationDroppedFrames": fixation_stats.dropped_frames if fixation_stats else 0,
+        "FixationOnsetErrorMs": seconds_to_ms(fixation_stats.onset_error_s if fixation_stats else None),
+        "FeedbackMaxIntervalMs": None,
+        "FeedbackDroppedFrames": None,
+        "TimingCompromised": None,
+        "Note": "",
+    }
+    finish_trial_row(
+        row,
+        end_trial_time=end_trial_time,
+        trial_wall_clock_str=trial_wall_clock_str,
+        session_elapsed_sec=session_elapsed_sec,
+        feedback_phase=feedback_phase,
+        feedback_stats=feedback_stats,
+        timing_compromised=timing_compromised,
+    )
+    return row
+
+
+def finish_trial_row(
+    row,
+    *,
+    end_trial_time,
+    trial_wall_clock_str,
+    session_elapsed_sec,
+    feedback_phase,
+    feedback_stats,
+    timing_compromised,
+):
+    """Fill the row fields known only once feedback has ended (the row may be built while feedback is on screen)"""
+    row.update({
+        "EndTrialTime": round(end_trial_time * 1000, 2),  # ms
+        "TrialWallClockTime": trial_wall_clock_str,
+        "SessionElapsedSec": round(session_elapsed_sec, 3),
+        "FeedbackFrames": feedback_phase.n_frames if feedback_phase else 0,
+        "FeedbackIntendedMs": seconds_to_ms(feedback_phase.intended_s if feedback_phase else None),
+        "FeedbackMaxIntervalMs": seconds_to_ms(feedback_stats.max_interval_s if feedback_stats else None),
+        "FeedbackDroppedFrames": feedback_stats.dropped_frames if feedback_stats else 0,
+        "TimingCompromised": int(timing_compromised),
+    })
+
+
+# Descriptions for each trial-data column (keys must match build_trial_row).
+DAT_COLUMN_DESCRIPTIONS = {
+    "ExperimentName": "Short experiment label constant.",
+    "ExperimentNumber": "Numeric experiment ID constant.",
+    "CodeVersion": "Experiment code version configured at the top of the script.",
+    "ColorMapLayout": "Color-key legend layout: horizontal row or keyboard-matched 2x2.",
+    "ColorKeyMapping": "Four-character response-color mapping string. Current fixed value rgby means red, green, blue, yellow.",
+    "ResponseDevice": "Response input device used for this run: keyboard, response_box_cedrus, or self-made-response-box.",
+    "Subject": "Participant ID from the session dialog.",
+    "Handedness": "Participant handedness from the session dialog.",
+    "ColorVision": "Participant color vision status from the session dialog.",
+    "EyeVision": "Participant eye vision status from the session dialog.",
+    "Session": "Session index written as 0-based internal index plus 1 (matches dialog session number).",
+    "Block": "Block number (1-based) within the session.",
+    "Trial": "Trial index within the session (1-based, increments across warmup and main).",
+    "WarmUpTrial": "1 if warmup trial, 0 if main trial.",
+    "CueCondition": "Label for reward-value combination among non-zero CueValues in this trial. Allowed conditions: (1), (2), (3), (4), (2,1), (3,1), (4,1), (3,2), (4,2), (4,3). Order is descending reward value and ignores location order.",
+    "NumCues": "Count of cued stimulus locations this trial.",
+    "TrialStartJitterTime": "Duration of fixation before stimulus onset (ms); actual drawn jitter or DEBUG substitute.",
+    "CueSOA": "Cue–target stimulus onset asynchrony (ms); 0 here (no separate cue–mask SOA in this script).",
+    "Cues": "Four digits: color ID 1–4 at each spatial slot 0–3; 0 = no stimulus at that slot.",
+    "CueValues": "Four digits: reward digit at each slot; 0 = no reward at that slot.",
+    "CueRanks": "Four digits: reward-value rank at each location; 1 = highest reward, 2 = second-highest reward when two cues are present, 4 = no reward at that location.",
+    "Response": "Key pressed (lowercase) or timeout; escape not logged as a trial row.",
+    "RespLoc": "Location id (1-4) of where the participant's chosen cue is on screen; 0 if no valid chosen location.",
+    "PointTargetResponse": "Four-digit one-hot vector from location 1 to 4: 1 marks where the participant's chosen cue is, 0 marks all other locations; 0000 if no valid chosen location.",
+    "RT": "Reaction time (ms). For response_box_cedrus and self-made-response-box, this is the device timer plus SyncWriteDelayMs plus HostToDeviceDelayMs, i.e. measured from the cue flip like RTComputerClock; for self-made-response-box with a clock model, the device timer is also mapped to host time (drift-corrected). While HostToDeviceDelayMs is NaN (no round trip measured yet), the RT excludes the transfer of the timer-reset command to the box. For keyboard, this matches RTComputerClock.",
+    "RTComputerClock": "Reaction time (ms) using the PsychoPy computer clock, from the cue flip to the arrival of the response on the host.",
+    "RTDifference": "RTComputerClock minus RT (ms). For keyboard this is 0; for serial response boxes both share the cue-flip origin, so this is the response transfer latency (device to host).",
+    "SyncWriteDelayMs": "Host-side delay (ms) from the cue flip to the response box timer-reset command (Cedrus e5, self-made S) being flushed; the command is sent from a callOnFlip callback. NaN without a serial response box.",
+    "HostToDeviceDelayMs": "Estimated transfer (ms) of the timer-reset command from the host flush to the box: half the fastest round trip of the pings sent during inter-trial intervals (Cedrus: _c1 query; self-made: P ping of the clock model). Included in RT. NaN for keyboard or before the first round trip.",
+    "ClockSyncErrorMs": "Error bound (ms) of the box RT origin. Self-made box with a clock model: half the fastest ping round trip + largest fit residual + 3 SE of the drift over the RT. Cedrus: HostToDeviceDelayMs (the transfer lies between 0 and the round trip). NaN without a measurement (keyboard, or too few pings yet).",
+    "DeviceClockDriftPpm": "Drift of the self-made box clock against the host clock (ppm, positive = device slow), from the ping model fitted during inter-trial intervals. NaN without a clock model.",
+    "ClockSyncSamples": "Number of ping samples the clock model used for this trial's RT (0 without a clock model).",
+    "BoxFramesLost": "Self-made box frames missing from the sequence numbers since the previous row (events or ping replies lost on the link). Always 0 with ASCII firmware (no sequence numbers); NaN for other devices.",
+    "BoxFramesDuplicated": "Self-made box frames received twice since the previous row and dropped. NaN for other devices.",
+    "BoxFrameErrors": "Self-made box binary frames failing the CRC plus ASCII lines that could not be parsed, since the previous row. NaN for other devices.",
+    "LateResponse": "True if RT (seconds) exceeded RESPONSE_DEADLINE; False otherwise.",
+    "ACC": "1 if obtained reward equals max possible reward on that trial and max > 0; else 0.",
+    "INTR": "1 if participant responded with a key whose mapped color was absent on screen; else 0.",
+    "CueResponseValue": "Reward points obtained from the chosen color’s on-screen location (0 if wrong/absent).",
+    "CueResponseExpValue": "Expected reward value at location chosen.",
+    "CueRankResponse": "Rank of value at location chosen; 1 = highest reward, 2 = second-highest reward when two cues are present, 4 = chosen location has no reward, 0 = no valid chosen location.",
+    "ExpectedReward": "Highest possible reward in this trial, computed as max non-zero digit in CueValues (0 if no non-zero CueValues).",
+    "Reward": "Same as obtained points for this trial (CueResponseValue).",
+    "MaxReward": "Maximum reward digit among cued locations this trial.",
+    "CumReward": "Cumulative monetary-style score (points × REWARD_MONEY_FACTOR), running total.",
+    "CueTime": "Stimulus onset time from trial clock (ms), captured inside the cue flip (callOnFlip).",
+    "PointTargetTime": "Time of keypress from trial clock (ms), or cue time if no RT.",
+    "ColorTargetTime": "Same as cue onset time here (ms); reserved for paradigms with separate color-target onset.",
+    "EndTrialTime": "Trial clock time (ms) at end of feedback phase.",
+    "TrialWallClockTime": "Local wall-clock date and time when this trial row was logged (YYYY-MM-DD HH:MM:SS.mmm).",
+    "SessionElapsedSec": "Seconds since session timing start (monotonic clock), from immediately before the first trial loop iteration after instructions.",
+    "FixationFrames": "Frames the fixation phase was presented for: jitter time rounded to whole frames at the measured refresh rate.",
+    "FixationIntendedMs": "FixationFrames times the refresh period (ms): the fixation duration the scheduler aimed for.",
+    "FixationAchievedMs": "Flip time of cue onset minus flip time of fixation onset (ms).",
+    "CueOnsetErrorMs": "Flip time of cue onset minus its intended time, fixation onset + FixationIntendedMs (ms); positive = cue onset late, e.g. by dropped frames.",
+    "FeedbackFrames": "Frames the feedback phase was presented for (FEEDBACK_WAIT_TIME rounded to whole frames).",
+    "FeedbackIntendedMs": "FeedbackFrames times the refresh period (ms).",
+    "FixationMaxIntervalMs": "Longest flip-to-flip interval of the fixation phase, up to cue onset (ms); about one refresh period when no frame was dropped.",
+    "FixationDroppedFrames": "Frames dropped during fixation: each flip interval above 1.5 refresh periods adds round(interval / period) - 1.",
+    "FixationOnsetErrorMs": "Flip time of fixation onset minus its intended time, previous feedback onset + FeedbackIntendedMs (ms); NaN after a break screen or escape prompt and on the first trial.",
+    "FeedbackMaxIntervalMs": "Longest flip-to-flip interval within the feedback phase (ms); the last frame ends at the next trial and is not included.",
+    "FeedbackDroppedFrames": "Frames dropped during feedback (same rule as FixationDroppedFrames).",
+    "TimingCompromised": "1 if fixation or feedback dropped a frame or |CueOnsetErrorMs| exceeded ONSET_ERROR_TOLERANCE_FRAMES refresh periods; 0 otherwise. Use to exclude trials with compromised stimulus timing.",
+    "Note": "Free-text notes (e.g. escape path); usually empty.",
+}
+
+
+def design_metadata(
+    *,
+    session,
+    cfg,
+    n_blocks,
+    n_trials_total,
+    n_trials_per_block,
+    total_warmup,
+    refresh_hz,
+    jitter_note,
+    session_plan,
+):
+    """
+    Trial timing and design section of the metadata sidecar
+
+    Args:
+        session: Integer - 1-based session number
+        cfg: Dictionary - SESSION_CONFIG entry of the session
+        n_blocks, n_trials_total, n_trials_per_block, total_warmup: Integers - session counts
+        refresh_hz: Float - refresh rate the phases were scheduled at (Hz)
+        jitter_note: String - how the fixation jitter was obtained
+        session_plan: Dictionary - seed, plan hash, plan file and resume information
+
+    Returns:
+        Dictionary - JSON-ready "trial_timing_and_design" payload
+    """
+    reward_conditions = cfg.get("reward_conditions", [])
+    reward_labels = [cond["label"] for cond in reward_conditions]
+    n_reward_conds = len(reward_conditions)
+    reps_per_condition = (n_trials_per_block // n_reward_conds) if n_reward_conds else 0
+    return {
+        "cue_soa_ms": 0,
+        "trial_start_jitter_offset_s": TRIAL_START_JITTER_OFFSET,
+        "trial_start_jitter_exponential_mean_s": TRIAL_START_JITTER_MEAN,
+        "trial_start_jitter_max_cap_s": TRIAL_START_JITTER_MAX,
+        "trial_start_jitter_note": jitter_note,
+        "response_key_wait_max_s": MAX_WAIT_TIME,
+        "late_response_threshold_s": RESPONSE_DEADLINE,
+        "feedback_duration_s": FEEDBACK_WAIT_TIME,
+        "phase_timing_note": "Fixation and feedback are presented frame by frame for a whole number of frames at scheduler_refresh_rate_hz; the cue screen stays until response or timeout.",
+        "scheduler_refresh_rate_hz": refresh_hz,
+        "warmup_trials_first_block": FIRST_WARMUP_TRIALS,
+        "warmup_trials_other_blocks": OTHER_WARMUP_TRIALS,
+        "blocks": n_blocks,
+        "main_trials_per_block": n_trials_per_block,
+        "total_warmup_trials": total_warmup,
+        "total_trials_warmup_plus_main": n_trials_total,
+        "single_stimulus_at_center": bool(cfg.get("center", False)),
+        "color_key_legend_on_screen_sessions_1_to_3": session in (1, 2, 3),
+        "cue_condition_labels": reward_labels,
+        "number_of_reward_conditions": n_reward_conds,
+        "main_trials_per_reward_condition_per_block_balanced": reps_per_condition,
+        "color_id_mapping_for_cues": {str(i + 1): COLOR_NAMES[i] for i in range(NUM_POSITIONS)},
+        "color_to_key_mapping": {COLOR_NAMES[i]: COLOR_KEYS[i].upper() for i in range(NUM_POSITIONS)},
+        "location_id_mapping": {
+            str(i + 1): {
+                "screen_location": LOCATION_NAMES[i],
+                "position_deg_x_y": [round(POSITIONS_DEG[i][0], 3), round(POSITIONS_DEG[i][1], 3)],
+            }
+            for i in range(NUM_POSITIONS)
+        },
+        "location_id_mapping_note": "Location ids are 1-based positions in Cues, CueValues, CueRanks, RespLoc, and PointTargetResponse.",
+        "session_plan": session_plan,
+        "per_trial_logging_note": "TrialWallClockTime is local wall time; SessionElapsedSec is monotonic elapsed seconds since pre-loop session start.",
+    }
+
+
+def column_metadata(columns):
+    """Column order and descriptions of the metadata sidecar"""
+    return {
+        "column_order": columns,
+        "column_definitions": {col: DAT_COLUMN_DESCRIPTIONS.get(col, "No description defined.") for col in columns},
+    }
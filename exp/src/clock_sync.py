@@ -0,0 +1,240 @@
+"""
+Host/device clock synchronization: ping samples and an online offset/drift model (self-made response box),
+round-trip estimate of the host-to-device transfer (Cedrus XID box)
+"""
+import math
+from collections import deque, namedtuple
+
+import numpy as np
+
+DEVICE_CLOCK_WRAP_US = 2 ** 32  # Integer: Arduino micros() wraps after 2**32 us (~71.6 min)
+PING_INTERVAL_S = 0.1  # Float: minimum time between pings (seconds)
+PING_TIMEOUT_S = 0.25  # Float: a ping without reply after this long is given up (seconds)
+MAX_SAMPLES = 200  # Integer: most recent ping samples the model is fitted to
+RTT_ACCEPT_FACTOR = 1.5  # Float: samples with a round trip above this many times the fastest one are not fitted
+MIN_FIT_SAMPLES = 5  # Integer: accepted samples needed before the model is used
+
+# One ping: host send time, host arrival time of the reply (seconds), device clock (seconds, unwrapped)
+ClockSample = namedtuple("ClockSample", ["host_send", "host_recv", "device_s"])
+
+# Fitted model: host = offset_s + rate * (device_s - origin_s); error terms in seconds
+ClockModel = namedtuple(
+    "ClockModel", ["origin_s", "offset_s", "rate", "rate_stderr", "max_residual_s", "min_rtt_s", "n_samples"]
+)
+
+
+def fit_clock_model(samples, rtt_accept_factor=RTT_ACCEPT_FACTOR):
+    """
+    Least-squares fit of host time against device time
+
+    Each sample's host time is the midpoint of its round trip, which is off by at
+    most half the round trip; only samples whose round trip is within
+    rtt_accept_factor of the fastest one are fitted.
+
+    Args:
+        samples: List of ClockSample - ping samples
+        rtt_accept_factor: Float - round-trip filter
+
+    Returns:
+        ClockModel, or None with fewer than MIN_FIT_SAMPLES accepted samples
+    """
+    if not samples:
+        return None
+    host_send, host_recv, device_s = (np.array(column) for column in zip(*samples))
+    rtt = host_recv - host_send
+    min_rtt = float(rtt.min())
+    accepted = rtt <= min_rtt * rtt_accept_factor + 1e-6
+    if accepted.sum() < MIN_FIT_SAMPLES:
+        return None
+    origin = float(device_s[accepted][0])
+    x = device_s[accepted] - origin
+    y = (host_send[accepted] + host_recv[accepted]) / 2
+    if np.ptp(x) <= 0:
+        return None
+    rate, offset = np.polyfit(x, y, 1)
+    residuals = y - (offset + rate * x)
+    dof = max(1, len(x) - 2)
+    rate_stderr = math.sqrt(float(residuals @ residuals) / dof / float(((x - x.mean()) ** 2).sum()))
+    return ClockModel(
+        origin, float(offset), float(rate), rate_stderr, float(np.abs(residuals).max()), min_rtt, int(accepted.sum())
+    )
+
+
+class ClockSync:
+    """
+    Ping the box during inter-trial intervals and keep an online model of its clock
+
+    service() is called once per frame of an idle phase (e.g. feedback): it collects
+    the replies that arrived and sends the next ping when due. Only one ping is in
+    flight at a time, so a reply always belongs to the last ping sent.
+    """
+
+    def __init__(self, reader, ping_interval_s=PING_INTERVAL_S, ping_timeout_s=PING_TIMEOUT_S, max_samples=MAX_SAMPLES):
+        """
+        Args:
+            reader: SerialResponseReader - started reader of a box whose parser has a PING_COMMAND
+            ping_interval_s: Float - minimum time between pings (seconds)
+            ping_timeout_s: Float - time after which an unanswered ping is dropped (seconds)
+            max_samples: Integer - samples kept for the fit
+        """
+        self.reader = reader
+        self.ping_interval_s = ping_interval_s
+        self.ping_timeout_s = ping_timeout_s
+        self.samples = deque(maxlen=max_samples)  # Deque of ClockSample: most recent pings
+        self.model = None  # ClockModel or None: latest fit
+        self.pings_sent = 0  # Integer: pings written
+        self.pings_lost = 0  # Integer: pings dropped without reply
+        self._in_flight = None  # Float or None: host send time of the unanswered ping
+        self._last_send = -math.inf  # Float: host time of the last ping
+        self._last_raw_us = None  # Integer: last raw device clock, for unwrapping
+        self._wraps = 0  # Integer: device clock wrap-arounds seen
+
+    def _unwrap(self, device_us, update=False):
+        """Device clock reading -> seconds on the unwrapped device timeline (nearest wrap to the last ping)"""
+        wraps = self._wraps
+        if self._last_raw_us is not None:
+            if device_us < self._last_raw_us - DEVICE_CLOCK_WRAP_US // 2:
+                wraps += 1
+            elif device_us > self._last_raw_us + DEVICE_CLOCK_WRAP_US // 2:
+                wraps -= 1
+        if update:
+            self._wraps, self._last_raw_us = wraps, device_us
+        return (device_us + wraps * DEVICE_CLOCK_WRAP_US) / 1e6
+
+    def service(self, frame=None):
+        """Collect ping replies and send the next ping when due; returns True if the model was refitted"""
+        refit = False
+        for reply in self.reader.pop_ping_replies():
+            if self._in_flight is None or reply.host_time < self._in_flight:
+                continue  # Late reply of a dropped ping
+            self.samples.append(ClockSample(self._in_flight, reply.host_time, self._unwrap(reply.device_us, update=True)))
+            self._in_flight = None
+            refit = True
+        if refit:
+            self.model = fit_clock_model(list(self.samples))
+        now = self.reader.time_fn()
+        if self._in_flight is not None and now - self._in_flight > self.ping_timeout_s:
+            self._in_flight = None
+            self.pings_lost += 1
+        if self._in_flight is None and now - self._last_send >= self.ping_interval_s:
+            _, self._in_flight = self.reader.send_command(self.reader.parser.PING_COMMAND)
+            self._last_send = self._in_flight
+            self.pings_sent += 1
+        return refit
+
+    def to_host(self, device_us):
+        """
+        Map a device clock reading onto host time
+
+        Returns:
+            Tuple of floats - (host time, error bound) in seconds, or None without a model
+        """
+        model = self.model
+        if model is None:
+            return None
+        x = self._unwrap(device_us) - model.origin_s
+        return model.offset_s + model.rate * x, self.error_bound(x)
+
+    def map_latency(self, latency_ms):
+        """
+        Convert a device latency measured from the sync command's arrival into host milliseconds after its flush
+
+        The command reaches the box about half the fastest round trip after the flush,
+        and the device interval is rescaled by the fitted clock rate.
+
+        Returns:
+            Tuple of floats - (host ms after the flush, error bound ms), or None without a model
+        """
+        model = self.model
+        if model is None:
+            return None
+        one_way_s = model.min_rtt_s / 2
+        return (one_way_s + model.rate * latency_ms / 1000) * 1000, self.error_bound(latency_ms / 1000) * 1000
+
+    def error_bound(self, interval_s):
+        """Error bound (seconds) of a device interval of interval_s mapped to host time"""
+        model = self.model
+        if model is None:
+            return math.nan
+        # Half the fastest round trip (unknown asymmetry), worst fit residual, 3 SE of the rate over the interval
+        return model.min_rtt_s / 2 + model.max_residual_s + 3 * model.rate_stderr * abs(interval_s)
+
+    def drift_ppm(self):
+        """Float: device clock drift against the host (ppm, positive = device slow), NaN without a model"""
+        return math.nan if self.model is None else (self.model.rate - 1) * 1e6
+
+    def to_dict(self):
+        """Dictionary - JSON-ready summary of the synchronization"""
+        model = self.model
+        return {
+            "ping_interval_s": self.ping_interval_s,
+            "pings_sent": self.pings_sent,
+            "pings_lost": self.pings_lost,
+            "samples_kept": len(self.samples),
+            "fitted_samples": model.n_samples if model else 0,
+            "drift_ppm": None if model is None else round(self.drift_ppm(), 3),
+            "min_rtt_ms": None if model is None else round(model.min_rtt_s * 1000, 3),
+            "max_residual_ms": None if model is None else round(model.max_residual_s * 1000, 3),
+        }
+
+
+class RoundTripProbe:
+    """
+    Time round trips to a box that reports no clock (Cedrus XID: b"_c1" -> b"_xid0")
+
+    Used like ClockSync.service() during inter-trial intervals. The timer-reset command
+    sent at the cue reaches the box between 0 and one round trip after its flush; half
+    the fastest recent round trip is taken as the transfer, with that same half as the
+    error bound.
+    """
+
+    def __init__(self, reader, ping_interval_s=PING_INTERVAL_S, ping_timeout_s=PING_TIMEOUT_S, max_samples=MAX_SAMPLES):
+        """
+        Args:
+            reader: SerialResponseReader - started reader of a box whose parser has a PING_COMMAND
+            ping_interval_s: Float - minimum time between pings (seconds)
+            ping_timeout_s: Float - time after which an unanswered ping is dropped (seconds)
+            max_samples: Integer - most recent round trips kept
+        """
+        self.reader = reader
+        self.ping_interval_s = ping_interval_s
+        self.ping_timeout_s = ping_timeout_s
+        self.rtts = deque(maxlen=max_samples)  # Deque of floats: recent round trips (seconds)
+        self.pings_sent = 0  # Integer: pings written
+        self.pings_lost = 0  # Integer: pings dropped without reply
+        self._in_flight = None  # Float or None: host flush time of the unanswered ping
+        self._last_send = -math.inf  # Float: host time of the last ping
+
+    def service(self, frame=None):
+        """Collect ping replies and send the next ping when due; returns True if a round trip was added"""
+        added = False
+        for reply in self.reader.pop_ping_replies():
+            if self._in_flight is None or reply.host_time < self._in_flight:
+                continue  # Late reply of a dropped ping
+            self.rtts.append(reply.host_time - self._in_flight)
+            self._in_flight = None
+            added = True
+        now = self.reader.time_fn()
+        if self._in_flight is not None and now - self._in_flight > self.ping_timeout_s:
+            self._in_flight = None
+            self.pings_lost += 1
+        if self._in_flight is None and now - self._last_send >= self.ping_interval_s:
+            _, self._in_flight = self.reader.send_command(self.reader.parser.PING_COMMAND)
+            self._last_send = self._in_flight
+            self.pings_sent += 1
+        return added
+
+    def one_way_ms(self):
+        """Float: estimated host-to-device transfer (ms) = its error bound; NaN before the first round trip"""
+        return min(self.rtts) / 2 * 1000 if self.rtts else math.nan
+
+    def to_dict(self):
+        """Dictionary - JSON-ready summary of the round trips"""
+        return {
+            "ping_interval_s": self.ping_interval_s,
+            "pings_sent": self.pings_sent,
+            "pings_lost": self.pings_lost,
+            "samples_kept": len(self.rtts),
+            "min_rtt_ms": round(min(self.rtts) * 1000, 3) if self.rtts else None,
+            "median_rtt_ms": round(float(np.median(self.rtts)) * 1000, 3) if self.rtts else None,
+        }
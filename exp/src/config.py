@@ -11,6 +11,7 @@ WINDOW_CONFIG = {
     'units': 'deg',  # String: unit type for stimulus sizes ('deg' = degrees of visual angle)
     'color_space': 'rgb',  # String: color space format ('rgb' = red-green-blue values from -1 to 1)
     'bg_color': (0, 0, 0),  # Tuple of 3 floats: background color RGB values (0,0,0) = black
+    'refresh_rate': 60,  # Float: refresh rate in Hz used for frame-locked timing if it cannot be measured
 }
 
 # Monitor settings - physical properties of the display monitor
@@ -24,4 +25,10 @@ EXPERIMENT_CONFIG = {
     'subject': 0,  # Integer: participant number (0 = default, will be set in dialog)
     'session': 1,  # Integer: session number (1 = first practice session)
     'start_block': 1,  # Integer: which block to start from (1 = first block)
+    'seed': None,  # Integer or None: random seed for trial order and jitter (None = derived from subject and session)
+}
+
+# Display cache - pre-rendered cue/color displays (see display_cache.py)
+DISPLAY_CACHE_CONFIG = {
+    'max_entries': 256,  # Integer: maximum number of pre-rendered displays kept in memory (least recently used evicted first)
 }
@@ -0,0 +1,166 @@
+"""
+Pre-rasterized cue sprites: anti-aliased textures drawn once at session start at the exact pixel size
+"""
+import math
+
+from PIL import Image, ImageDraw, ImageFont
+from psychopy import visual
+from psychopy.tools.monitorunittools import deg2pix
+
+SUPERSAMPLE = 4  # Integer: sprites are drawn at this many times their size, then box-filtered down (coverage anti-aliasing)
+SPRITE_FONTS = ("arial.ttf", "Arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf")  # Fonts tried for rasterized text
+SPRITE_BOLD_FONTS = ("arialbd.ttf", "Arial Bold.ttf", "DejaVuSans-Bold.ttf", "LiberationSans-Bold.ttf")  # Bold variants
+
+
+def rgb_to_rgba8(color, alpha=255):
+    """Convert a PsychoPy rgb color (-1..1) to an 8-bit RGBA tuple"""
+    return tuple(int(round((c + 1) * 127.5)) for c in color) + (alpha,)
+
+
+def _sprite_size(radius_px):
+    """Even side length (pixels) holding a disc of radius_px, so the sprite centre falls on a pixel corner"""
+    return 2 * int(math.ceil(radius_px)) + 2
+
+
+def load_font(size_px, bold=False):
+    """First available font of SPRITE_FONTS (SPRITE_BOLD_FONTS if bold) at size_px, else PIL's default font"""
+    for name in SPRITE_BOLD_FONTS if bold else SPRITE_FONTS:
+        try:
+            return ImageFont.truetype(name, size_px)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size_px)
+
+
+def rasterize_disc(radius_px, color, inner_radius_px=0.0, inner_color=None, text="", text_color=None, text_height_px=0.0):
+    """
+    Draw a disc (optionally with an inner disc and centred text) into an anti-aliased RGBA image
+
+    Args:
+        radius_px: Float - outer radius (pixels)
+        color: Tuple - outer disc color (PsychoPy rgb, -1..1)
+        inner_radius_px: Float - inner disc radius (pixels, 0 = none)
+        inner_color: Tuple or None - inner disc color (PsychoPy rgb)
+        text: String - text drawn at the centre ("" = none)
+        text_color: Tuple or None - text color (PsychoPy rgb)
+        text_height_px: Float - text height (pixels), as TextStim height
+
+    Returns:
+        PIL Image - RGBA, transparent outside the disc, side length from _sprite_size(radius_px)
+    """
+    size = _sprite_size(radius_px)
+    big = Image.new("RGBA", (size * SUPERSAMPLE, size * SUPERSAMPLE), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(big)
+    centre = size * SUPERSAMPLE / 2
+
+    def disc(r, fill):
+        r *= SUPERSAMPLE
+        draw.ellipse((centre - r, centre - r, centre + r, centre + r), fill=rgb_to_rgba8(fill))
+
+    disc(radius_px, color)
+    if inner_radius_px > 0:
+        disc(inner_radius_px, inner_color)
+    if text:
+        font = load_font(int(round(text_height_px * SUPERSAMPLE)))
+        draw.text((centre, centre), text, fill=rgb_to_rgba8(text_color), font=font, anchor="mm")
+    return big.resize((size, size), Image.BOX)  # Area average of SUPERSAMPLE^2 samples per pixel
+
+
+class CueSprites:
+    """
+    Fixed pool of cue stimuli: one ImageStim per (position, color, reward digit or blank)
+
+    Each (color, reward) cue is rasterized once; every position gets its own
+    ImageStim of it, placed at session start. Selecting and drawing a cue never
+    moves a stimulus, changes its text or creates anything. Sprites are in pix
+    units at their native size, so texels map one-to-one onto screen pixels and
+    edges are anti-aliased without MSAA.
+    """
+
+    def __init__(
+        self, win, positions_deg, colors, rewards, outer_radius_deg, inner_radius_deg, text_height_deg,
+        bg_color, text_color, opacity=1.0,
+    ):
+        """
+        Args:
+            win: Window object - the display window (its monitor converts deg to pixels)
+            positions_deg: List of (x, y) tuples - cue positions (deg), position index i = positions_deg[i]
+            colors: List of tuples - cue colors (PsychoPy rgb), color id i + 1 = colors[i]
+            rewards: List of integers - reward digits that can appear on a cue
+            outer_radius_deg, inner_radius_deg: Floats - colored ring and white centre radii (deg)
+            text_height_deg: Float - reward digit height (deg)
+            bg_color: Tuple - inner disc color (PsychoPy rgb)
+            text_color: Tuple - digit color (PsychoPy rgb)
+            opacity: Float - stimulus opacity
+        """
+        self.win = win
+        self.outer_radius_px = float(deg2pix(outer_radius_deg, win.monitor))  # Float: outer radius (pixels)
+        inner_radius_px = float(deg2pix(inner_radius_deg, win.monitor))
+        text_height_px = float(deg2pix(text_height_deg, win.monitor))
+        self.size_px = _sprite_size(self.outer_radius_px)  # Integer: sprite side length (pixels)
+        self.images = {}  # Dictionary: (color id, reward or None) -> PIL Image
+        for color_id, color in enumerate(colors, start=1):
+            for reward in [None] + list(rewards):
+                self.images[(color_id, reward)] = rasterize_disc(
+                    self.outer_radius_px, color, inner_radius_px, bg_color,
+                    "" if reward is None else str(reward), text_color, text_height_px,
+                )
+        self.stimuli = {}  # Dictionary: (position index, color id, reward or None) -> ImageStim
+        for pos_idx, pos_deg in enumerate(positions_deg):
+            pos_px = _pix_pos(win, pos_deg)
+            for (color_id, reward), image in self.images.items():
+                self.stimuli[(pos_idx, color_id, reward)] = visual.ImageStim(
+                    win, image=image, units="pix", size=(self.size_px, self.size_px),
+                    pos=pos_px, interpolate=False, opacity=opacity,
+                )
+
+    def __len__(self):
+        return len(self.stimuli)
+
+    def handles(self, position_to_color_id, position_to_reward):
+        """
+        Select the stimuli of one display
+
+        Args:
+            position_to_color_id: Dictionary - position index -> color id (None = no cue there)
+            position_to_reward: Dictionary - position index -> reward (None = blank centre)
+
+        Returns:
+            Tuple of ImageStims - draw them in order to show the cues
+        """
+        return tuple(
+            self.stimuli[(pos_idx, color_id, position_to_reward.get(pos_idx))]
+            for pos_idx, color_id in position_to_color_id.items()
+            if color_id is not None
+        )
+
+    def draw(self, pos_idx, color_id, reward):
+        """Draw the cue of color_id showing reward (None = blank centre) at position pos_idx"""
+        self.stimuli[(pos_idx, color_id, reward)].draw()
+
+
+def _pix_pos(win, pos_deg):
+    """Screen position (deg) -> whole-pixel position, so the sprite is not resampled"""
+    return tuple(round(float(deg2pix(v, win.monitor))) for v in pos_deg)
+
+
+def disc_stim(win, radius_deg, color, pos_deg=(0, 0), opacity=1.0):
+    """
+    ImageStim of a plain anti-aliased disc (e.g. the fixation point)
+
+    Args:
+        win: Window object - the display window
+        radius_deg: Float - disc radius (deg)
+        color: Tuple - disc color (PsychoPy rgb)
+        pos_deg: Tuple - centre (deg)
+        opacity: Float - stimulus opacity
+
+    Returns:
+        ImageStim - in pix units at its native size
+    """
+    radius_px = float(deg2pix(radius_deg, win.monitor))
+    size = _sprite_size(radius_px)
+    return visual.ImageStim(
+        win, image=rasterize_disc(radius_px, color), units="pix", size=(size, size),
+        pos=_pix_pos(win, pos_deg), interpolate=False, opacity=opacity,
+    )
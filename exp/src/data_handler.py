@@ -4,8 +4,26 @@ Data file creation and saving
 import os
 from datetime import datetime
 
+# Column headers of the data rows, in file order
+DAT_COLUMNS = (
+    'Trial', 'Block', 'CueCond', 'CueSOA', 'Cues', 'TargetColors',
+    'Response', 'RT', 'ACC', 'Reward', 'ExpectedReward',
+)
 
-def create_data_file(experiment_name, subject, session, practice):
+# Row template matching DAT_COLUMNS (compiled once, filled by format_trial_row())
+_ROW_FORMAT = (
+    '{trial_num}\t{trial.block}\t{trial.cue_cond}\t{trial.cue_soa}\t{cues}\t{trial.target_colors}\t'
+    '{trial.response}\t{trial.rt:.3f}\t{trial.acc}\t{trial.reward}\t{trial.expected_reward}\t\n'
+)
+
+# Column headers of the phase timing file (one row per presented phase)
+TIMING_COLUMNS = ('Trial', 'Phase', 'Frames', 'IntendedMs', 'AchievedMs', 'OnsetErrorMs')
+
+# Column headers of the texture file (one row per trial, from capture_pool.CapturePool.stats())
+TEXTURE_COLUMNS = ('Trial', 'Captures', 'TexturesCreated', 'LiveTextures', 'TextureBytes')
+
+
+def create_data_file(experiment_name, subject, session, practice, seed=None, plan_hash=None, start_block=None):
     """
     Create data file and write header information
     
@@ -14,6 +32,9 @@ def create_data_file(experiment_name, subject, session, practice):
         subject: Integer - participant number
         session: Integer - session number
         practice: Boolean - True if practice session, False if experimental
+        seed: Integer or None - random seed of the session (written to the header if given)
+        plan_hash: String or None - session_plan.trial_list_hash() of the whole session (written if given)
+        start_block: Integer or None - first block run by this file (written if given)
     
     Returns:
         Tuple - (file object, filename string)
@@ -38,25 +59,38 @@ def create_data_file(experiment_name, subject, session, practice):
     f.write(f'Session: {session}\n')  # String: "Session: 1\n"
     f.write(f'Practice: {practice}\n')  # String: "Practice: True\n"
     f.write(f'Start time: {timestamp}\n')  # String: "Start time: 2025-01-04_15-46-28\n"
+    if seed is not None:  # Check: seeded session?
+        f.write(f'Seed: {seed}\n')  # String: "Seed: 1396824749293534193\n"
+    if plan_hash is not None:  # Check: plan hash known?
+        f.write(f'Plan hash: {plan_hash}\n')  # String: same hash = same trials and jitter as an earlier run
+    if start_block is not None:  # Check: start block known?
+        f.write(f'Start block: {start_block}\n')  # String: "Start block: 3\n" for a resumed session
     f.write('\n')  # Empty line
     
-    # Write column headers - tab-separated
-    f.write('Trial\t')  # String: "Trial\t"
-    f.write('Block\t')  # String: "Block\t"
-    f.write('CueCond\t')  # String: "CueCond\t"
-    f.write('CueSOA\t')  # String: "CueSOA\t"
-    f.write('Cues\t')  # String: "Cues\t"
-    f.write('TargetColors\t')  # String: "TargetColors\t"
-    f.write('Response\t')  # String: "Response\t"
-    f.write('RT\t')  # String: "RT\t"
-    f.write('ACC\t')  # String: "ACC\t"
-    f.write('Reward\t')  # String: "Reward\t"
-    f.write('ExpectedReward\t')  # String: "ExpectedReward\t"
-    f.write('\n')  # Newline: end of header row
+    # Write column headers - tab-separated, same layout as the rows from format_trial_row()
+    f.write('\t'.join(DAT_COLUMNS) + '\t\n')  # String: "Trial\tBlock\t...\tExpectedReward\t\n"
     
     return f, filename  # Tuple: (File object, "CCRP-Prac-subj-000-ses-001-...")
 
 
+def format_trial_row(trial, trial_num):
+    """
+    Format one data row (tab-separated, trailing tab, newline) in DAT_COLUMNS order
+    
+    Args:
+        trial: Trial object - trial data to format
+        trial_num: Integer - trial number (1, 2, 3, ...)
+    
+    Returns:
+        String - e.g. "1\t1\t1\t200\t1020\t1234\tZ\t0.523\t1\t4\t4\t\n"
+    """
+    return _ROW_FORMAT.format(
+        trial_num=trial_num,
+        trial=trial,
+        cues="".join(map(str, trial.cues)),  # String: convert list to string (e.g., [1,0,2,0] -> "1020")
+    )
+
+
 def save_trial_data(f, trial, trial_num):
     """
     Save data from a single trial - write one row of data
@@ -66,19 +100,74 @@ def save_trial_data(f, trial, trial_num):
         trial: Trial object - trial data to save
         trial_num: Integer - trial number (1, 2, 3, ...)
     """
-    cues_str = "".join(str(x) for x in trial.cues)  # String: convert list to string (e.g., [1,0,2,0] -> "1020")
-    
-    # Write trial data - tab-separated values
-    f.write(f'{trial_num}\t')  # String: "1\t"
-    f.write(f'{trial.block}\t')  # String: "1\t"
-    f.write(f'{trial.cue_cond}\t')  # String: "1\t"
-    f.write(f'{trial.cue_soa}\t')  # String: "200\t"
-    f.write(f'{cues_str}\t')  # String: "1020\t"
-    f.write(f'{trial.target_colors}\t')  # String: "1234\t"
-    f.write(f'{trial.response}\t')  # String: "Z\t"
-    f.write(f'{trial.rt:.3f}\t')  # String: "0.523\t"
-    f.write(f'{trial.acc}\t')  # String: "1\t"
-    f.write(f'{trial.reward}\t')  # String: "4\t"
-    f.write(f'{trial.expected_reward}\t')  # String: "4\t"
-    f.write('\n')  # Newline: end of data row
+    f.write(format_trial_row(trial, trial_num))  # String: whole row in one write
+    f.flush()  # Flush: write immediately to disk
+
+
+def create_timing_file(data_filename):
+    """
+    Create the phase timing file next to the data file ("....dat" -> "..._timing.dat")
+    
+    Args:
+        data_filename: String - file name returned by create_data_file()
+    
+    Returns:
+        File object - open timing file with its header written
+    """
+    stem, ext = os.path.splitext(data_filename)  # Strings: "CCRP-subj-000-ses-006-...", ".dat"
+    f = open(os.path.join("Data", f"{stem}_timing{ext}"), "a")  # File: open file in append mode
+    f.write('\t'.join(TIMING_COLUMNS) + '\t\n')  # String: header row
+    return f  # File object: timing file
+
+
+def _ms_or_na(seconds):
+    return "NA" if seconds is None else f"{seconds * 1000:.3f}"  # String: milliseconds or "NA" (unknown)
+
+
+def save_phase_timing(f, trial_num, records):
+    """
+    Save the intended and achieved timing of one trial's phases (see frame_scheduler.PhaseRecord)
+    
+    Args:
+        f: File object - open timing file
+        trial_num: Integer - trial number (1, 2, 3, ...)
+        records: List of PhaseRecord - phases of the trial in order of onset
+    """
+    f.write(''.join(
+        f'{trial_num}\t{r.phase}\t{r.n_frames if r.n_frames is not None else "NA"}\t'
+        f'{_ms_or_na(r.intended_s)}\t{_ms_or_na(r.achieved_s)}\t{_ms_or_na(r.onset_error_s)}\t\n'
+        for r in records
+    ))  # String: one row per phase, AchievedMs is NA for the phase still on screen
+    f.flush()  # Flush: write immediately to disk
+
+
+def create_texture_file(data_filename):
+    """
+    Create the capture texture file next to the data file ("....dat" -> "..._textures.dat")
+    
+    Args:
+        data_filename: String - file name returned by create_data_file()
+    
+    Returns:
+        File object - open texture file with its header written
+    """
+    stem, ext = os.path.splitext(data_filename)  # Strings: "CCRP-subj-000-ses-006-...", ".dat"
+    f = open(os.path.join("Data", f"{stem}_textures{ext}"), "a")  # File: open file in append mode
+    f.write('\t'.join(TEXTURE_COLUMNS) + '\t\n')  # String: header row
+    return f  # File object: texture file
+
+
+def save_texture_stats(f, trial_num, stats):
+    """
+    Save the capture texture counts after one trial - LiveTextures and TextureBytes stay flat once the pool is warm
+    
+    Args:
+        f: File object - open texture file
+        trial_num: Integer - trial number (1, 2, 3, ...)
+        stats: Dictionary - CapturePool.stats()
+    """
+    f.write(
+        f'{trial_num}\t{stats["captures"]}\t{stats["textures_created"]}\t'
+        f'{stats["live_textures"]}\t{stats["texture_bytes"]}\t\n'
+    )  # String: one row per trial
     f.flush()  # Flush: write immediately to disk
@@ -52,3 +52,19 @@ def create_window(monitor):
         )
     
     return win  # Window: return window object
+
+
+def measure_refresh_rate(win):
+    """
+    Measure the window's refresh rate - used to turn phase durations into frame counts
+    
+    Args:
+        win: Window object - the display window
+    
+    Returns:
+        Float - measured refresh rate in Hz (WINDOW_CONFIG['refresh_rate'] if measuring fails)
+    """
+    measured = win.getActualFrameRate()  # Float or None: None if the frame intervals were too variable
+    if not measured:  # Check: measurement failed?
+        return float(WINDOW_CONFIG['refresh_rate'])  # Float: configured fallback
+    return float(measured)  # Float: measured rate (e.g. 100.02)
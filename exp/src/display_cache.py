@@ -0,0 +1,104 @@
+"""
+Pre-rendered display cache for the cue/color screen
+"""
+from collections import OrderedDict
+
+from capture_pool import CapturePool
+
+
+def display_key(trial, show_color_response):
+    """
+    Build the cache key for a trial display - everything that changes what is drawn
+
+    Args:
+        trial: Trial object - trial to be displayed
+        show_color_response: Boolean - True if the color-response instruction is visible
+
+    Returns:
+        Tuple - (cue layout, target colors, instruction visibility)
+    """
+    return (tuple(trial.cues), trial.target_colors, bool(show_color_response))  # Tuple: e.g. ((1, 0, 2, 0), "3241", True)
+
+
+class DisplayCache:
+    """Bounded cache of pre-rendered cue/color displays (least recently used evicted first)"""
+
+    def __init__(self, win, render, show_color_response, max_entries=256, pool=None):
+        """
+        Args:
+            win: Window object - the display window
+            render: Function - render(trial) sets up the stimuli for a trial and returns the list of stimuli to capture
+            show_color_response: Boolean - True if the color-response instruction is visible this session
+            max_entries: Integer - maximum number of displays kept in memory
+            pool: CapturePool or None - textures to capture into (None = a pool of its own)
+        """
+        self.win = win  # Window: display window used for the captures
+        self.pool = pool if pool is not None else CapturePool(win)  # CapturePool: evicted displays' textures are reused
+        self.render = render  # Function: configures stimuli for a trial, returns stimulus list
+        self.show_color_response = show_color_response  # Boolean: instruction visibility (part of the key)
+        self.max_entries = max(1, int(max_entries))  # Integer: capacity of the cache
+        self._displays = OrderedDict()  # OrderedDict: key -> captured ImageStim, oldest use first
+        self.hits = 0  # Integer: number of lookups served from the cache
+        self.misses = 0  # Integer: number of lookups that had to capture a new display
+        self.evictions = 0  # Integer: number of displays dropped to respect max_entries
+
+    def __len__(self):
+        return len(self._displays)
+
+    def key(self, trial):
+        """Return the cache key for a trial"""
+        return display_key(trial, self.show_color_response)
+
+    def _capture(self, key, trial):
+        """Render the trial stimuli once into a pooled texture and store it under key"""
+        while len(self._displays) >= self.max_entries:  # Evict: least recently used displays, texture goes back to the pool
+            evicted_key, _ = self._displays.popitem(last=False)
+            self.pool.release(("display", evicted_key))
+            self.evictions += 1
+        stim_list = self.render(trial)  # List: stimuli configured for this trial
+        display = self.pool.capture(("display", key), stim_list)  # ImageStim: full-window capture
+        self._displays[key] = display
+        return display
+
+    def warm(self, trials):
+        """
+        Pre-render the displays of upcoming trials - call before the first trial
+
+        Distinct displays are captured in order of first use until the cache is full,
+        so the earliest trials are always served from memory.
+
+        Args:
+            trials: List of Trial objects - all trials of the session in presentation order
+
+        Returns:
+            Integer - number of displays captured
+        """
+        captured = 0  # Integer: count of new captures
+        for trial in trials:
+            key = self.key(trial)
+            if key in self._displays:
+                continue
+            if len(self._displays) >= self.max_entries:  # Stop: never evict while warming
+                break
+            self._capture(key, trial)
+            captured += 1
+        return captured
+
+    def get(self, trial):
+        """
+        Return the pre-rendered display for a trial, capturing it if it is not cached
+
+        Args:
+            trial: Trial object - trial to be displayed
+
+        Returns:
+            ImageStim - display with cues, colors and instructions
+        """
+        key = self.key(trial)
+        display = self._displays.get(key)
+        if display is not None:
+            self._displays.move_to_end(key)  # Mark: most recently used
+            self.hits += 1
+            return display
+        self.misses += 1
+        return self._capture(key, trial)
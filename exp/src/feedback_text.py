@@ -0,0 +1,138 @@
+"""
+Feedback text from pre-rendered images: cached fixed strings and dynamic lines composed from a glyph atlas
+"""
+import numpy as np
+from PIL import Image, ImageDraw
+from psychopy import visual
+from psychopy.tools.monitorunittools import deg2pix
+
+from cue_sprites import load_font, rgb_to_rgba8
+
+FEEDBACK_CHARS = "0123456789 .,:/-+%()!ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"  # Glyphs in an atlas
+
+
+def _even(n):
+    return n + (n % 2)
+
+
+def _rgba_image(mask, color):
+    """Colored RGBA image from an alpha mask (uint8 array), padded to even size so it sits on whole pixels"""
+    h, w = mask.shape
+    rgba = np.zeros((_even(h), _even(w), 4), dtype=np.uint8)
+    rgba[:, :, :3] = rgb_to_rgba8(color)[:3]
+    rgba[:h, :w, 3] = mask
+    return Image.fromarray(rgba, "RGBA")
+
+
+def render_text(text, height_px, color, bold=False):
+    """
+    Lay out and rasterize one line of text with full kerning
+
+    Args:
+        text: String - text to render
+        height_px: Float - font size (pixels), as TextStim height
+        color: Tuple - text color (PsychoPy rgb)
+        bold: Boolean - use a bold font
+
+    Returns:
+        PIL Image - RGBA, transparent background, even width and height
+    """
+    font = load_font(int(round(height_px)), bold)
+    ascent, descent = font.getmetrics()
+    mask = Image.new("L", (max(1, int(np.ceil(font.getlength(text)))), ascent + descent), 0)
+    ImageDraw.Draw(mask).text((0, 0), text, fill=255, font=font)
+    return _rgba_image(np.asarray(mask), color)
+
+
+class GlyphAtlas:
+    """Alpha masks of single characters in fixed-height cells; lines are composed by concatenating cells"""
+
+    def __init__(self, height_px, chars=FEEDBACK_CHARS, bold=False):
+        """
+        Args:
+            height_px: Float - font size (pixels)
+            chars: String - characters to rasterize
+            bold: Boolean - use a bold font
+        """
+        font = load_font(int(round(height_px)), bold)
+        ascent, descent = font.getmetrics()
+        self.height_px = ascent + descent  # Integer: cell height (pixels)
+        self.glyphs = {}  # Dictionary: character -> (height_px, advance) uint8 alpha mask
+        for char in chars:
+            cell = Image.new("L", (max(1, int(round(font.getlength(char)))), self.height_px), 0)
+            ImageDraw.Draw(cell).text((0, 0), char, fill=255, font=font)
+            self.glyphs[char] = np.asarray(cell)
+
+    def compose(self, text):
+        """
+        Alpha mask of a line of text
+
+        Raises:
+            KeyError - text contains a character that is not in the atlas
+        """
+        return np.concatenate([self.glyphs[char] for char in text], axis=1)
+
+
+class TextLine:
+    """One ImageStim whose image is rebuilt from a GlyphAtlas when its text changes"""
+
+    def __init__(self, win, atlas, pos_deg, color, opacity=1.0):
+        """
+        Args:
+            win: Window object - the display window
+            atlas: GlyphAtlas - glyphs to compose the text from
+            pos_deg: Tuple - centre of the line (deg)
+            color: Tuple - text color (PsychoPy rgb)
+            opacity: Float - stimulus opacity
+        """
+        self.atlas = atlas
+        self.color = color
+        self.text = ""  # String: text currently shown ("" = nothing drawn)
+        self.stim = visual.ImageStim(
+            win, image=_rgba_image(np.zeros((2, 2), dtype=np.uint8), color), units="pix",
+            pos=tuple(round(float(deg2pix(v, win.monitor))) for v in pos_deg), interpolate=False, opacity=opacity,
+        )
+
+    def set_text(self, text):
+        """Show text (no work if it is already shown)"""
+        if text == self.text:
+            return
+        self.text = text
+        if text:
+            image = _rgba_image(self.atlas.compose(text), self.color)
+            self.stim.image = image
+            self.stim.size = image.size
+
+    def draw(self):
+        if self.text:
+            self.stim.draw()
+
+
+class TextCache:
+    """Pre-rendered ImageStims of a fixed set of strings at one position"""
+
+    def __init__(self, win, texts, height_deg, pos_deg, color, bold=False, opacity=1.0):
+        """
+        Args:
+            win: Window object - the display window
+            texts: Iterable of strings - every string that can be shown
+            height_deg: Float - text height (deg)
+            pos_deg: Tuple - centre of the text (deg)
+            color: Tuple - text color (PsychoPy rgb)
+            bold: Boolean - use a bold font
+            opacity: Float - stimulus opacity
+        """
+        height_px = float(deg2pix(height_deg, win.monitor))
+        pos_px = tuple(round(float(deg2pix(v, win.monitor))) for v in pos_deg)
+        self.stimuli = {}  # Dictionary: text -> ImageStim
+        for text in texts:
+            image = render_text(text, height_px, color, bold)
+            self.stimuli[text] = visual.ImageStim(
+                win, image=image, units="pix", size=image.size, pos=pos_px, interpolate=False, opacity=opacity,
+            )
+
+    def __getitem__(self, text):
+        return self.stimuli[text]
+
+    def __len__(self):
+        return len(self.stimuli)
@@ -0,0 +1,206 @@
+"""
+Frame-locked presentation: phase durations as frame counts, one win.flip() per frame
+"""
+from collections import namedtuple
+
+DROPPED_FRAME_FACTOR = 1.5  # Float: a flip interval longer than this many refresh periods counts as dropped frames
+
+# Summary of one phase: longest flip interval (s, None if no interval), dropped frames, onset error (s or None)
+PhaseStats = namedtuple("PhaseStats", ["max_interval_s", "dropped_frames", "onset_error_s"])
+
+
+class PhaseRecord:
+    """Timing of one presented phase (all times in the win.flip() timebase, seconds)"""
+
+    __slots__ = ("phase", "n_frames", "intended_s", "intended_onset", "onset", "flip_times", "achieved_s")
+
+    def __init__(self, phase, n_frames, intended_s, intended_onset, onset):
+        self.phase = phase  # String: phase name (e.g. "fixation", "cue", "feedback")
+        self.n_frames = n_frames  # Integer or None: frames requested (None = untimed, ends at the next phase)
+        self.intended_s = intended_s  # Float or None: n_frames / refresh rate
+        self.intended_onset = intended_onset  # Float or None: onset the previous timed phase asked for
+        self.onset = onset  # Float: time of the phase's first flip
+        self.flip_times = [onset]  # List of floats: time of every flip of the phase
+        self.achieved_s = None  # Float: onset of the next phase minus this onset (set when the next phase starts)
+
+    @property
+    def onset_error_s(self):
+        """Float or None: achieved minus intended onset"""
+        return None if self.intended_onset is None else self.onset - self.intended_onset
+
+    def intervals(self):
+        """List of floats: flip-to-flip intervals of the phase, up to the next phase's onset once it is known"""
+        times = list(self.flip_times)
+        if self.achieved_s is not None:
+            times.append(self.onset + self.achieved_s)
+        return [b - a for a, b in zip(times, times[1:])]
+
+
+class FrameScheduler:
+    """
+    Present phases for a whole number of frames at the measured refresh rate
+
+    present() redraws and flips once per frame, so a phase lasts exactly its frame
+    count unless frames are dropped; the phase ends with the first flip of the next
+    phase. Every phase is recorded with its intended and achieved flip times.
+    """
+
+    def __init__(self, win, refresh_hz):
+        """
+        Args:
+            win: Window object - window to flip
+            refresh_hz: Float - measured refresh rate (Hz)
+        """
+        self.win = win
+        self.refresh_hz = float(refresh_hz)
+        self.frame_s = 1.0 / self.refresh_hz  # Float: one refresh period (seconds)
+        self.records = []  # List of PhaseRecord: phases since the last pop_records()
+        self._current = None  # PhaseRecord: phase on screen now
+
+    def frames_for(self, duration_s):
+        """Number of frames closest to duration_s (at least one)"""
+        return max(1, int(round(duration_s * self.refresh_hz)))
+
+    def _flip(self):
+        return self.win.flip()  # Float: flip timestamp returned by PsychoPy
+
+    def _start(self, phase, n_frames, on_onset):
+        if on_onset is not None:
+            self.win.callOnFlip(on_onset)  # Runs inside flip(), right after the buffer swap
+        previous = self._current
+        intended_onset = None
+        if previous is not None and previous.n_frames is not None:
+            intended_onset = previous.onset + previous.n_frames * self.frame_s
+        onset = self._flip()
+        if previous is not None:
+            previous.achieved_s = onset - previous.onset
+        record = PhaseRecord(
+            phase, n_frames, None if n_frames is None else n_frames * self.frame_s, intended_onset, onset
+        )
+        self._current = record
+        self.records.append(record)
+        return record
+
+    def present(self, draw, duration_s, phase, on_frame=None, on_onset=None):
+        """
+        Show a phase for frames_for(duration_s) frames
+
+        Args:
+            draw: Function - draws the phase (called before every flip)
+            duration_s: Float - requested duration (seconds)
+            phase: String - name used in the timing records
+            on_frame: Function or None - called after each flip with the frame index (e.g. key checks)
+            on_onset: Function or None - called at the onset flip itself (timestamps, device sync)
+
+        Returns:
+            PhaseRecord - record of this phase (achieved_s is filled in when the next phase starts)
+        """
+        n_frames = self.frames_for(duration_s)
+        draw()
+        record = self._start(phase, n_frames, on_onset)
+        if on_frame is not None:
+            on_frame(0)
+        for frame in range(1, n_frames):
+            draw()
+            record.flip_times.append(self._flip())
+            if on_frame is not None:
+                on_frame(frame)
+        return record
+
+    def show(self, draw, phase, on_onset=None):
+        """
+        Flip once to an untimed phase (e.g. a screen that stays until a response)
+
+        Args:
+            draw: Function or None - draws the phase (None = already drawn into the back buffer)
+            phase: String - name used in the timing records
+            on_onset: Function or None - called at the onset flip itself (timestamps, device sync)
+
+        Returns:
+            PhaseRecord - record of this phase; its onset is the flip time
+        """
+        if draw is not None:
+            draw()
+        return self._start(phase, None, on_onset)
+
+    def release(self):
+        """Forget the phase on screen; call before the window is flipped outside the scheduler (e.g. a break screen)"""
+        self._current = None
+
+    def phase_stats(self, record):
+        """
+        Summarize the frame timing of one phase
+
+        Untimed phases (show()) have no frame intervals of their own: their only flip is
+        the onset, and the time until the next phase is a response wait.
+
+        Args:
+            record: PhaseRecord - phase to summarize
+
+        Returns:
+            PhaseStats - longest interval, dropped frames (intervals above DROPPED_FRAME_FACTOR
+            refresh periods count as round(interval / period) - 1 frames) and onset error
+        """
+        intervals = record.intervals() if record.n_frames is not None else []
+        dropped = sum(
+            int(round(interval / self.frame_s)) - 1
+            for interval in intervals
+            if interval > DROPPED_FRAME_FACTOR * self.frame_s
+        )
+        return PhaseStats(max(intervals, default=None), dropped, record.onset_error_s)
+
+    def pop_records(self):
+        """Return the phases recorded since the last call and start a new list (the current phase stays open)"""
+        records, self.records = self.records, []
+        return records
+
+
+class TimingSummary:
+    """Session-level frame timing: dropped frames, longest intervals and onset errors over all trials"""
+
+    def __init__(self, refresh_hz):
+        """
+        Args:
+            refresh_hz: Float - refresh rate the phases were scheduled at (Hz)
+        """
+        self.refresh_hz = float(refresh_hz)
+        self.n_trials = 0  # Integer: trials added
+        self.compromised_trials = []  # List of integers: trial numbers flagged as compromised
+        self.dropped_frames = {}  # Dictionary: phase -> dropped frames over the session
+        self.max_interval_s = {}  # Dictionary: phase -> longest flip interval over the session
+        self.max_abs_onset_error_s = {}  # Dictionary: phase -> largest |onset error| over the session
+
+    def add(self, trial_number, stats, compromised):
+        """
+        Add one trial
+
+        Args:
+            trial_number: Integer - 1-based trial number
+            stats: Dictionary - phase name -> PhaseStats
+            compromised: Boolean - trial's stimulus timing was compromised
+        """
+        self.n_trials += 1
+        if compromised:
+            self.compromised_trials.append(trial_number)
+        for phase, phase_stats in stats.items():
+            self.dropped_frames[phase] = self.dropped_frames.get(phase, 0) + phase_stats.dropped_frames
+            if phase_stats.max_interval_s is not None:
+                self.max_interval_s[phase] = max(self.max_interval_s.get(phase, 0.0), phase_stats.max_interval_s)
+            if phase_stats.onset_error_s is not None:
+                self.max_abs_onset_error_s[phase] = max(
+                    self.max_abs_onset_error_s.get(phase, 0.0), abs(phase_stats.onset_error_s)
+                )
+
+    def to_dict(self):
+        """Dictionary - JSON-ready summary (times in ms)"""
+        return {
+            "refresh_rate_hz": self.refresh_hz,
+            "frame_period_ms": round(1000 / self.refresh_hz, 3),
+            "dropped_frame_threshold_periods": DROPPED_FRAME_FACTOR,
+            "trials": self.n_trials,
+            "compromised_trials": len(self.compromised_trials),
+            "compromised_trial_numbers": list(self.compromised_trials),
+            "dropped_frames_by_phase": dict(self.dropped_frames),
+            "max_frame_interval_ms_by_phase": {p: round(v * 1000, 3) for p, v in self.max_interval_s.items()},
+            "max_abs_onset_error_ms_by_phase": {p: round(v * 1000, 3) for p, v in self.max_abs_onset_error_s.items()},
+        }
@@ -0,0 +1,194 @@
+"""
+Gaze-contingent responses: eye-tracker samples hit-tested against circular target areas in one vectorized step
+"""
+import time
+
+import numpy as np
+
+
+class GazeTargets:
+    """
+    Circular target areas in tracker coordinates (the units of the gaze samples)
+
+    A sample s corrected by drift d is inside target i when |s - d - c_i|^2 <= r_i^2,
+    i.e. |s - (c_i + d)|^2 <= r_i^2: the centers are stored shifted by the drift, so
+    samples are tested as they arrive without building corrected copies. All scratch
+    arrays are allocated once; a test is a fixed number of in-place NumPy operations
+    over (batch, targets).
+    """
+
+    def __init__(self, centers, radius, max_batch=64):
+        """
+        Args:
+            centers: Sequence of (x, y) - target centers
+            radius: Float or sequence of floats - target radius (one for all, or one per target)
+            max_batch: Integer - most samples tested in one step
+        """
+        self.centers = np.array(centers, dtype=float).reshape(-1, 2)  # Array (n, 2): centers without drift
+        n_targets = len(self.centers)
+        self.radius_sq = np.broadcast_to(np.square(np.asarray(radius, dtype=float)), (n_targets,)).copy()
+        self.max_batch = max_batch
+        self._shifted = self.centers.copy()  # Array (n, 2): centers + drift correction
+        self._samples = np.empty((max_batch, 2))
+        self._delta = np.empty((max_batch, n_targets, 2))
+        self._dist_sq = np.empty((max_batch, n_targets))
+        self._inside = np.empty((max_batch, n_targets), dtype=bool)
+
+    def __len__(self):
+        return len(self.centers)
+
+    def set_drift(self, drift_xy):
+        """Use drift_xy (the gaze position recorded on the drift-correction target) for the next tests"""
+        np.add(self.centers, drift_xy, out=self._shifted)
+
+    def _test(self, n):
+        delta = self._delta[:n]
+        np.subtract(self._samples[:n, None, :], self._shifted[None, :, :], out=delta)
+        np.multiply(delta, delta, out=delta)
+        dist_sq = self._dist_sq[:n]
+        np.add(delta[..., 0], delta[..., 1], out=dist_sq)
+        inside = self._inside[:n]
+        np.less_equal(dist_sq, self.radius_sq, out=inside)
+        hits = inside.any(axis=1)
+        if not hits.any():
+            return None
+        sample = int(hits.argmax())
+        return sample, int(inside[sample].argmax())
+
+    def hit(self, x, y):
+        """Index of the target containing the (uncorrected) sample x, y, or -1"""
+        self._samples[0, 0] = x
+        self._samples[0, 1] = y
+        result = self._test(1)
+        return -1 if result is None else result[1]
+
+    def first_hit(self, xy, count=None):
+        """
+        First sample of a batch inside a target
+
+        Args:
+            xy: Array (>= count, 2) - uncorrected samples in arrival order
+            count: Integer or None - samples to test (None = all, at most max_batch)
+
+        Returns:
+            Tuple - (sample index, target index), or None if no sample is inside a target
+        """
+        n = len(xy) if count is None else count
+        if n > self.max_batch:
+            raise ValueError(f"{n} samples exceed max_batch ({self.max_batch})")
+        self._samples[:n] = xy[:n]
+        return self._test(n)
+
+
+class GazeResponse:
+    """
+    Read an iohub eye tracker until gaze lands in a target area
+
+    poll() drains the tracker's event buffer into events (kept for the trial's eye data)
+    and tests the new samples' gaze_x/gaze_y in batches of GazeTargets.max_batch, in
+    arrival order. When no new event carries gaze coordinates (e.g. binocular samples),
+    getLastGazePosition() is tested instead, as the polling loop did before. A poll
+    therefore costs one buffer read plus one vectorized test per max_batch samples.
+
+    For a hit, the detection latency is the host time at detection minus the sample's
+    iohub time (same time base as core.getTime()); NaN when the hit came from the
+    last-position fallback, which carries no sample time.
+    """
+
+    def __init__(self, tracker, targets, time_fn=time.perf_counter):
+        """
+        Args:
+            tracker: iohub EyeTracker device
+            targets: GazeTargets - target areas (drift set by the caller)
+            time_fn: Function - host clock in the iohub time base (seconds)
+        """
+        self.tracker = tracker
+        self.targets = targets
+        self.time_fn = time_fn
+        self._xy = np.empty((targets.max_batch, 2))  # Array: gaze of the batch being collected
+        self._times = np.empty(targets.max_batch)  # Array: sample times of the batch
+        self._reset()
+
+    def start(self):
+        """Start a response: clear the tracker buffer and forget the previous trial"""
+        self.tracker.clearEvents()
+        self._reset()
+
+    def _reset(self):
+        self.events = []  # List: every tracker event read since start(), in order
+        self.hit_target = -1  # Integer: target index of the hit, -1 = none yet
+        self.hit_gaze = None  # Tuple: uncorrected gaze position of the hit
+        self.last_gaze = None  # Tuple: uncorrected gaze position of the last sample tested
+        self.hit_sample_time = float("nan")  # Float: iohub time of the sample that hit
+        self.detection_latency_s = float("nan")  # Float: detection time - hit sample time
+        self.polls = 0  # Integer: poll() calls
+        self.samples_tested = 0  # Integer: samples hit-tested (fallback positions included)
+        self.max_poll_s = 0.0  # Float: longest poll() call
+        self.max_poll_interval_s = 0.0  # Float: longest time between the starts of two polls
+        self._last_poll = None
+
+    def _found(self, target, gaze, sample_time):
+        now = self.time_fn()
+        self.hit_target = target
+        self.hit_gaze = gaze
+        self.hit_sample_time = sample_time
+        self.detection_latency_s = now - sample_time
+        return target
+
+    def _test_batch(self, n):
+        self.samples_tested += n
+        self.last_gaze = (float(self._xy[n - 1, 0]), float(self._xy[n - 1, 1]))
+        result = self.targets.first_hit(self._xy, n)
+        if result is None:
+            return -1
+        sample, target = result
+        return self._found(target, (float(self._xy[sample, 0]), float(self._xy[sample, 1])), float(self._times[sample]))
+
+    def poll(self):
+        """
+        Read the samples that arrived since the last poll and test them
+
+        Returns:
+            Integer - index of the target hit, or -1
+        """
+        start = self.time_fn()
+        if self._last_poll is not None:
+            self.max_poll_interval_s = max(self.max_poll_interval_s, start - self._last_poll)
+        self._last_poll = start
+        self.polls += 1
+        new_events = self.tracker.getEvents()
+        self.events.extend(new_events)
+        target = -1
+        n = 0
+        has_gaze = False
+        for event in new_events:
+            x = getattr(event, "gaze_x", None)
+            if x is None:
+                continue
+            has_gaze = True
+            self._xy[n, 0] = x
+            self._xy[n, 1] = event.gaze_y
+            self._times[n] = event.time
+            n += 1
+            if n == self.targets.max_batch:
+                target = self._test_batch(n)
+                n = 0
+                if target >= 0:
+                    break
+        if target < 0 and n:
+            target = self._test_batch(n)
+        if target < 0 and not has_gaze:
+            gaze = self.tracker.getLastGazePosition()
+            if isinstance(gaze, (tuple, list)):
+                self.samples_tested += 1
+                self.last_gaze = tuple(gaze)
+                target = self.targets.hit(gaze[0], gaze[1])
+                if target >= 0:
+                    self._found(target, tuple(gaze), float("nan"))
+        self.max_poll_s = max(self.max_poll_s, self.time_fn() - start)
+        return target
+
+    def finish(self):
+        """Drain the samples recorded after the hit; returns every event of the trial"""
+        self.events.extend(self.tracker.getEvents())
+        return self.events
@@ -0,0 +1,301 @@
+"""
+Vectorized simulated participants: payout forecasts and per-condition power of a session design
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+from ccrp_design import (
+    FIRST_WARMUP_TRIALS,
+    MAX_WAIT_TIME,
+    NUM_POSITIONS,
+    OTHER_WARMUP_TRIALS,
+    REWARD_MONEY_FACTOR,
+    session_design,
+)
+from ccrp_rows import score_trials
+from session_plan import derive_seed
+from trial_table import ConditionTable, generate_schedule
+
+CHANCE_ACCURACY = 1.0 / NUM_POSITIONS  # Float: ACC of a random response key
+MIN_RT_S = 0.1  # Float: simulated RTs are clipped here (anticipations are not modelled)
+
+
+class ParticipantModel:
+    """
+    Population of simulated participants
+
+    Choice: with probability lapse a random response key; otherwise a softmax over the
+    colors on screen with inverse temperature beta per reward point (value-sensitive).
+    RT: ex-Gaussian (mu + N(0, sigma) + Exp(tau)); mu is shorter by rt_value_slope_s per
+    reward point of the trial's best cue above 1, and RTs above MAX_WAIT_TIME are timeouts.
+    beta, lapse and mu vary between participants (normal, SDs *_sd, clipped to valid ranges).
+    """
+
+    def __init__(self, beta=2.0, lapse=0.05, rt_mu_s=0.45, rt_sigma_s=0.08, rt_tau_s=0.15, rt_value_slope_s=0.02,
+                 beta_sd=0.5, lapse_sd=0.02, rt_mu_sd_s=0.05):
+        """
+        Args:
+            beta: Float - inverse temperature of the choice softmax (per reward point)
+            lapse: Float - probability of a random key press
+            rt_mu_s, rt_sigma_s, rt_tau_s: Floats - ex-Gaussian RT parameters (seconds)
+            rt_value_slope_s: Float - mu shortening per reward point of the best cue (seconds)
+            beta_sd, lapse_sd, rt_mu_sd_s: Floats - between-participant SDs of beta, lapse and mu
+        """
+        self.beta = beta
+        self.lapse = lapse
+        self.rt_mu_s = rt_mu_s
+        self.rt_sigma_s = rt_sigma_s
+        self.rt_tau_s = rt_tau_s
+        self.rt_value_slope_s = rt_value_slope_s
+        self.beta_sd = beta_sd
+        self.lapse_sd = lapse_sd
+        self.rt_mu_sd_s = rt_mu_sd_s
+
+    def draw(self, rng, n):
+        """Dictionary of arrays (n,) - beta, lapse and rt_mu_s of n participants"""
+        return {
+            "beta": np.maximum(rng.normal(self.beta, self.beta_sd, n), 0.0),
+            "lapse": np.clip(rng.normal(self.lapse, self.lapse_sd, n), 0.0, 1.0),
+            "rt_mu_s": np.maximum(rng.normal(self.rt_mu_s, self.rt_mu_sd_s, n), MIN_RT_S),
+        }
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def _variant_tables(table):
+    """Reward per color id and colors on screen, (n_variants, NUM_POSITIONS) each, for every variant of a table"""
+    n_variants = len(table)
+    reward_by_color = np.zeros((n_variants, NUM_POSITIONS + 1), dtype=np.int8)  # Column 0: empty positions
+    shown = np.zeros((n_variants, NUM_POSITIONS + 1), dtype=bool)
+    rows = np.arange(n_variants)[:, None]
+    reward_by_color[rows, table.color_by_pos] = table.reward_by_pos
+    shown[rows, table.color_by_pos] = True
+    return reward_by_color[:, 1:], shown[:, 1:]
+
+
+def session_layout(session, n_blocks=None, n_per_block=None):
+    """
+    Condition table and block counts of a session, optionally with other block/trial counts
+
+    Returns:
+        Tuple - (ConditionTable, n_blocks, n_per_block)
+    """
+    cfg = session_design(session)["cfg"]
+    table = ConditionTable(cfg["reward_conditions"], center=cfg["center"])
+    return table, n_blocks or cfg["n_blocks"], n_per_block or cfg["n_per_block"]
+
+
+def simulate_participants(model, session, participant_ids, seed=None, n_blocks=None, n_per_block=None):
+    """
+    Simulate whole sessions for many participants in one vectorized pass
+
+    Each participant gets the schedule testmain.py would draw for them (generate_schedule
+    seeded with derive_seed(participant, session), as in session_plan.compile_plan); the
+    trials are scored with ccrp_rows.score_trials.
+
+    Args:
+        model: ParticipantModel - population to draw from
+        session: Integer - 1-based session number
+        participant_ids: List - participant IDs (seed the schedules)
+        seed: Integer, SeedSequence or None - seed of the participant parameters and responses
+        n_blocks, n_per_block: Integers or None - override the session's block/trial counts
+
+    Returns:
+        Dictionary of arrays, one row per participant - reward_points (P,), accuracy, value_preference,
+        mean_rt_ms and timeouts per condition (P, n_conditions; main trials only), and the drawn parameters
+    """
+    table, n_blocks, n_per_block = session_layout(session, n_blocks, n_per_block)
+    reward_table, shown_table = _variant_tables(table)
+    schedules = [
+        generate_schedule(
+            table, n_blocks, n_per_block, FIRST_WARMUP_TRIALS, OTHER_WARMUP_TRIALS,
+            np.random.default_rng(derive_seed(participant, session)),
+        )
+        for participant in participant_ids
+    ]
+    variants = np.stack([schedule.variant for schedule in schedules])  # (P, T)
+    main = schedules[0].warm_up == 0  # (T,): same block structure for everyone
+    n_participants, n_trials = variants.shape
+    rng = np.random.default_rng(seed)
+    params = model.draw(rng, n_participants)
+
+    rewards = reward_table[variants]  # (P, T, NUM_POSITIONS)
+    utility = params["beta"][:, None, None] * rewards + rng.gumbel(size=rewards.shape)  # Gumbel-max = softmax draw
+    choice = np.where(shown_table[variants], utility, -np.inf).argmax(axis=2) + 1
+    lapsed = rng.random((n_participants, n_trials)) < params["lapse"][:, None]
+    choice = np.where(lapsed, rng.integers(1, NUM_POSITIONS + 1, (n_participants, n_trials)), choice)
+
+    max_reward = rewards.max(axis=2)
+    rt_s = (
+        params["rt_mu_s"][:, None] - model.rt_value_slope_s * (max_reward - 1)
+        + rng.normal(0.0, model.rt_sigma_s, (n_participants, n_trials))
+        + rng.exponential(model.rt_tau_s, (n_participants, n_trials))
+    )
+    rt_s = np.maximum(rt_s, MIN_RT_S)
+    timeout = rt_s > MAX_WAIT_TIME
+    reward, max_reward, acc = score_trials(rewards, np.where(timeout, 0, choice))
+
+    # Value preference: chose the best cue (+1) or the second-best cue (-1); 0 otherwise
+    second_reward = np.sort(rewards, axis=2)[:, :, -2]
+    preference = acc.astype(np.int8) - ((reward == second_reward) & (second_reward > 0))
+
+    condition = table.condition[variants]  # (P, T)
+    n_conditions = len(table.counts)
+    stats = {name: np.full((n_participants, n_conditions), np.nan) for name in ("accuracy", "value_preference", "mean_rt_ms")}
+    stats["timeouts"] = np.zeros((n_participants, n_conditions), dtype=np.int64)
+    for c in range(n_conditions):
+        in_condition = (condition == c) & main
+        n_in = in_condition.sum(axis=1)
+        answered = in_condition & ~timeout
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats["accuracy"][:, c] = (acc * in_condition).sum(axis=1) / n_in
+            if len(table.values[c]) > 1:
+                stats["value_preference"][:, c] = (preference * in_condition).sum(axis=1) / n_in
+            stats["mean_rt_ms"][:, c] = (rt_s * answered).sum(axis=1) / answered.sum(axis=1) * 1000
+        stats["timeouts"][:, c] = (in_condition & timeout).sum(axis=1)
+    return {
+        "reward_points": reward.sum(axis=1),  # All trials, warm-up included, as the cumulative reward in testmain.py
+        **stats,
+        **params,
+    }
+
+
+def _simulate_chunk(model, session, participant_ids, seed, n_blocks, n_per_block):
+    return simulate_participants(model, session, participant_ids, seed, n_blocks, n_per_block)
+
+
+def t_critical(alpha, df):
+    """Two-sided Student t critical value (Cornish-Fisher expansion of the normal quantile; error < 0.01 for df >= 5)"""
+    z = NormalDist().inv_cdf(1 - alpha / 2)
+    return (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+    )
+
+
+def detection_power(effect, n_per_group, alpha=0.05):
+    """
+    Fraction of disjoint groups of n_per_group participants in which a two-sided one-sample
+    t-test finds the mean of effect different from 0
+
+    Args:
+        effect: Array (P,) - per-participant effect (e.g. accuracy - chance)
+        n_per_group: Integer - participants per simulated experiment
+        alpha: Float - significance level
+
+    Returns:
+        Float - power, or NaN if fewer than n_per_group participants have a value
+    """
+    effect = np.asarray(effect, dtype=float)
+    effect = effect[~np.isnan(effect)]
+    n_groups = len(effect) // n_per_group
+    if n_groups == 0 or n_per_group < 2:
+        return float("nan")
+    groups = effect[:n_groups * n_per_group].reshape(n_groups, n_per_group)
+    sd = groups.std(axis=1, ddof=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = groups.mean(axis=1) / (sd / math.sqrt(n_per_group))
+    significant = np.where(sd > 0, np.abs(t) > t_critical(alpha, n_per_group - 1), groups.mean(axis=1) != 0)
+    return float(significant.mean())
+
+
+def run_power_analysis(
+    model,
+    session,
+    n_participants,
+    group_sizes=(10, 20, 30),
+    alpha=0.05,
+    money_factor=REWARD_MONEY_FACTOR,
+    n_blocks=None,
+    n_per_block=None,
+    seed=0,
+    jobs=None,
+    chunk_size=250,
+    participant_prefix="sim",
+):
+    """
+    Simulate n_participants across a process pool and summarize payout and per-condition power
+
+    Args:
+        model: ParticipantModel - population to draw from
+        session: Integer - 1-based session number
+        n_participants: Integer - simulated participants
+        group_sizes: Tuple of integers - participants per experiment for the power estimates
+        alpha: Float - significance level of the tests
+        money_factor: Float - DKK per reward point (REWARD_MONEY_FACTOR unless forecasting another one)
+        n_blocks, n_per_block: Integers or None - override the session's block/trial counts
+        seed: Integer - seed of the whole run (chunks use independent child streams)
+        jobs: Integer or None - worker processes (None = CPU count, 1 = no pool)
+        chunk_size: Integer - participants simulated per task
+        participant_prefix: String - participant IDs are <prefix>0001, <prefix>0002, ...
+
+    Returns:
+        Dictionary - JSON-ready summary: design, model, payout distribution (DKK) and per condition
+        mean accuracy, RT and timeouts, with the power for every group size of: accuracy above chance,
+        and for two-cue conditions the preference for the better cue and the distractor cost
+    """
+    ids = [f"{participant_prefix}{i + 1:04d}" for i in range(n_participants)]
+    chunks = [ids[i:i + chunk_size] for i in range(0, n_participants, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = (
+        [model] * len(chunks), [session] * len(chunks), chunks, seeds,
+        [n_blocks] * len(chunks), [n_per_block] * len(chunks),
+    )
+    if jobs == 1 or len(chunks) == 1:
+        results = list(map(_simulate_chunk, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            results = list(pool.map(_simulate_chunk, *args))
+    merged = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+
+    table, n_blocks, n_per_block = session_layout(session, n_blocks, n_per_block)
+    payout = np.round(merged["reward_points"] * money_factor, 2)
+    single = {values[0]: c for c, values in enumerate(table.values) if len(values) == 1}
+    conditions = []
+    for c, label in enumerate(table.labels):
+        accuracy = merged["accuracy"][:, c]
+        preference = merged["value_preference"][:, c]
+        entry = {
+            "condition": label,
+            "mean_accuracy": float(np.nanmean(accuracy)),
+            "mean_rt_ms": float(np.nanmean(merged["mean_rt_ms"][:, c])),
+            "timeouts_per_participant": float(merged["timeouts"][:, c].mean()),
+            "power_accuracy_above_chance": {n: detection_power(accuracy - CHANCE_ACCURACY, n, alpha) for n in group_sizes},
+        }
+        if len(table.values[c]) > 1:
+            entry["mean_value_preference"] = float(np.nanmean(preference))
+            entry["power_value_preference"] = {n: detection_power(preference, n, alpha) for n in group_sizes}
+            reference = single.get(max(table.values[c]))
+            if reference is not None:
+                # Distractor cost: accuracy lost to the second cue, paired against the single cue of the same value
+                cost = merged["accuracy"][:, reference] - accuracy
+                entry["mean_distractor_cost"] = float(np.nanmean(cost))
+                entry["power_distractor_cost"] = {n: detection_power(cost, n, alpha) for n in group_sizes}
+        conditions.append(entry)
+    return {
+        "session": session,
+        "n_blocks": n_blocks,
+        "n_per_block": n_per_block,
+        "n_participants": n_participants,
+        "seed": seed,
+        "alpha": alpha,
+        "model": model.to_dict(),
+        "payout_dkk": {
+            "money_factor": money_factor,
+            "mean": float(payout.mean()),
+            "sd": float(payout.std(ddof=1)) if n_participants > 1 else 0.0,
+            "min": float(payout.min()),
+            "p5": float(np.percentile(payout, 5)),
+            "median": float(np.median(payout)),
+            "p95": float(np.percentile(payout, 95)),
+            "max": float(payout.max()),
+        },
+        "conditions": conditions,
+    }
@@ -0,0 +1,232 @@
+"""
+Serial response boxes read on a background thread
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+from box_protocol import PING_REPLY_PIN, BoxFrameDecoder, SequenceTracker
+from xid import XidDecoder, XidReply
+
+# One button press: button/pin label (string), host time of arrival (seconds), device reaction time (ms)
+ResponseEvent = namedtuple("ResponseEvent", ["button", "host_time", "device_rt_ms"])
+# Answer to a clock-sync ping: device clock (micros(), wraps at 2**32) and host time of arrival (seconds)
+PingReply = namedtuple("PingReply", ["device_us", "host_time"])
+
+
+class CedrusPacketParser:
+    """Button-down events from a Cedrus XID box (packets decoded by xid.XidDecoder)"""
+
+    SYNC_COMMAND = b"e5"  # Bytes: XID command resetting the reaction-time timer
+    PING_COMMAND = b"_c1"  # Bytes: protocol query; its b"_xid0" reply times a round trip (clock_sync.RoundTripProbe)
+
+    def __init__(self, port=0):
+        """
+        Args:
+            port: Integer or None - XID port of the key packets (None = any)
+        """
+        self.decoder = XidDecoder(port=port)  # XidDecoder: incremental packet decoder
+
+    def feed(self, data, host_time):
+        """
+        Parse newly received bytes
+
+        Args:
+            data: Bytes - raw bytes read from the port
+            host_time: Float - host time when the bytes arrived (seconds)
+
+        Returns:
+            List of ResponseEvent and PingReply - button-down events (releases are ignored) and
+            replies to PING_COMMAND (device_us None: the XID box reports no clock)
+        """
+        events = []
+        for e in self.decoder.feed(data, host_time):
+            if isinstance(e, XidReply):
+                events.append(PingReply(None, e.host_time))
+            elif e.pressed:
+                events.append(ResponseEvent(str(e.button), e.host_time, e.device_rt_ms))
+        return events
+
+
+class SelfMadeLineParser:
+    """
+    Self-made response box events: binary frames with sequence numbers, or legacy "pin,latency_us" / "P,micros" lines
+
+    Decoding is done by box_protocol.BoxFrameDecoder; frames repeated by the box are
+    dropped and lost or corrupt ones are counted (link_stats()).
+    """
+
+    SYNC_COMMAND = b"S"  # Bytes: starts the box's latency timer
+    PING_COMMAND = b"P"  # Bytes: asks the box for its micros() clock (clock_sync.ClockSync)
+
+    def __init__(self):
+        self.decoder = BoxFrameDecoder()  # BoxFrameDecoder: incremental frame/line decoder
+        self.sequence = SequenceTracker()  # SequenceTracker: lost/duplicate binary frames
+
+    def feed(self, data, host_time):
+        """
+        Parse newly received bytes
+
+        Args:
+            data: Bytes - raw bytes read from the port
+            host_time: Float - host time when the bytes arrived (seconds)
+
+        Returns:
+            List of ResponseEvent and PingReply - one per complete, valid, non-repeated frame or line
+        """
+        events = []
+        for frame in self.decoder.feed(data, host_time):
+            if frame.seq is not None and not self.sequence.accept(frame.seq):
+                continue
+            if frame.pin == PING_REPLY_PIN:
+                events.append(PingReply(frame.value, host_time))
+            else:
+                events.append(ResponseEvent(str(frame.pin), host_time, frame.value / 1000))
+        return events
+
+    def link_stats(self):
+        """Dictionary - cumulative counts of binary frames, lost and duplicate frames, CRC errors and bad lines"""
+        return {
+            "frames": self.sequence.frames,
+            "lost": self.sequence.lost,
+            "duplicates": self.sequence.duplicates,
+            "crc_errors": self.decoder.crc_errors,
+            "malformed_lines": self.decoder.malformed_lines,
+        }
+
+
+class SerialResponseReader:
+    """
+    Drain a serial response box on a background thread
+
+    The thread blocks in box.read() until bytes arrive, stamps them with the host
+    clock, parses them and appends the events to a bounded ring (deque). The trial
+    loop waits on get(timeout) instead of polling the port itself. Ping replies go
+    to a separate ring read with pop_ping_replies().
+    """
+
+    def __init__(self, box, parser, time_fn=time.perf_counter, max_events=256, read_timeout=0.05):
+        """
+        Args:
+            box: Serial object - open response box port
+            parser: Parser object - CedrusPacketParser or SelfMadeLineParser
+            time_fn: Function - host clock used to stamp arrivals (seconds)
+            max_events: Integer - ring size; the oldest events are dropped when it is full
+            read_timeout: Float - serial read timeout of the reader thread (seconds)
+        """
+        self.box = box
+        self.parser = parser
+        self.time_fn = time_fn
+        self.read_timeout = read_timeout
+        self._events = deque(maxlen=max_events)  # Deque: ring of parsed events (append/popleft are atomic)
+        self._pings = deque(maxlen=max_events)  # Deque: ring of PingReply
+        self._ready = threading.Event()  # Event: set whenever a new event is appended
+        self._stop = threading.Event()  # Event: asks the thread to exit
+        self._thread = None
+        self._listeners = []  # List of functions: called from the reader thread after each new event
+        self.error = None  # Exception: set if the reader thread died
+
+    def start(self):
+        """Start the reader thread"""
+        self.box.timeout = self.read_timeout  # Block in read() instead of spinning on an empty port
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="response-box-reader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the reader thread and wait for it to exit"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def add_listener(self, listener):
+        """Call listener() from the reader thread whenever an event arrives or the reader fails (must be thread-safe)"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self):
+        self._ready.set()
+        for listener in list(self._listeners):
+            listener()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                data = self.box.read(self.box.in_waiting or 1)
+                if not data:
+                    continue
+                host_time = self.time_fn()
+                for response in self.parser.feed(data, host_time):
+                    if isinstance(response, PingReply):
+                        self._pings.append(response)
+                        continue
+                    self._events.append(response)
+                    self._notify()
+        except Exception as e:  # Port closed or unplugged - surface it in get()
+            self.error = e
+            self._notify()
+
+    def send_sync(self):
+        """
+        Write the parser's timer-reset command (SYNC_COMMAND) and wait until it left the host
+
+        Call it from win.callOnFlip() so the device timer starts at the stimulus flip.
+
+        Returns:
+            Tuple of floats - host time (time_fn) before the write and after flush()
+        """
+        return self.send_command(self.parser.SYNC_COMMAND)
+
+    def send_command(self, command):
+        """
+        Write a command and wait until it left the host
+
+        Returns:
+            Tuple of floats - host time (time_fn) before the write and after flush()
+        """
+        start = self.time_fn()
+        self.box.write(command)
+        self.box.flush()
+        return start, self.time_fn()
+
+    def pop_ping_replies(self):
+        """Return and remove all ping replies received so far (oldest first)"""
+        replies = []
+        while self._pings:
+            replies.append(self._pings.popleft())
+        return replies
+
+    def clear(self):
+        """Drop all pending events (e.g. right before stimulus onset)"""
+        self._events.clear()
+
+    def get(self, timeout):
+        """
+        Wait for the next event
+
+        Args:
+            timeout: Float - maximum time to wait (seconds)
+
+        Returns:
+            ResponseEvent or None if nothing arrived within timeout
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                return self._events.popleft()
+            except IndexError:
+                pass
+            if self.error is not None:
+                raise RuntimeError(f"Response box reader stopped: {self.error}")
+            self._ready.clear()
+            if self._events:  # Appended between popleft() and clear()
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return None
+            self._ready.wait(remaining)
@@ -0,0 +1,136 @@
+"""
+Asyncio response window: keyboard, response box and other input sources multiplexed without busy-waiting
+"""
+import asyncio
+
+from psychopy import event
+
+KEYBOARD_POLL_INTERVAL = 0.001  # Float: seconds between keyboard checks (keyboard events are dispatched by polling)
+
+
+class KeyboardSource:
+    """
+    Keys from psychopy.event
+
+    Keyboard events are only dispatched when the main thread asks for them, so this
+    source checks once per poll_interval and sleeps in between instead of spinning.
+    """
+
+    name = "keyboard"
+
+    def __init__(self, key_list, clock, poll_interval=KEYBOARD_POLL_INTERVAL):
+        """
+        Args:
+            key_list: List of strings - keys that end the response window
+            clock: Clock object - clock the key times are read from
+            poll_interval: Float - seconds between checks
+        """
+        self.key_list = list(key_list)
+        self.clock = clock
+        self.poll_interval = poll_interval
+
+    async def next(self, onset):
+        """Wait for the next key; returns (key, clock time)"""
+        while True:
+            keys = event.getKeys(keyList=self.key_list, timeStamped=self.clock)
+            if keys:
+                return tuple(keys[0])
+            await asyncio.sleep(self.poll_interval)
+
+
+class SerialBoxSource:
+    """
+    Button presses from a SerialResponseReader
+
+    The reader thread wakes the event loop when an event arrives (call_soon_threadsafe),
+    so waiting for the box costs no CPU at all.
+    """
+
+    name = "response_box"
+
+    def __init__(self, reader, buttons, clock):
+        """
+        Args:
+            reader: SerialResponseReader - started reader of the box
+            buttons: Dictionary or set - buttons/pins that count as responses
+            clock: Clock object - trial clock (arrival times are converted to it)
+        """
+        self.reader = reader
+        self.buttons = buttons
+        self.clock = clock
+
+    async def next(self, onset):
+        """
+        Wait for the next mapped press at or after onset (trial-clock seconds)
+
+        Returns:
+            Tuple - (button, trial-clock time, device RT ms)
+        """
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+
+        def listener():
+            loop.call_soon_threadsafe(wake.set)
+
+        self.reader.add_listener(listener)
+        time_at_reset = self.clock.getLastResetTime()  # host time (core.getTime base) of the trial clock's zero
+        try:
+            while True:
+                response = self.reader.get(timeout=0)
+                if response is None:
+                    await wake.wait()
+                    wake.clear()
+                    continue
+                if response.button in self.buttons:
+                    response_time = response.host_time - time_at_reset
+                    if response_time >= onset:
+                        return (response.button, response_time, response.device_rt_ms)
+        finally:
+            self.reader.remove_listener(listener)
+
+
+class ResponseMux:
+    """
+    First response from any of several input sources
+
+    A source is any object with a name and a coroutine next(onset) returning a
+    response tuple whose second item is the trial-clock time. wait() runs one
+    response window on a persistent event loop; adding a source (e.g. an eye
+    tracker) needs no change to the trial loop.
+    """
+
+    def __init__(self, sources=()):
+        self.sources = list(sources)  # List: input sources, all awaited concurrently
+        self.loop = asyncio.new_event_loop()
+
+    def add_source(self, source):
+        self.sources.append(source)
+
+    async def _first(self, timeout, onset):
+        tasks = {asyncio.ensure_future(source.next(onset)): source for source in self.sources}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if not done:
+            return None
+        first = min(done, key=lambda task: task.result()[1])  # Several sources in one loop pass: earliest wins
+        return tasks[first].name, first.result()
+
+    def wait(self, timeout, onset=0.0):
+        """
+        Wait for the first response of any source
+
+        Args:
+            timeout: Float - maximum wait (seconds)
+            onset: Float - stimulus onset (trial-clock seconds); earlier box presses are ignored
+
+        Returns:
+            Tuple - (source name, response tuple), or None on timeout
+        """
+        return self.loop.run_until_complete(self._first(timeout, onset))
+
+    def close(self):
+        self.loop.close()
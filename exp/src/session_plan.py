@@ -0,0 +1,201 @@
+"""
+Deterministic session plans: trial order, jitter times and display keys compiled once per seed and cached on disk
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from trial_table import ConditionTable, TrialSchedule, generate_schedule
+
+PLAN_VERSION = 1  # Integer: bump when the plan layout or the drawing procedure changes
+
+
+def derive_seed(participant, session):
+    """
+    Seed for a participant/session pair (same inputs -> same seed on every machine)
+
+    Args:
+        participant: String or integer - participant ID
+        session: Integer - session number
+
+    Returns:
+        Integer - 63-bit seed
+    """
+    digest = hashlib.sha256(f"{participant}|{session}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") >> 1
+
+
+def trial_list_hash(seed, trials, jitter_s):
+    """
+    Content hash of a session built from trial.Trial objects (main.py)
+
+    Args:
+        seed: Integer - seed the session was drawn from
+        trials: List of Trial objects - every trial of the session, in presentation order
+        jitter_s: Array - fixation jitter per trial (seconds)
+
+    Returns:
+        String - sha256 over the seed, the block/condition/cue/color layout of every trial and the jitter times
+    """
+    digest = hashlib.sha256(f"{PLAN_VERSION}|{int(seed)}".encode("utf-8"))
+    for trial in trials:
+        digest.update(
+            f"{trial.block}|{trial.cue_cond}|{trial.cue_soa}|{trial.cues}|{trial.cues_val}|{trial.target_colors}\n".encode("utf-8")
+        )
+    digest.update(np.ascontiguousarray(jitter_s, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class SessionPlan:
+    """A frozen session: schedule, fixation jitter per trial, display keys, seed and content hash"""
+
+    def __init__(self, schedule, jitter_s, display_keys, seed, design, plan_hash):
+        self.schedule = schedule  # TrialSchedule: trials in presentation order
+        self.jitter_s = jitter_s  # Array: fixation jitter per trial (seconds)
+        self.display_keys = display_keys  # Array of strings: "colors|rewards" per trial, e.g. "3142|0400"
+        self.seed = seed  # Integer: seed the plan was drawn from
+        self.design = design  # Dictionary: parameters the plan was compiled from
+        self.plan_hash = plan_hash  # String: sha256 of design and trial arrays
+
+    def __len__(self):
+        return len(self.schedule)
+
+
+def _design(cfg, seed, n_warmup_first, n_warmup_other, jitter):
+    offset, mean, maximum = jitter
+    return {
+        "version": PLAN_VERSION,
+        "seed": int(seed),
+        "reward_conditions": [{"values": list(c["values"]), "label": c["label"]} for c in cfg["reward_conditions"]],
+        "center": bool(cfg["center"]),
+        "n_blocks": int(cfg["n_blocks"]),
+        "n_per_block": int(cfg["n_per_block"]),
+        "n_warmup_first": int(n_warmup_first),
+        "n_warmup_other": int(n_warmup_other),
+        "jitter_offset_s": float(offset),
+        "jitter_mean_s": float(mean),
+        "jitter_max_s": float(maximum),
+    }
+
+
+def _plan_hash(design_json, arrays):
+    digest = hashlib.sha256(design_json.encode("utf-8"))
+    for name in sorted(arrays):
+        digest.update(name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()
+
+
+def _display_keys(table, variant):
+    """Encode color and reward layout of each trial as "cccc|rrrr" (one string per distinct variant)"""
+    keys = np.array([
+        "".join(map(str, colors)) + "|" + "".join(map(str, rewards))
+        for colors, rewards in zip(table.color_by_pos.tolist(), table.reward_by_pos.tolist())
+    ])
+    return keys[variant]
+
+
+def compile_plan(cfg, seed, n_warmup_first, n_warmup_other, jitter):
+    """
+    Draw a session plan
+
+    Args:
+        cfg: Dictionary - session config (reward_conditions, center, n_blocks, n_per_block)
+        seed: Integer - seed for the trial order and the jitter times
+        n_warmup_first: Integer - warm-up trials before block 1
+        n_warmup_other: Integer - warm-up trials before every later block
+        jitter: Tuple of floats - (offset, exponential mean, max) of the fixation jitter (seconds)
+
+    Returns:
+        SessionPlan - jitter is min(offset + Exp(mean), max) per trial
+    """
+    design = _design(cfg, seed, n_warmup_first, n_warmup_other, jitter)
+    rng = np.random.default_rng(seed)
+    table = ConditionTable(design["reward_conditions"], center=design["center"])
+    schedule = generate_schedule(
+        table, design["n_blocks"], design["n_per_block"], n_warmup_first, n_warmup_other, rng
+    )
+    jitter_s = np.minimum(
+        design["jitter_offset_s"] + rng.exponential(design["jitter_mean_s"], len(schedule)),
+        design["jitter_max_s"],
+    )
+    arrays = _plan_arrays(schedule, jitter_s)
+    design_json = json.dumps(design, sort_keys=True)
+    return SessionPlan(schedule, jitter_s, _display_keys(table, schedule.variant), seed, design, _plan_hash(design_json, arrays))
+
+
+def _plan_arrays(schedule, jitter_s):
+    return {
+        "variant": schedule.variant,
+        "block": schedule.block,
+        "trial_in_block": schedule.trial_in_block,
+        "warm_up": schedule.warm_up,
+        "jitter_s": jitter_s,
+    }
+
+
+def save_plan(plan, path):
+    """Write a plan as .npz (atomic replace)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as fp:
+        np.savez(
+            fp,
+            design=np.array(json.dumps(plan.design, sort_keys=True)),
+            plan_hash=np.array(plan.plan_hash),
+            display_keys=plan.display_keys,
+            **_plan_arrays(plan.schedule, plan.jitter_s),
+        )
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_plan(path):
+    """
+    Load a plan written by save_plan()
+
+    Raises:
+        ValueError - the stored arrays do not match the stored hash
+    """
+    with np.load(path, allow_pickle=False) as data:
+        design_json = str(data["design"])
+        arrays = {name: data[name] for name in ("variant", "block", "trial_in_block", "warm_up", "jitter_s")}
+        display_keys = data["display_keys"]
+        plan_hash = str(data["plan_hash"])
+    if _plan_hash(design_json, arrays) != plan_hash:
+        raise ValueError(f"Session plan {path} is corrupt (hash mismatch).")
+    design = json.loads(design_json)
+    table = ConditionTable(design["reward_conditions"], center=design["center"])
+    schedule = TrialSchedule(table, arrays["variant"], arrays["block"], arrays["trial_in_block"], arrays["warm_up"])
+    return SessionPlan(schedule, arrays["jitter_s"], display_keys, design["seed"], design, plan_hash)
+
+
+def load_or_compile_plan(path, cfg, seed, n_warmup_first, n_warmup_other, jitter):
+    """
+    Return the cached plan at path if it was compiled from the same design and seed, else compile and cache it
+
+    Args:
+        path: Path - plan file (.npz)
+        cfg, seed, n_warmup_first, n_warmup_other, jitter: as for compile_plan()
+
+    Returns:
+        SessionPlan
+    """
+    path = Path(path)
+    if path.exists():
+        try:
+            plan = load_plan(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Recompiling session plan {path.name}: {e}")
+        else:
+            if plan.design == _design(cfg, seed, n_warmup_first, n_warmup_other, jitter):
+                return plan
+            print(f"Recompiling session plan {path.name}: design or seed changed.")
+    plan = compile_plan(cfg, seed, n_warmup_first, n_warmup_other, jitter)
+    save_plan(plan, path)
+    return plan
@@ -0,0 +1,433 @@
+"""
+Headless session simulator: the testmain.py trial loop on a virtual clock, with a no-op renderer and simulated devices
+"""
+import math
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from box_emulator import CedrusEmulator, ResponseBoxEmulator
+from ccrp_design import (
+    CEDRUS_BUTTON_TO_COLOR_ID,
+    COLOR_KEYS,
+    FEEDBACK_WAIT_TIME,
+    FIRST_WARMUP_TRIALS,
+    MAX_WAIT_TIME,
+    OTHER_WARMUP_TRIALS,
+    RESPONSE_DEVICE_CEDRUS,
+    RESPONSE_DEVICE_KEYBOARD,
+    RESPONSE_DEVICE_SELF_MADE,
+    REWARD_MONEY_FACTOR,
+    SELF_MADE_PIN_TO_COLOR_ID,
+    TRIAL_START_JITTER_MAX,
+    TRIAL_START_JITTER_MEAN,
+    TRIAL_START_JITTER_OFFSET,
+    session_design,
+)
+from ccrp_rows import build_trial_row, column_metadata, design_metadata, finish_trial_row, run_columns, timing_compromised, trial_tables
+from frame_scheduler import FrameScheduler, TimingSummary
+from response_device import CedrusPacketParser, SelfMadeLineParser
+from session_plan import compile_plan, derive_seed
+from session_store import SessionColumnStore
+from trial_log import TrialLogWriter
+
+SIM_REFRESH_HZ = 100.0  # Float: refresh rate of the virtual display (Hz)
+SIM_BLOCK_BREAK_S = 20.0  # Float: virtual time spent on each block break screen (seconds)
+KEYBOARD_POLL_S = 0.001  # Float: keyboard arrivals are quantized to the response_mux poll interval (seconds)
+
+# Result of one simulated session: rows (list of dicts), metadata (dict), output paths (None without out_dir),
+# virtual session duration and host time the simulation took (seconds)
+SimulationResult = namedtuple(
+    "SimulationResult", ["rows", "metadata", "csv_path", "metadata_path", "columns_path", "virtual_s", "wall_s"]
+)
+
+
+class VirtualClock:
+    """
+    Simulated time, advanced explicitly
+
+    Stands in for both core.getTime() (time()) and the trial core.Clock (getTime(),
+    reset(), getLastResetTime()).
+    """
+
+    def __init__(self, start=0.0):
+        self.now = float(start)  # Float: current host time (seconds)
+        self._reset_at = self.now  # Float: host time of the last reset()
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def getTime(self):
+        return self.now - self._reset_at
+
+    def reset(self):
+        self._reset_at = self.now
+
+    def getLastResetTime(self):
+        return self._reset_at
+
+
+class VirtualWindow:
+    """
+    No-op window whose flip() waits for the next virtual refresh
+
+    A flip lands on the first refresh boundary after the current time; with
+    drop_rate, a flip occasionally misses one refresh (a dropped frame).
+    callOnFlip() callbacks run inside the flip, as in PsychoPy.
+    """
+
+    def __init__(self, clock, refresh_hz=SIM_REFRESH_HZ, drop_rate=0.0, rng=None):
+        """
+        Args:
+            clock: VirtualClock - time advanced by the flips
+            refresh_hz: Float - refresh rate (Hz)
+            drop_rate: Float - probability that a flip misses a refresh
+            rng: numpy Generator or None - draws the dropped frames
+        """
+        self.clock = clock
+        self.frame_s = 1.0 / refresh_hz
+        self.drop_rate = drop_rate
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.flips = 0  # Integer: flips so far
+        self._on_flip = []
+
+    def callOnFlip(self, function, *args, **kwargs):
+        self._on_flip.append((function, args, kwargs))
+
+    def flip(self):
+        frames = int(self.clock.now / self.frame_s + 1e-9) + 1
+        if self.drop_rate and self.rng.random() < self.drop_rate:
+            frames += 1
+        self.clock.now = frames * self.frame_s
+        self.flips += 1
+        callbacks, self._on_flip = self._on_flip, []
+        for function, args, kwargs in callbacks:
+            function(*args, **kwargs)
+        return self.clock.now
+
+
+class SimulatedParticipant:
+    """
+    Choice and RT model: picks the highest-reward color with probability p_best, otherwise
+    another color on screen; RT is ex-Gaussian (mu + N(0, sigma) + Exp(tau)) and responses
+    slower than MAX_WAIT_TIME are timeouts
+    """
+
+    def __init__(self, rng, p_best=0.9, rt_mu_s=0.45, rt_sigma_s=0.08, rt_tau_s=0.15):
+        """
+        Args:
+            rng: numpy Generator - source of the choices and RTs
+            p_best: Float - probability of choosing the highest-reward color
+            rt_mu_s, rt_sigma_s, rt_tau_s: Floats - ex-Gaussian RT parameters (seconds)
+        """
+        self.rng = rng
+        self.p_best = p_best
+        self.rt_mu_s = rt_mu_s
+        self.rt_sigma_s = rt_sigma_s
+        self.rt_tau_s = rt_tau_s
+
+    def respond(self, prepared):
+        """
+        Response to a prepared trial
+
+        Returns:
+            Tuple - (color id, RT seconds), or None for a timeout
+        """
+        rt_s = float(self.rng.normal(self.rt_mu_s, self.rt_sigma_s) + self.rng.exponential(self.rt_tau_s))
+        rt_s = max(rt_s, 0.1)
+        if rt_s > MAX_WAIT_TIME:
+            return None
+        reward_by_color = prepared["reward_by_color"]
+        best = max(reward_by_color, key=reward_by_color.get)
+        others = [c for c in reward_by_color if c != best]
+        if others and self.rng.random() >= self.p_best:
+            return int(self.rng.choice(others)), rt_s
+        return best, rt_s
+
+    def to_dict(self):
+        return {
+            "p_best": self.p_best, "rt_mu_s": self.rt_mu_s, "rt_sigma_s": self.rt_sigma_s, "rt_tau_s": self.rt_tau_s,
+        }
+
+
+class SimulatedDevice:
+    """
+    Response device on the virtual clock
+
+    The response boxes go through box_emulator and the real parsers: the sync command
+    reaches the box sync_delay_s after the cue flip and the press travels transfer_s
+    back to the host, so RT, RTComputerClock and SyncWriteDelayMs relate as in the lab.
+    """
+
+    def __init__(self, kind, clock, rng, sync_delay_s=0.0002, transfer_s=0.0008, transfer_jitter_s=0.0002):
+        """
+        Args:
+            kind: String - RESPONSE_DEVICE_KEYBOARD, RESPONSE_DEVICE_CEDRUS or RESPONSE_DEVICE_SELF_MADE
+            clock: VirtualClock - host clock
+            rng: numpy Generator - transfer jitter
+            sync_delay_s: Float - cue flip to sync command flushed (seconds)
+            transfer_s, transfer_jitter_s: Floats - mean and SD of the box-to-host delay (seconds)
+        """
+        self.kind = kind
+        self.clock = clock
+        self.rng = rng
+        self.sync_delay_s = sync_delay_s
+        self.transfer_s = transfer_s
+        self.transfer_jitter_s = transfer_jitter_s
+        self._device_now = 0.0  # Float: time seen by the emulated box
+        self.emulator = None
+        self.parser = None
+        if kind == RESPONSE_DEVICE_CEDRUS:
+            self.emulator = CedrusEmulator(time_fn=lambda: self._device_now)
+            self.parser = CedrusPacketParser()
+            self.labels = {color: button for button, color in CEDRUS_BUTTON_TO_COLOR_ID.items()}
+        elif kind == RESPONSE_DEVICE_SELF_MADE:
+            self.emulator = ResponseBoxEmulator(time_fn=lambda: self._device_now)
+            self.parser = SelfMadeLineParser()
+            self.labels = {color: pin for pin, color in SELF_MADE_PIN_TO_COLOR_ID.items()}
+        else:
+            self.labels = {i + 1: key for i, key in enumerate(COLOR_KEYS)}
+
+    def sync(self):
+        """Cue-flip action: reset the box timer; returns the sync write delay (ms, NaN for the keyboard)"""
+        if self.emulator is None:
+            return float("nan")
+        self._device_now = self.clock.time() + self.sync_delay_s
+        self.emulator.write(self.parser.SYNC_COMMAND)
+        return self.sync_delay_s * 1000
+
+    def press(self, color_id, cue_host_time, rt_s):
+        """
+        Press the button/key of color_id rt_s after the cue flip
+
+        Returns:
+            Tuple - (key/button label, host arrival time (seconds), device RT ms or None for the keyboard)
+        """
+        label = self.labels[color_id]
+        if self.emulator is None:
+            arrival = cue_host_time + math.ceil(rt_s / KEYBOARD_POLL_S) * KEYBOARD_POLL_S
+            return label, arrival, None
+        self._device_now = cue_host_time + rt_s
+        self.emulator.press(int(label))
+        arrival = cue_host_time + rt_s + max(0.0, float(self.rng.normal(self.transfer_s, self.transfer_jitter_s)))
+        events = self.parser.feed(self.emulator.read(self.emulator.in_waiting), arrival)
+        event = events[0]  # Cedrus also sends the release, which the parser drops
+        return event.button, arrival, event.device_rt_ms
+
+
+def simulate_session(
+    participant,
+    session,
+    out_dir=None,
+    seed=None,
+    response_device=RESPONSE_DEVICE_KEYBOARD,
+    participant_model=None,
+    participant_params=None,
+    refresh_hz=SIM_REFRESH_HZ,
+    drop_rate=0.0,
+):
+    """
+    Run one session of the CCRP trial loop in virtual time
+
+    The session plan, frame scheduling, trial rows, timing summary and output files are
+    the ones testmain.py uses; only the window, clock, participant and devices are simulated.
+
+    Args:
+        participant: String - participant ID (with session: seeds the plan, as in testmain.py)
+        session: Integer - 1-based session number
+        out_dir: Path or None - write <stem>_trials.csv, _metadata.json and _trials.npz here (None = in memory)
+        seed: Integer or None - seed of the participant, device and dropped-frame draws (None = plan seed)
+        response_device: String - device to simulate
+        participant_model: SimulatedParticipant or None - None = SimulatedParticipant(**participant_params) seeded from seed
+        participant_params: Dictionary or None - SimulatedParticipant parameters (None = defaults)
+        refresh_hz: Float - refresh rate of the virtual display (Hz)
+        drop_rate: Float - probability that a flip misses a refresh
+
+    Returns:
+        SimulationResult
+    """
+    wall_start = time.perf_counter()
+    design = session_design(session)
+    cfg = design["cfg"]
+    n_blocks = design["n_blocks"]
+    plan_seed = derive_seed(participant, session)
+    plan = compile_plan(
+        cfg, plan_seed, FIRST_WARMUP_TRIALS, OTHER_WARMUP_TRIALS,
+        (TRIAL_START_JITTER_OFFSET, TRIAL_START_JITTER_MEAN, TRIAL_START_JITTER_MAX),
+    )
+    rng = np.random.default_rng(plan_seed if seed is None else seed)
+    model = participant_model if participant_model is not None else SimulatedParticipant(rng, **(participant_params or {}))
+
+    clock = VirtualClock()
+    win = VirtualWindow(clock, refresh_hz, drop_rate, rng)
+    scheduler = FrameScheduler(win, refresh_hz)
+    timing_summary = TimingSummary(refresh_hz)
+    device = SimulatedDevice(response_device, clock, rng)
+    columns = run_columns(
+        color_map_layout="horizontal" if response_device == RESPONSE_DEVICE_CEDRUS else "keyboard",
+        response_device=response_device,
+        participant=participant,
+        handedness="NA",
+        color_vision="NA",
+        eye_vision="NA",
+    )
+    session_start = datetime.now()
+
+    def noop():
+        pass
+
+    def metadata(dat_columns):
+        return {
+            "trial_timing_and_design": design_metadata(
+                session=session,
+                cfg=cfg,
+                n_blocks=n_blocks,
+                n_trials_total=design["total_trials"],
+                n_trials_per_block=design["n_trials_per_block"],
+                total_warmup=design["total_warmup"],
+                refresh_hz=refresh_hz,
+                jitter_note="Jitter sampled as min(offset + Exp(mean), max) per trial, drawn once in the seeded session plan.",
+                session_plan={"seed": plan_seed, "plan_hash_sha256": plan.plan_hash, "plan_file": None,
+                              "start_trial": 1, "rows_kept_from_interrupted_run": None},
+            ),
+            "simulation": {
+                "participant_model": model.to_dict() if hasattr(model, "to_dict") else type(model).__name__,
+                "response_device": response_device,
+                "seed": seed,
+                "drop_rate": drop_rate,
+                "virtual_session_s": round(clock.now, 3),
+            },
+            "session_timing_summary": timing_summary.to_dict(),
+            **column_metadata(dat_columns),
+        }
+
+    paths = (None, None, None)
+    trial_log = None
+    if out_dir is not None:
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"CCRP_subj{participant}_ses{session}"
+        paths = (out_dir / f"{stem}_trials.csv", out_dir / f"{stem}_metadata.json", out_dir / f"{stem}_trials.npz")
+        trial_log = TrialLogWriter(
+            paths[0], metadata_path=paths[1], column_store=SessionColumnStore(paths[2]), build_metadata=metadata,
+        )
+
+    rows = []
+    cum_reward = 0.0
+    link_last = device.parser.link_stats() if response_device == RESPONSE_DEVICE_SELF_MADE else None
+    prev_block = None
+    for trial_index, trial_data in enumerate(plan.schedule):
+        prepared = {**trial_tables(trial_data), "trial_data": trial_data}
+        block = trial_data["block"]
+        if prev_block is not None and block != prev_block:
+            if trial_log is not None:
+                trial_log.checkpoint()
+            scheduler.release()
+            clock.advance(SIM_BLOCK_BREAK_S)
+            win.flip()
+
+        jitter_s = float(plan.jitter_s[trial_index])
+        fixation_phase = scheduler.present(noop, jitter_s, "fixation")
+        clock.reset()
+        cue_onset = {}
+
+        def on_cue_onset():
+            cue_onset["cue_time"] = clock.getTime()
+            cue_onset["host_time"] = clock.time()
+            cue_onset["sync_write_delay_ms"] = device.sync()
+
+        cue_phase = scheduler.show(noop, "cue", on_onset=on_cue_onset)
+        cue_time = cue_onset["cue_time"]
+        sync_write_delay_ms = cue_onset["sync_write_delay_ms"]
+
+        response = model.respond(prepared)
+        pressed_key = ""
+        selected_position = selected_color = None
+        actual_reward = 0
+        keys = None
+        if response is None:
+            clock.now = cue_onset["host_time"] + MAX_WAIT_TIME
+            rt = rt_computer_clock = MAX_WAIT_TIME * 1000
+            response_time = cue_time
+        else:
+            color_id, rt_s = response
+            pressed_key, arrival, device_rt_ms = device.press(color_id, cue_onset["host_time"], rt_s)
+            clock.now = arrival
+            response_time = clock.getTime()
+            keys = [(pressed_key, response_time)]
+            rt_computer_clock = (response_time - cue_time) * 1000
+            rt = rt_computer_clock if device_rt_ms is None else device_rt_ms + sync_write_delay_ms
+            selected_color = color_id
+            selected_position = selected_color - 1
+            actual_reward = prepared["reward_by_color"].get(selected_color, 0)
+        cum_reward = round(cum_reward + actual_reward * REWARD_MONEY_FACTOR, 2)
+
+        box_link = None
+        if link_last is not None:
+            now = device.parser.link_stats()
+            box_link = {"lost": now["lost"] - link_last["lost"], "duplicates": now["duplicates"] - link_last["duplicates"],
+                        "errors": now["crc_errors"] + now["malformed_lines"] - link_last["crc_errors"] - link_last["malformed_lines"]}
+            link_last = now
+        row = build_trial_row(
+            run_columns=columns,
+            position_to_color_id=trial_data["position_to_color_id"],
+            position_to_reward=trial_data["position_to_reward"],
+            colors_shown=prepared["colors_shown"],
+            selected_position=selected_position,
+            selected_color=selected_color,
+            pressed_key=pressed_key,
+            keys=keys,
+            cue_time=cue_time,
+            response_time=response_time,
+            rt_ms=rt,
+            rt_computer_clock_ms=rt_computer_clock,
+            end_trial_time=0.0,
+            actual_reward=actual_reward,
+            max_reward=prepared["max_reward"],
+            cum_reward=cum_reward,
+            session=session - 1,
+            block=block,
+            trial_index=trial_index,
+            trial_condition_label=trial_data["cue_condition"],
+            num_cues=trial_data["num_cues"],
+            warm_up=trial_data["warm_up"],
+            trial_start_jitter_time_ms=jitter_s * 1000,
+            fixation_phase=fixation_phase,
+            cue_phase=cue_phase,
+            phase_stats={"fixation": scheduler.phase_stats(fixation_phase)},
+            sync_write_delay_ms=sync_write_delay_ms,
+            box_link=box_link,
+        )
+
+        feedback_phase = scheduler.present(noop, FEEDBACK_WAIT_TIME, "feedback")
+        # The feedback phase ends at the next flip (fixation of the next trial); its last frame is measured then
+        phase_stats = {phase.phase: scheduler.phase_stats(phase) for phase in (fixation_phase, cue_phase, feedback_phase)}
+        compromised = timing_compromised(phase_stats, scheduler.frame_s)
+        timing_summary.add(trial_index + 1, phase_stats, compromised)
+        wall_clock = session_start + timedelta(seconds=clock.now)
+        finish_trial_row(
+            row,
+            end_trial_time=clock.getTime(),
+            trial_wall_clock_str=wall_clock.strftime("%Y-%m-%d %H:%M:%S") + f".{wall_clock.microsecond // 1000:03d}",
+            session_elapsed_sec=clock.now,
+            feedback_phase=feedback_phase,
+            feedback_stats=phase_stats["feedback"],
+            timing_compromised=compromised,
+        )
+        scheduler.pop_records()
+        rows.append(row)
+        if trial_log is not None:
+            trial_log.write_row(row)
+        prev_block = block
+
+    meta = metadata(list(rows[0].keys()) if rows else [])
+    if trial_log is not None:
+        trial_log.update_metadata()
+        trial_log.close()
+    return SimulationResult(rows, meta, *paths, clock.now, time.perf_counter() - wall_start)
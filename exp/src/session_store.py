@@ -0,0 +1,177 @@
+"""
+Typed columnar copy of the trial data (NumPy .npz, one file per session)
+"""
+import numbers
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Four-digit per-location fields stored as (n_trials, 4) small-int arrays instead of strings
+SLOT_COLUMNS = ("Cues", "CueValues", "CueRanks", "PointTargetResponse")
+SOURCE_COLUMN = "SourceFile"  # String: column added by load_study() naming the session file
+
+# Fixed dtypes of the known trial-row columns (ccrp_rows.build_trial_row), so every session stores a
+# column alike whatever its values were (e.g. all-NaN clock columns); other columns are inferred
+COLUMN_DTYPES = {
+    **dict.fromkeys((
+        "ExperimentName", "CodeVersion", "ColorMapLayout", "ColorKeyMapping", "ResponseDevice", "Subject",
+        "Handedness", "ColorVision", "EyeVision", "CueCondition", "Response", "TrialWallClockTime", "Note",
+    ), np.str_),
+    **dict.fromkeys((
+        "ExperimentNumber", "Session", "Block", "Trial", "WarmUpTrial", "NumCues", "CueSOA", "RespLoc",
+        "ClockSyncSamples", "ACC", "INTR", "CueResponseValue", "CueResponseExpValue", "CueRankResponse",
+        "ExpectedReward", "Reward", "MaxReward", "FixationFrames", "FeedbackFrames", "FixationDroppedFrames",
+        "FeedbackDroppedFrames", "TimingCompromised",
+    ), np.int64),
+    **dict.fromkeys((
+        "TrialStartJitterTime", "RT", "RTComputerClock", "RTDifference", "SyncWriteDelayMs", "HostToDeviceDelayMs",
+        "ClockSyncErrorMs", "DeviceClockDriftPpm", "BoxFramesLost", "BoxFramesDuplicated", "BoxFrameErrors",
+        "CumReward", "CueTime", "PointTargetTime", "ColorTargetTime", "EndTrialTime", "SessionElapsedSec",
+        "FixationIntendedMs", "FixationAchievedMs", "CueOnsetErrorMs", "FeedbackIntendedMs", "FixationMaxIntervalMs",
+        "FixationOnsetErrorMs", "FeedbackMaxIntervalMs",
+    ), np.float64),
+    "LateResponse": bool,
+}
+
+
+def _is_bool(v):
+    return isinstance(v, (bool, np.bool_))
+
+
+def _column_array(name, values):
+    """Convert one column (list of Python or NumPy scalars) to a typed array"""
+    if name in SLOT_COLUMNS:
+        return np.array([[int(d) for d in str(v)] for v in values], dtype=np.uint8).reshape(len(values), -1)
+    dtype = COLUMN_DTYPES.get(name)
+    if dtype is np.str_:
+        return np.array([str(v) for v in values], dtype=np.str_)
+    if dtype is np.float64:
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if dtype is not None:
+        return np.array(values, dtype=dtype)
+    if all(_is_bool(v) for v in values):
+        return np.array(values, dtype=bool)
+    if all(isinstance(v, numbers.Integral) and not _is_bool(v) for v in values):
+        return np.array(values, dtype=np.int64)
+    if all(isinstance(v, numbers.Real) and not _is_bool(v) for v in values):
+        return np.array(values, dtype=np.float64)
+    return np.array([str(v) for v in values], dtype=np.str_)
+
+
+def rows_to_columns(rows):
+    """
+    Convert trial rows to typed columns
+
+    Args:
+        rows: List of dicts - trial rows as built for the CSV
+
+    Returns:
+        Dictionary - column name -> NumPy array (slot columns have shape (n_trials, 4))
+    """
+    if not rows:
+        return {}
+    return {name: _column_array(name, [row[name] for row in rows]) for name in rows[0]}
+
+
+class SessionColumnStore:
+    """Collect trial rows and rewrite the session's .npz file on save()"""
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Path - .npz file for this session
+        """
+        self.path = Path(path)
+        self.rows = []  # List: all rows of the session so far
+        self.kept = {}  # Dictionary: columns loaded from an earlier run of the session (see load())
+
+    def load(self, limit=None):
+        """Keep the first limit trials already saved in the .npz (resumed session); None = all of them"""
+        self.kept = {}
+        if self.path.exists():
+            self.kept = {name: array[:limit] for name, array in load_session(self.path).items()}
+
+    def extend(self, rows):
+        """Add trial rows"""
+        self.rows.extend(rows)
+
+    def save(self):
+        """Write all rows as typed columns; the file is replaced atomically"""
+        if not self.rows:
+            return
+        columns = rows_to_columns(self.rows)
+        if self.kept:
+            columns = _concat_columns([self.kept, columns])
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as fp:
+            np.savez(fp, **columns)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def load_session(path):
+    """
+    Load one session file
+
+    Args:
+        path: Path - session .npz file
+
+    Returns:
+        Dictionary - column name -> NumPy array
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _empty_like(array, n):
+    """Fill value column for sessions that lack a column"""
+    if array.dtype.kind in "US":
+        return np.full((n,) + array.shape[1:], "", dtype=array.dtype)
+    if array.dtype.kind == "f":
+        return np.full((n,) + array.shape[1:], np.nan)
+    return np.zeros((n,) + array.shape[1:], dtype=array.dtype)
+
+
+def _n_trials(columns):
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def _concat_columns(parts):
+    """Concatenate column dicts in order; columns missing from a part are filled (see _empty_like)"""
+    names = []  # List: union of column names, in first-seen order
+    for part in parts:
+        names.extend(name for name in part if name not in names)
+    sizes = [_n_trials(part) for part in parts]
+
+    columns = {}
+    for name in names:
+        template = next(p[name] for p in parts if name in p)
+        pieces = [p[name] if name in p else _empty_like(template, n) for p, n in zip(parts, sizes)]
+        if any(piece.dtype.kind == "U" for piece in pieces) and any(piece.dtype.kind != "U" for piece in pieces):
+            pieces = [piece.astype(np.str_) for piece in pieces]  # Older files inferred this column as text in some sessions
+        columns[name] = np.concatenate(pieces) if pieces else template[:0]
+    return columns
+
+
+def load_study(source, pattern="*_trials.npz"):
+    """
+    Load every session of a study into one set of columns
+
+    Args:
+        source: Path or list of Paths - directory searched recursively, or explicit session files
+        pattern: String - file name pattern used when source is a directory
+
+    Returns:
+        Dictionary - column name -> NumPy array over all trials of all sessions,
+        plus SourceFile with the session file name of each trial
+    """
+    if isinstance(source, (str, os.PathLike)):
+        paths = sorted(Path(source).rglob(pattern))
+    else:
+        paths = [Path(p) for p in source]
+    sessions = [load_session(p) for p in paths]
+    study = _concat_columns(sessions)
+    study[SOURCE_COLUMN] = np.repeat(np.array([p.name for p in paths], dtype=np.str_), [_n_trials(s) for s in sessions])
+    return study
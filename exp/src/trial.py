@@ -3,12 +3,42 @@ Trial class and trial generation functions
 """
 import random as rnd
 
+import numpy as np
+
+
+def cue_ranks(cues):
+    """
+    Rank cue values within each trial (highest value = rank 1, ties share a rank, empty = last)
+
+    Same result as [n - sorted(cues).index(x) for x in cues], computed for a whole
+    block at once: the rank is n minus the number of strictly smaller values.
+
+    Args:
+        cues: Array-like of integers - shape (n_locations,) or (n_trials, n_locations)
+
+    Returns:
+        NumPy array of integers - ranks, same shape as cues
+    """
+    cues = np.asarray(cues)
+    smaller = (cues[..., None, :] < cues[..., :, None]).sum(axis=-1)  # Integer per cue: values below it
+    return cues.shape[-1] - smaller
+
 
 class Trial:
     """Represents a single experimental trial"""
-    
-    def __init__(self, session, block, warmup, cue_cond, cond, cue_soa, 
-                 no_cue_locations, cues, cues_val, target_colors):
+
+    # Fixed attribute set: no per-instance __dict__ (hundreds of trials per session)
+    __slots__ = (
+        "session", "block", "warmup", "cue_cond", "cond", "cue_soa", "no_cues",
+        "cues", "cues_val", "cue_ranks", "target_colors", "ed",
+        "response", "response_loc", "rt", "acc", "intr", "err",
+        "cue_response_value", "cue_response_exp_value", "cue_response_rank",
+        "expected_reward", "reward", "max_reward", "cum_reward",
+        "cue_time", "color_target_time", "end_trial_time",
+    )
+
+    def __init__(self, session, block, warmup, cue_cond, cond, cue_soa,
+                 no_cue_locations, cues, cues_val, target_colors, compute_ranks=True):
         # Session and block information
         self.session = session  # Integer: session number (1-5 = practice, 6+ = experimental)
         self.block = block  # Integer: block number within session (1, 2, 3, ...)
@@ -24,26 +54,15 @@ class Trial:
         cue_order = list(range(no_cue_locations))  # List: [0, 1, 2, 3] = cue position indices
         rnd.shuffle(cue_order)  # Shuffle: randomize cue positions
         
-        # Initialize cue arrays - one value per cue location
-        self.cues = no_cue_locations * [0]  # List of integers: cue values at each position [0,0,0,0]
-        self.cues[0:self.no_cues] = cues  # Fill first N positions with actual cue values
+        # Pad to one value per cue location, then apply the random order
+        padding = (no_cue_locations - self.no_cues) * [0]  # List: zeros for empty locations
+        padded_cues = list(cues) + padding  # List of integers: cue values, active cues first
+        padded_vals = list(cues_val) + padding  # List of integers: reward values, same layout
+        self.cues = [padded_cues[i] for i in cue_order]  # List of integers: final cue values at each position (e.g., [1,0,2,0])
+        self.cues_val = [padded_vals[i] for i in cue_order]  # List of integers: final reward values at each position
         
-        self.cues_val = no_cue_locations * [0]  # List of integers: cue reward values [0,0,0,0]
-        self.cues_val[0:self.no_cues] = cues_val  # Fill first N positions with actual reward values
-        
-        # Shuffle cue positions - apply random order
-        temp_cues = no_cue_locations * [0]  # Temporary list for shuffled cues
-        temp_cues_val = no_cue_locations * [0]  # Temporary list for shuffled values
-        for i in range(no_cue_locations):
-            temp_cues[i] = self.cues[cue_order[i]]  # Reorder cues according to shuffled positions
-            temp_cues_val[i] = self.cues_val[cue_order[i]]  # Reorder values accordingly
-        
-        self.cues = temp_cues  # List of integers: final cue values at each position (e.g., [1,0,2,0])
-        self.cues_val = temp_cues_val  # List of integers: final reward values at each position
-        
-        # Calculate cue ranks - higher value = higher rank
-        self.cue_ranks = [sorted(self.cues).index(x) for x in self.cues]  # List: rank of each cue (0=lowest)
-        self.cue_ranks = [no_cue_locations - x for x in self.cue_ranks]  # Invert: higher value = higher rank
+        # Cue ranks - higher value = higher rank; generate_block_trials() ranks a whole block at once
+        self.cue_ranks = cue_ranks(self.cues).tolist() if compute_ranks else None  # List: rank of each cue (1 = highest)
         
         # Target colors - which color appears at each target position
         self.target_colors = target_colors  # String: color labels for each target (e.g., "1234")
@@ -118,10 +137,15 @@ def generate_block_trials(session, block, repetitions, warmup, cue_soa_conds,
                 
                 # Create trial object
                 trial = Trial(session, block, warmup, cue_cond, cond, cue_soa,
-                            no_cue_locations, cues, cues_val, target_colors)
+                            no_cue_locations, cues, cues_val, target_colors, compute_ranks=False)
                 trial.ed = stim_ed  # Set exposure duration
                 
                 block_data.append(trial)  # Add trial to block
     
+    # Rank all cues of the block in one pass
+    block_ranks = cue_ranks([trial.cues for trial in block_data]).tolist()  # List of lists: ranks per trial
+    for trial, ranks in zip(block_data, block_ranks):
+        trial.cue_ranks = ranks
+
     rnd.shuffle(block_data)  # Shuffle: randomize trial order within block
     return block_data  # List: return shuffled trials
@@ -0,0 +1,299 @@
+"""
+Trial data log: one CSV kept open for the session plus an append-only journal
+"""
+import copy
+import csv
+import json
+import os
+import threading
+from pathlib import Path
+
+JOURNAL_KEPT_ROWS_KEY = "__kept_rows__"  # String: first journal line of a resumed session ({key: rows kept})
+
+
+def journal_path_for(csv_path):
+    """Return the journal file that belongs to a trials CSV ("..._trials.csv" -> "..._trials.journal")"""
+    return Path(csv_path).with_suffix(".journal")
+
+
+def _read_journal(journal_path):
+    """
+    Return (kept_rows, rows) stored in a journal; a torn last line (crash mid-write) is ignored
+
+    kept_rows is None for a fresh session, or the number of CSV rows a resumed
+    session started from (written as the journal's first line).
+    """
+    kept_rows = None
+    rows = []
+    with open(journal_path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if not rows and kept_rows is None and JOURNAL_KEPT_ROWS_KEY in entry:
+                kept_rows = entry[JOURNAL_KEPT_ROWS_KEY]
+                continue
+            rows.append(entry)
+    return kept_rows, rows
+
+
+def read_logged_rows(csv_path):
+    """
+    Read the rows of a trials CSV (values as strings)
+
+    Args:
+        csv_path: Path - trials CSV
+
+    Returns:
+        Tuple - (column names, list of dicts); ([], []) if the file does not exist
+    """
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        return [], []
+    with open(csv_path, "r", encoding="utf-8", newline="") as fp:
+        reader = csv.DictReader(fp)
+        return list(reader.fieldnames or []), list(reader)
+
+
+def _rewrite_csv(csv_path, columns, rows):
+    """Replace a trials CSV with the given rows (atomic, fsynced)"""
+    tmp_path = csv_path.with_suffix(".csv.tmp")
+    with open(tmp_path, "w", encoding="utf-8", newline="") as fp:
+        writer = csv.DictWriter(fp, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, csv_path)
+
+
+def recover_trial_journal(csv_path, column_store=None):
+    """
+    Rebuild a trials CSV from the journal left behind by a crashed session
+
+    The journal holds every row written so far (after the rows a resumed session
+    kept), so it replaces whatever part of the CSV had reached the disk. The
+    journal is removed afterwards.
+
+    Args:
+        csv_path: Path - trials CSV of the session
+        column_store: SessionColumnStore or None - columnar copy rebuilt from the same rows
+
+    Returns:
+        Integer - number of recovered rows (0 if there was no journal)
+    """
+    csv_path = Path(csv_path)
+    journal_path = journal_path_for(csv_path)
+    if not journal_path.exists():
+        return 0
+    kept_rows, rows = _read_journal(journal_path)
+    if kept_rows:
+        columns, logged = read_logged_rows(csv_path)
+        _rewrite_csv(csv_path, columns, logged[:kept_rows] + rows)
+    elif rows:
+        _rewrite_csv(csv_path, list(rows[0].keys()), rows)
+    if column_store is not None and (kept_rows or rows):
+        column_store.load(limit=kept_rows or 0)
+        column_store.extend(rows)
+        column_store.save()
+    journal_path.unlink()
+    return len(rows)
+
+
+class TrialLogWriter:
+    """
+    Write trial rows to a CSV that stays open for the whole session
+
+    write_row() only appends one JSON line to the journal (an OS write, no fsync)
+    and queues the row. A background thread writes queued rows to the CSV and
+    fsyncs both files when checkpoint() is called (block boundaries), every
+    sync_interval seconds, and on close(). If the process dies, the journal is
+    replayed by recover_trial_journal() on the next start.
+
+    Rows stay queued until they are in the CSV: a failed sync cuts the CSV back to
+    its last synced size and the next sync retries them. A failure on the thread is
+    stored in error; close() raises it if the final sync still fails, and then keeps
+    the journal so the rows can be recovered.
+
+    The sidecar payload is built and copied on the calling thread (first row and
+    update_metadata()), so the sync thread never reads session state that the trial
+    loop is still changing; it only serializes the snapshot.
+
+    With keep_rows, an existing CSV is continued instead of replaced (resumed
+    session): its first keep_rows rows are kept and new rows are appended.
+    """
+
+    def __init__(self, csv_path, sync_interval=None, metadata_path=None, build_metadata=None, column_store=None,
+                 keep_rows=None):
+        """
+        Args:
+            csv_path: Path - trials CSV to create
+            sync_interval: Float or None - also sync every this many seconds (None = checkpoints only)
+            metadata_path: Path or None - sidecar JSON written once the columns are known
+            build_metadata: Function or None - build_metadata(columns) returns the sidecar payload
+            column_store: SessionColumnStore or None - typed columnar copy saved on every sync
+            keep_rows: Integer or None - rows of an existing CSV to keep and append to (None = new file)
+        """
+        self.csv_path = Path(csv_path)
+        self.journal_path = journal_path_for(self.csv_path)
+        self.sync_interval = sync_interval
+        self.metadata_path = metadata_path
+        self.build_metadata = build_metadata
+        self.column_store = column_store
+        self.keep_rows = keep_rows
+        self.columns = None  # List: CSV header, taken from the first row
+        self.rows_written = 0  # Integer: rows handed to write_row()
+        self.rows_synced = 0  # Integer: rows written and fsynced to the CSV
+        self._journal = None
+        self._csv_file = None
+        self._csv_writer = None
+        self._pending = []  # List: rows not yet written to the CSV (removed only once synced)
+        self._csv_synced_size = 0  # Integer: CSV size in bytes after the last successful sync
+        self._csv_failed = False  # Boolean: last CSV write failed; the file is cut back before the retry
+        self._store_dirty = False  # Boolean: column store holds rows not yet saved
+        self._metadata = None  # Dictionary or None: sidecar payload snapshot still to be written
+        self._lock = threading.Lock()  # Lock: guards self._pending and self._metadata
+        self._sync_lock = threading.Lock()  # Lock: one sync at a time (thread or close())
+        self._wake = threading.Event()  # Event: asks the thread to sync now
+        self._closing = False
+        self._thread = None
+        self.error = None  # Exception: last error raised on the sync thread
+
+    def _open(self, columns):
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        if self.keep_rows is None:
+            self.columns = list(columns)
+            self._csv_file = open(self.csv_path, "w", encoding="utf-8", newline="")
+            self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self.columns)
+            self._csv_writer.writeheader()
+            self._csv_file.flush()
+        else:
+            logged_columns, logged = read_logged_rows(self.csv_path)
+            self.columns = logged_columns or list(columns)
+            _rewrite_csv(self.csv_path, self.columns, logged[:self.keep_rows])
+            self._journal.write(json.dumps({JOURNAL_KEPT_ROWS_KEY: self.keep_rows}) + "\n")
+            self._journal.flush()
+            self._csv_file = open(self.csv_path, "a", encoding="utf-8", newline="")
+            self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self.columns)
+            if self.column_store is not None:
+                self.column_store.load(limit=self.keep_rows)
+        self._csv_synced_size = os.fstat(self._csv_file.fileno()).st_size
+        self._snapshot_metadata()
+        self._thread = threading.Thread(target=self._run, name="trial-log-sync", daemon=True)
+        self._thread.start()
+
+    def write_row(self, row):
+        """Log one trial row; the header (and sidecar JSON) are written with the first row"""
+        if self._journal is None:
+            self._open(row.keys())
+        self._journal.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._journal.flush()  # Reaches the OS page cache: survives a crash of this process
+        with self._lock:
+            self._pending.append(row)
+        self.rows_written += 1
+
+    def _snapshot_metadata(self):
+        if self.metadata_path is None or self.build_metadata is None:
+            return
+        metadata = copy.deepcopy(self.build_metadata(self.columns))  # Detached from live summaries and stats
+        with self._lock:
+            self._metadata = metadata
+
+    def update_metadata(self):
+        """Snapshot the sidecar payload now and rewrite the JSON at the next sync (e.g. with end-of-session summaries)"""
+        if self._journal is not None:
+            self._snapshot_metadata()
+
+    def checkpoint(self):
+        """Ask the background thread to write and fsync everything logged so far"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._closing:
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+            if self._closing:
+                break
+            try:
+                self._sync()
+            except Exception as e:  # Keep the session running; the rows stay queued and the next sync retries
+                self.error = e
+
+    def _reopen_csv(self):
+        """Drop whatever a failed write left in the CSV and reopen it for appending"""
+        try:
+            self._csv_file.close()
+        except OSError:
+            pass  # Buffered part of the failed write: cut off below
+        os.truncate(self.csv_path, self._csv_synced_size)
+        self._csv_file = open(self.csv_path, "a", encoding="utf-8", newline="")
+        self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self.columns)
+        self._csv_failed = False
+
+    def _write_csv(self, rows):
+        if self._csv_failed:
+            self._reopen_csv()
+        try:
+            self._csv_writer.writerows(rows)
+            self._csv_file.flush()
+            os.fsync(self._csv_file.fileno())
+            os.fsync(self._journal.fileno())
+        except Exception:
+            self._csv_failed = True
+            raise
+        self._csv_synced_size = os.fstat(self._csv_file.fileno()).st_size
+
+    def _sync(self):
+        with self._sync_lock:
+            with self._lock:
+                rows = list(self._pending)
+            if rows:
+                self._write_csv(rows)
+                with self._lock:
+                    del self._pending[:len(rows)]  # write_row() only appends, so these are still the first rows
+                self.rows_synced += len(rows)
+                if self.column_store is not None:
+                    self.column_store.extend(rows)
+                    self._store_dirty = True
+            if self._store_dirty:
+                self.column_store.save()
+                self._store_dirty = False
+            with self._lock:
+                metadata = self._metadata
+            if metadata is not None:
+                with open(self.metadata_path, "w", encoding="utf-8") as meta_fp:
+                    json.dump(metadata, meta_fp, indent=2, ensure_ascii=False)
+                    meta_fp.flush()
+                    os.fsync(meta_fp.fileno())
+                with self._lock:
+                    if self._metadata is metadata:  # Not replaced by a newer snapshot meanwhile
+                        self._metadata = None
+
+    def close(self):
+        """
+        Write and fsync all remaining rows, close the files and remove the journal
+
+        The journal is removed only when every logged row reached the CSV. If the
+        final sync fails, its exception is raised after the files are closed and the
+        journal is left for recover_trial_journal().
+        """
+        if self._journal is None:
+            return
+        self._closing = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self._sync()
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            try:
+                self._csv_file.close()
+            except OSError:
+                pass  # Unsynced rows are still in the journal
+            self._journal.close()
+            self._journal = None
+            if self.rows_synced == self.rows_written:
+                self.journal_path.unlink()
@@ -0,0 +1,63 @@
+"""
+Idle-time work: tasks queued for the gaps between the flips of a timed phase (e.g. next-trial preparation during feedback)
+"""
+import time
+
+
+class IdleWork:
+    """
+    Named tasks run from FrameScheduler.present(on_frame=...) within a time budget per frame
+
+    Each frame callback runs queued tasks in order until frame_budget_s has passed
+    since the callback started; a task is never interrupted, so tasks should be
+    short (one trial's preparation, one row). finish() runs whatever is left once
+    the phase is over and returns the results by name.
+    """
+
+    def __init__(self, frame_budget_s, time_fn=time.perf_counter):
+        """
+        Args:
+            frame_budget_s: Float - time per frame the tasks may use (seconds), well below one refresh period
+            time_fn: Function - clock used for the budget
+        """
+        self.frame_budget_s = frame_budget_s
+        self.time_fn = time_fn
+        self._tasks = []  # List of (name, function, args, kwargs): queued, oldest first
+        self.results = {}  # Dictionary: task name -> return value
+        self.tasks_run = 0  # Integer: tasks run from frame callbacks
+        self.tasks_late = 0  # Integer: tasks left for finish() (the phase was too short or too busy)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def add(self, name, function, *args, **kwargs):
+        """Queue function(*args, **kwargs); its return value is stored under name"""
+        self._tasks.append((name, function, args, kwargs))
+
+    def _run_next(self):
+        name, function, args, kwargs = self._tasks.pop(0)
+        self.results[name] = function(*args, **kwargs)
+
+    def on_frame(self, frame):
+        """Frame callback: run tasks until the budget of this frame is used"""
+        start = self.time_fn()
+        while self._tasks and self.time_fn() - start < self.frame_budget_s:
+            self._run_next()
+            self.tasks_run += 1
+
+    def finish(self):
+        """
+        Run the remaining tasks and start a new batch
+
+        Returns:
+            Dictionary - task name -> return value, for every task since the last finish()
+        """
+        while self._tasks:
+            self._run_next()
+            self.tasks_late += 1
+        results, self.results = self.results, {}
+        return results
+
+    def stats(self):
+        """Dictionary - tasks run between flips and tasks that had to run after the phase"""
+        return {"tasks_run_between_flips": self.tasks_run, "tasks_run_after_phase": self.tasks_late}
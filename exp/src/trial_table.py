@@ -0,0 +1,261 @@
+"""
+NumPy-backed condition table and balanced trial schedules for the CCRP paradigm (testmain.py)
+"""
+from collections.abc import Mapping
+from itertools import permutations
+
+import numpy as np
+
+NUM_POSITIONS = 4  # Integer: cue locations; color ids and reward values run 1..NUM_POSITIONS
+
+
+class ConditionTable:
+    """
+    Every distinct trial variant of a set of reward conditions, one row per variant
+
+    color_by_pos and reward_by_pos are (n_variants, NUM_POSITIONS) integer arrays
+    (0 = nothing at that position). Variants are stored grouped by condition:
+    condition c owns rows offsets[c] .. offsets[c] + counts[c].
+    """
+
+    def __init__(self, reward_conditions, center=False):
+        """
+        Args:
+            reward_conditions: List of dicts - {"values": tuple of rewards, "label": CueCondition label}
+            center: Boolean - True = one stimulus at position 0 (session 1 layout)
+        """
+        self.values = [tuple(c["values"]) for c in reward_conditions]  # List of tuples: reward values per condition
+        self.labels = [c["label"] for c in reward_conditions]  # List of strings: CueCondition label per condition
+        self.center = center
+        blocks = [self._enumerate(values) for values in self.values]
+        self.color_by_pos = np.concatenate([colors for colors, _ in blocks])  # Array: color id per position
+        self.reward_by_pos = np.concatenate([rewards for _, rewards in blocks])  # Array: reward per position
+        self.counts = np.array([len(colors) for colors, _ in blocks])  # Array: variants per condition
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])  # Array: first row per condition
+        self.condition = np.repeat(np.arange(len(blocks)), self.counts)  # Array: condition index per row
+
+    def __len__(self):
+        return len(self.condition)
+
+    def _enumerate(self, reward_values):
+        """Return (colors, rewards) arrays for all variants of one condition"""
+        color_ids = np.arange(1, NUM_POSITIONS + 1)
+        if self.center:
+            colors = np.zeros((NUM_POSITIONS, NUM_POSITIONS), dtype=np.int8)
+            colors[:, 0] = color_ids
+            rewards = np.zeros_like(colors)
+            rewards[:, 0] = reward_values[0]
+            return colors, rewards
+
+        color_perms = np.array(list(permutations(color_ids)), dtype=np.int8)  # (24, 4)
+        # Distinct placements of the reward values over the positions: (n_placements, 4)
+        placements = np.array(sorted({
+            tuple(reward_values[positions.index(i)] if i in positions else 0 for i in range(NUM_POSITIONS))
+            for positions in permutations(range(NUM_POSITIONS), len(reward_values))
+        }), dtype=np.int8)
+        colors = np.tile(color_perms, (len(placements), 1))
+        rewards = np.repeat(placements, len(color_perms), axis=0)
+        return colors, rewards
+
+
+class TrialSchedule:
+    """
+    One session of trials as arrays indexing into a ConditionTable
+
+    Indexing returns a TrialView; nothing per trial is built before it is used.
+    """
+
+    def __init__(self, table, variant, block, trial_in_block, warm_up):
+        self.table = table
+        self.variant = variant  # Array: ConditionTable row per trial
+        self.block = block  # Array: 1-based block number per trial
+        self.trial_in_block = trial_in_block  # Array: 1-based index within the block (warm-up included)
+        self.warm_up = warm_up  # Array: 1 = warm-up trial, 0 = main trial
+
+    def __len__(self):
+        return len(self.variant)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return TrialView(self, index % len(self))
+
+    def __iter__(self):
+        return (TrialView(self, i) for i in range(len(self)))
+
+
+class TrialView(Mapping):
+    """
+    Read-only trial dict backed by a TrialSchedule row
+
+    Keys: position_to_color_id, position_to_reward ({position: id/reward or None}),
+    reward_condition_values, cue_condition, num_cues, warm_up, block, trial_in_block.
+    """
+
+    __slots__ = ("_schedule", "_index")
+    KEYS = (
+        "position_to_color_id", "position_to_reward", "reward_condition_values",
+        "cue_condition", "num_cues", "warm_up", "block", "trial_in_block",
+    )
+
+    def __init__(self, schedule, index):
+        self._schedule = schedule
+        self._index = index
+
+    def __getitem__(self, key):
+        schedule, i = self._schedule, self._index
+        table = schedule.table
+        row = schedule.variant[i]
+        if key == "position_to_color_id":
+            return {p: int(c) or None for p, c in enumerate(table.color_by_pos[row])}
+        if key == "position_to_reward":
+            return {p: int(r) or None for p, r in enumerate(table.reward_by_pos[row])}
+        if key == "reward_condition_values":
+            return table.values[table.condition[row]]
+        if key == "cue_condition":
+            return table.labels[table.condition[row]]
+        if key == "num_cues":
+            return len(table.values[table.condition[row]])
+        if key in ("warm_up", "block", "trial_in_block"):
+            return int(getattr(schedule, key)[i])
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+
+def generate_schedule(table, n_blocks, n_per_block, n_warmup_first, n_warmup_other, rng=None):
+    """
+    Draw a condition-balanced session
+
+    Every block (and every warm-up draw) holds each condition n_per_block // n_conditions
+    times, with the variant of each trial drawn uniformly within its condition and
+    the block order shuffled. Warm-up trials are the first n_warmup trials of an
+    extra balanced block drawn before each main block (as in the paradigm).
+
+    Args:
+        table: ConditionTable - variants to draw from
+        n_blocks: Integer - main blocks
+        n_per_block: Integer - main trials per block
+        n_warmup_first: Integer - warm-up trials before block 1
+        n_warmup_other: Integer - warm-up trials before every later block
+        rng: numpy Generator, integer seed or None - random source (None = fresh entropy)
+
+    Returns:
+        TrialSchedule - warm-up and main trials of all blocks, in presentation order
+    """
+    rng = np.random.default_rng(rng)
+    n_conditions = len(table.counts)
+    reps = n_per_block // n_conditions
+    block_conditions = np.repeat(np.arange(n_conditions), reps)
+
+    # Rows 2k / 2k+1: warm-up draw and main block of block k
+    conditions = np.broadcast_to(block_conditions, (2 * n_blocks, len(block_conditions)))
+    draws = table.offsets[conditions] + rng.integers(0, table.counts[conditions])
+    draws = rng.permuted(draws, axis=1)
+
+    n_warmup = np.full(n_blocks, n_warmup_other)
+    n_warmup[0] = n_warmup_first
+    n_warmup = np.minimum(n_warmup, draws.shape[1])
+    variant, block, trial_in_block, warm_up = [], [], [], []
+    for k in range(n_blocks):
+        block_variants = np.concatenate([draws[2 * k, :n_warmup[k]], draws[2 * k + 1]])
+        variant.append(block_variants)
+        block.append(np.full(len(block_variants), k + 1))
+        trial_in_block.append(np.arange(1, len(block_variants) + 1))
+        warm_up.append((np.arange(len(block_variants)) < n_warmup[k]).astype(np.int8))
+    return TrialSchedule(
+        table,
+        np.concatenate(variant),
+        np.concatenate(block),
+        np.concatenate(trial_in_block),
+        np.concatenate(warm_up),
+    )
+
+
+def validate_schedule(schedule, n_per_block):
+    """
+    Check the balancing guarantees of a schedule
+
+    Args:
+        schedule: TrialSchedule - session to check
+        n_per_block: Integer - main trials per block
+
+    Returns:
+        List of strings - problems found (empty = valid)
+    """
+    table = schedule.table
+    problems = []
+    n_conditions = len(table.counts)
+    reps = n_per_block // n_conditions
+    main = schedule.warm_up == 0
+    conditions = table.condition[schedule.variant]
+
+    # Every main block holds each condition exactly reps times
+    n_blocks = int(schedule.block.max(initial=0))
+    counts = np.zeros((n_blocks, n_conditions), dtype=np.int64)
+    np.add.at(counts, (schedule.block[main] - 1, conditions[main]), 1)
+    for k, c in zip(*np.nonzero(counts != reps)):
+        problems.append(f"block {k + 1}: condition {table.labels[c]} appears {counts[k, c]} times, expected {reps}")
+
+    # Colors: a permutation of 1..4 (or one color at position 0 in the center layout)
+    colors = table.color_by_pos[schedule.variant]
+    rewards = table.reward_by_pos[schedule.variant]
+    if table.center:
+        bad_colors = (colors[:, 0] == 0) | (colors[:, 1:] != 0).any(axis=1)
+    else:
+        bad_colors = (np.sort(colors, axis=1) != np.arange(1, NUM_POSITIONS + 1)).any(axis=1)
+    for i in np.flatnonzero(bad_colors):
+        problems.append(f"trial {i + 1}: invalid colors {colors[i].tolist()}")
+
+    # Rewards: exactly the condition's values, each at a distinct position
+    expected = np.zeros((n_conditions, NUM_POSITIONS), dtype=np.int8)
+    for c, values in enumerate(table.values):
+        expected[c, :len(values)] = sorted(values, reverse=True)
+    bad_rewards = (-np.sort(-rewards, axis=1) != expected[conditions]).any(axis=1)
+    for i in np.flatnonzero(bad_rewards):
+        problems.append(f"trial {i + 1}: rewards {rewards[i].tolist()} do not match condition {table.labels[conditions[i]]}")
+
+    # trial_in_block runs 1..n within every block
+    starts = np.flatnonzero(np.diff(schedule.block, prepend=0) != 0)
+    expected_index = np.arange(len(schedule)) - np.repeat(starts, np.diff(np.append(starts, len(schedule)))) + 1
+    for i in np.flatnonzero(schedule.trial_in_block != expected_index):
+        problems.append(f"trial {i + 1}: trial_in_block {schedule.trial_in_block[i]}, expected {expected_index[i]}")
+    return problems
+
+
+def audit_design(table, n_sessions, n_blocks, n_per_block, n_warmup_first, n_warmup_other, seed=None):
+    """
+    Generate and validate many sessions, and tally what participants would see
+
+    Args:
+        table: ConditionTable - variants to draw from
+        n_sessions: Integer - sessions to simulate
+        n_blocks, n_per_block, n_warmup_first, n_warmup_other: Integers - as for generate_schedule()
+        seed: Integer or None - seed of the whole audit (sessions use independent child streams)
+
+    Returns:
+        Dictionary - "invalid_sessions" (list of (session index, problems)),
+        "color_by_position" and "reward_by_position" ((NUM_POSITIONS, NUM_POSITIONS + 1) counts of
+        value 0..NUM_POSITIONS per position over all main trials)
+    """
+    invalid = []
+    color_counts = np.zeros((NUM_POSITIONS, NUM_POSITIONS + 1), dtype=np.int64)
+    reward_counts = np.zeros((NUM_POSITIONS, NUM_POSITIONS + 1), dtype=np.int64)
+    positions = np.arange(NUM_POSITIONS)
+    for s, rng in enumerate(np.random.default_rng(seed).spawn(n_sessions)):
+        schedule = generate_schedule(table, n_blocks, n_per_block, n_warmup_first, n_warmup_other, rng)
+        problems = validate_schedule(schedule, n_per_block)
+        if problems:
+            invalid.append((s, problems))
+        main_variants = schedule.variant[schedule.warm_up == 0]
+        np.add.at(color_counts, (positions, table.color_by_pos[main_variants]), 1)
+        np.add.at(reward_counts, (positions, table.reward_by_pos[main_variants]), 1)
+    return {
+        "invalid_sessions": invalid,
+        "color_by_position": color_counts,
+        "reward_by_position": reward_counts,
+    }
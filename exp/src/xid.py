@@ -0,0 +1,117 @@
+"""
+Incremental decoder for Cedrus XID key packets
+"""
+import struct
+from collections import namedtuple
+
+# One key packet: button number (1-8), True if pressed (False = released), XID port (0-15),
+# device reaction time since the last timer reset (ms), host time the bytes arrived (seconds)
+XidEvent = namedtuple("XidEvent", ["button", "pressed", "port", "device_rt_ms", "host_time"])
+# Answer to the protocol query b"_c1" (e.g. b"_xid0"), host time the bytes arrived (seconds)
+XidReply = namedtuple("XidReply", ["text", "host_time"])
+
+PACKET_START = ord("k")  # Integer: first byte of every key packet
+PACKET_SIZE = 6  # Integer: b"k", info byte, 4-byte little-endian RT
+_PACKET = struct.Struct("<xBI")  # Struct: skip "k", info byte, RT (ms)
+REPLY_START = ord("_")  # Integer: first byte of a command reply
+REPLY_PREFIX = b"_xid"  # Bytes: reply to b"_c1", followed by one protocol digit
+REPLY_SIZE = 5  # Integer: b"_xid" + digit
+
+
+class XidDecoder:
+    """
+    Parse XID key packets in place from a growing byte stream
+
+    Received bytes are appended to one bytearray and parsed with struct.unpack_from
+    at a read offset, so a burst of packets costs one append and one compaction
+    instead of a new bytes object per packet. Bytes that cannot start a packet are
+    skipped until the next b"k".
+
+    A b"k" that is really an RT byte of a packet whose start was lost reads the next
+    packet's first bytes as its RT, which then lands far beyond any real reaction
+    time. Such a packet (RT above max_rt_ms, or port bits that are not the box's port)
+    is taken as a false start: one byte is skipped and the search goes on. The check
+    uses only the packet's own bytes, so the result does not depend on how the
+    stream was split into reads.
+
+    Replies to the protocol query b"_c1" (b"_xid" + digit) are returned as XidReply,
+    so the query can serve as a round-trip ping while keys are being reported.
+    """
+
+    def __init__(self, port=0, max_rt_ms=0xFFFFFF, compact_threshold=4096):
+        """
+        Args:
+            port: Integer or None - XID port of the key packets (0-15); None accepts any port
+            max_rt_ms: Integer - largest plausible RT (default: top RT byte zero, about 4.6 hours)
+            compact_threshold: Integer - consumed bytes kept before the buffer is compacted
+        """
+        self.port = port
+        self.max_rt_ms = max_rt_ms
+        self._buffer = bytearray()  # Bytearray: received bytes, parsed from self._pos onwards
+        self._pos = 0  # Integer: offset of the first unparsed byte
+        self.compact_threshold = compact_threshold
+        self.skipped_bytes = 0  # Integer: bytes discarded while resynchronizing
+
+    def __len__(self):
+        return len(self._buffer) - self._pos  # Integer: bytes waiting for the rest of a packet
+
+    def reset(self):
+        """Forget any partial packet"""
+        self._buffer.clear()
+        self._pos = 0
+
+    def feed(self, data, host_time):
+        """
+        Add received bytes and decode every complete packet
+
+        Args:
+            data: Bytes - raw bytes read from the port
+            host_time: Float - host time when the bytes arrived (seconds)
+
+        Returns:
+            List of XidEvent and XidReply - packets and query replies completed by this data, in order
+        """
+        self._buffer += data
+        return list(self._decode(host_time))
+
+    def _decode(self, host_time):
+        buffer = self._buffer
+        end = len(buffer)
+        pos = self._pos
+        while pos < end:
+            if buffer[pos] == REPLY_START:
+                available = bytes(buffer[pos:min(end, pos + len(REPLY_PREFIX))])
+                if available == REPLY_PREFIX[:len(available)]:
+                    if end - pos < REPLY_SIZE:  # Wait: rest of the reply not received yet
+                        break
+                    yield XidReply(bytes(buffer[pos:pos + REPLY_SIZE]).decode("ascii", errors="replace"), host_time)
+                    pos += REPLY_SIZE
+                    continue
+                self.skipped_bytes += 1
+                pos += 1
+                continue
+            if buffer[pos] != PACKET_START:  # Resync: jump to the next packet or reply start
+                starts = [i for i in (buffer.find(b"k", pos), buffer.find(b"_", pos)) if i >= 0]
+                start = min(starts) if starts else end
+                self.skipped_bytes += start - pos
+                pos = start
+                continue
+            if end - pos < PACKET_SIZE:  # Wait: rest of the packet not received yet
+                break
+            info, rt_ms = _PACKET.unpack_from(buffer, pos)
+            if rt_ms > self.max_rt_ms or (self.port is not None and info & 0x0F != self.port):
+                self.skipped_bytes += 1  # False start: this b"k" is inside a packet whose first bytes were lost
+                pos += 1
+                continue
+            pos += PACKET_SIZE
+            yield XidEvent(
+                button=(info & 0xE0) >> 5 or 8,  # Integer: bits 5-7, 0 means button 8
+                pressed=bool(info & 0x10),  # Boolean: bit 4
+                port=info & 0x0F,  # Integer: bits 0-3
+                device_rt_ms=rt_ms,
+                host_time=host_time,
+            )
+        self._pos = pos
+        if pos >= self.compact_threshold or pos == end:  # Compact: drop consumed bytes in one move
+            del buffer[:pos]
+            self._pos = 0
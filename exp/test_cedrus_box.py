@@ -1,11 +1,17 @@
-import struct
+import os
+import sys
 import time
 
 import serial
 from serial.tools import list_ports
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from xid import XidDecoder, XidReply
+
 
 def find_cedrus_port():
+    if os.environ.get("RESPONSE_BOX_PORT"):  # e.g. the pty of emulate_response_box.py
+        return os.environ["RESPONSE_BOX_PORT"]
     for port in list_ports.comports():
         if port.vid == 0x0403 and port.pid == 0x6001:
             return port.device
@@ -32,29 +38,20 @@ with serial.Serial(port_name, baudrate=115200, timeout=0.01) as box:
 
     box.write(b"e1")
     box.reset_input_buffer()
-    buffer = b""
+    decoder = XidDecoder()
 
     print(f"Cedrus box on {port_name}. Press buttons; Ctrl+C to quit.")
 
     try:
         while True:
-            buffer += box.read(box.in_waiting or 1)
-
-            while b"k" in buffer:
-                start = buffer.find(b"k")
-                buffer = buffer[start:]
-
-                if len(buffer) < 6:
-                    break
+            data = box.read(box.in_waiting or 1)
 
-                packet = buffer[:6]
-                buffer = buffer[6:]
+            for key in decoder.feed(data, time.perf_counter()):
+                if isinstance(key, XidReply):
+                    continue  # Late answer to a handshake query
 
-                info = packet[1]
-                button = (info & 0xE0) >> 5 or 8
-                direction = "down" if info & 0x10 else "up"
-                rt_ms = struct.unpack("<I", packet[2:6])[0]
-                print(f"button {button} {direction}, rt={rt_ms} ms")
+                direction = "down" if key.pressed else "up"
+                print(f"button {key.button} {direction}, rt={key.device_rt_ms} ms")
 
             time.sleep(0.001)
     except KeyboardInterrupt:
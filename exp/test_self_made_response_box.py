@@ -1,10 +1,17 @@
+import os
+import sys
 import time
 
 import serial
 from serial.tools import list_ports
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from response_device import ResponseEvent, SelfMadeLineParser
+
 
 def find_port():
+    if os.environ.get("RESPONSE_BOX_PORT"):  # e.g. the pty of emulate_response_box.py
+        return os.environ["RESPONSE_BOX_PORT"]
     for port in list_ports.comports():
         if port.device.startswith(("/dev/ttyACM", "/dev/ttyUSB")):
             return port.device
@@ -13,20 +20,25 @@ def find_port():
 
 port_name = find_port()
 
-with serial.Serial(port_name, 115200, timeout=0.1) as box:
+with serial.Serial(port_name, 115200, timeout=0.01) as box:
     time.sleep(2)
     box.reset_input_buffer()
-    box.write(b"S")
+    parser = SelfMadeLineParser()
+    box.write(parser.SYNC_COMMAND)
     box.flush()
 
     print(f"Sent S to {port_name}. Press a button; Ctrl+C to quit.")
 
     try:
         while True:
-            line = box.readline().decode("ascii", errors="replace").strip()
-            if line:
-                print(line)
-                box.write(b"S")
-                box.flush()
+            data = box.read(box.in_waiting or 1)
+
+            for response in parser.feed(data, time.perf_counter()):
+                if isinstance(response, ResponseEvent):
+                    print(f"pin {response.button}, latency={response.device_rt_ms:.3f} ms")
+                    box.write(parser.SYNC_COMMAND)
+                    box.flush()
+
+            time.sleep(0.001)
     except KeyboardInterrupt:
-        print("\nDone.")
+        print(f"\nDone. Link: {parser.link_stats()}")
@@ -11,15 +11,14 @@ Display flow (win.flip locations):
   FLIP 4: End message → wait for any key
 """
 import math
-import random
+import os
+import sys
 import time
-import json
-import csv
-from itertools import combinations, permutations
 from pathlib import Path
 from datetime import datetime
 
 from psychopy import gui, logging, visual, core, event, monitors
+from psychopy.tools.monitorunittools import deg2pix
 
 try:
     import serial
@@ -28,12 +27,56 @@ except ImportError:
     serial = None
     list_ports = None
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from ccrp_design import (
+    CEDRUS_BUTTON_TO_COLOR_ID,
+    CODE_VERSION,
+    COLOR_KEYS,
+    COLOR_KEY_MAPPING,
+    EXPERIMENT_NAME,
+    EXPERIMENT_NUMBER,
+    FEEDBACK_WAIT_TIME,
+    FIRST_WARMUP_TRIALS,
+    MAX_WAIT_TIME,
+    NUM_POSITIONS,
+    OTHER_WARMUP_TRIALS,
+    POSITIONS_DEG,
+    RESPONSE_DEADLINE,
+    RESPONSE_DEVICE_CEDRUS,
+    RESPONSE_DEVICE_KEYBOARD,
+    RESPONSE_DEVICE_SELF_MADE,
+    REWARD_MONEY_FACTOR,
+    REWARD_VALUES,
+    SELF_MADE_PIN_TO_COLOR_ID,
+    TRIAL_START_JITTER_MAX,
+    TRIAL_START_JITTER_MEAN,
+    TRIAL_START_JITTER_OFFSET,
+    session_design,
+    trials_in_block,
+)
+from ccrp_rows import (
+    build_trial_row,
+    column_metadata,
+    design_metadata,
+    finish_trial_row,
+    run_columns,
+    timing_compromised as _timing_compromised,
+    trial_tables,
+)
+from clock_sync import ClockSync, RoundTripProbe
+from cue_sprites import CueSprites, disc_stim
+from feedback_text import GlyphAtlas, TextCache, TextLine
+from frame_scheduler import FrameScheduler, TimingSummary
+from response_device import CedrusPacketParser, SelfMadeLineParser, SerialResponseReader
+from response_mux import KeyboardSource, ResponseMux, SerialBoxSource
+from session_store import SessionColumnStore
+from session_plan import derive_seed, load_or_compile_plan
+from trial_pipeline import IdleWork
+from trial_log import TrialLogWriter, read_logged_rows, recover_trial_journal
+
 logging.console.setLevel(logging.DEBUG)
 # Centralized debug switches. Add new toggles here as needed.
 # Default monitor shown in the initial session dialog.
-RESPONSE_DEVICE_KEYBOARD = "keyboard"
-RESPONSE_DEVICE_CEDRUS = "response_box_cedrus"
-RESPONSE_DEVICE_SELF_MADE = "self-made-response-box"
 
 ############################# TO MODIFY BELOW
 DEBUG_CONFIG = {
@@ -49,58 +92,16 @@ DEFAULT_PARTICIPANT = "tests0"
 DEFAULT_MONITOR_NAME = "room1_a1"
 DEFAULT_RESPONSE_DEVICE = RESPONSE_DEVICE_SELF_MADE
 ############################# TO MODIFY ABOVE
-CODE_VERSION = "v2-2026-05-07"
+# Session design (conditions, blocks, timing, response mappings) and the trial row format live in
+# src/ccrp_design.py and src/ccrp_rows.py, shared with the headless session simulator (simulate_session.py).
 
 DEFAULT_COLOR_MAP_LAYOUT = "horizontal" if DEFAULT_RESPONSE_DEVICE == RESPONSE_DEVICE_CEDRUS else "keyboard"
 CEDRUS_VID = 0x0403
 CEDRUS_PID = 0x6001
 CEDRUS_BAUDRATE = 115200
-CEDRUS_BUTTON_TO_COLOR_ID = {"2": 1, "3": 2, "4": 3, "5": 4}
-SELF_MADE_PIN_TO_COLOR_ID = {"6": 1, "7": 2, "8": 4, "9": 3}
-# Constants 
-EXPERIMENT_NAME = "CCP"
-EXPERIMENT_NUMBER = 1001
-COLOR_KEY_MAPPING = "rgby"
+RESPONSE_BOX_PORT_ENV = "RESPONSE_BOX_PORT"  # Overrides port discovery, e.g. the pty of emulate_response_box.py
 MAX_SESSION = 999  # Soft cap for dialog input; session 6+ uses final experimental config.
-# Explicit cue-condition labels used in output. The trial generator chooses from
-# these configured conditions and writes the configured label directly.
-REWARD_CONDITIONS = [
-    {"values": (1,), "label": "(1)"},
-    {"values": (2,), "label": "(2)"},
-    {"values": (3,), "label": "(3)"},
-    {"values": (4,), "label": "(4)"},
-    {"values": (2, 1), "label": "(2,1)"},
-    {"values": (3, 1), "label": "(3,1)"},
-    {"values": (4, 1), "label": "(4,1)"},
-    {"values": (3, 2), "label": "(3,2)"},
-    {"values": (4, 2), "label": "(4,2)"},
-    {"values": (4, 3), "label": "(4,3)"},
-]
-SINGLE_REWARD_CONDITIONS = REWARD_CONDITIONS[:4]
-ALL_REWARD_CONDITIONS = REWARD_CONDITIONS
-
-# Per-session config (index = session - 1). Session 6+ uses config index 5.
-# reward_conditions: which reward values (1–4) appear in trials and the CueCondition label to write.
-# Color is always independent from reward value (each position gets a random color assignment).
-SESSION_CONFIG = [
-    {"reward_conditions": SINGLE_REWARD_CONDITIONS, "n_blocks": 10, "n_per_block": 20, "center": True, "color_map": True},
-    {"reward_conditions": SINGLE_REWARD_CONDITIONS, "n_blocks": 10, "n_per_block": 20, "center": False, "color_map": True},
-    {"reward_conditions": ALL_REWARD_CONDITIONS, "n_blocks": 4, "n_per_block": 50, "center": False, "color_map": True},
-    {"reward_conditions": ALL_REWARD_CONDITIONS, "n_blocks": 4, "n_per_block": 30, "center": False, "color_map": False},
-    {"reward_conditions": ALL_REWARD_CONDITIONS, "n_blocks": 4, "n_per_block": 50, "center": False, "color_map": False},
-    {"reward_conditions": ALL_REWARD_CONDITIONS, "n_blocks": 8, "n_per_block": 50, "center": False, "color_map": False},
-]
-MAX_WAIT_TIME = 4.0
-# Trial start jitter (match paradigm: TrialStartJitterOffsetTime, MeanTime, MaxTime)
-TRIAL_START_JITTER_OFFSET = 1.0
-TRIAL_START_JITTER_MEAN = 0.5
-TRIAL_START_JITTER_MAX = 5.0
-# Warm-up trials per block (match paradigm: FirstWarmUpTrials, OtherWarmUpTrials)
-FIRST_WARMUP_TRIALS = 4
-OTHER_WARMUP_TRIALS = 2
-FEEDBACK_WAIT_TIME = 1.5
-REWARD_MONEY_FACTOR = 0.05
-RESPONSE_DEADLINE = 2.0  # seconds, match paradigm ResponseDeadline
+TRIAL_LOG_SYNC_INTERVAL = 30.0  # seconds between background fsyncs of the trial CSV (also synced at every block break)
 
 # Stimulus colors RGB (-1 to 1): Red, Green, Blue, Yellow
 STIMULUS_TARGET_COLORS_RGB = [(1, -1, -1), (-1, 1, -1), (-1, -1, 1), (1, 1, -1)]
@@ -108,32 +109,12 @@ CUE_TEXT_COLOR = (-1, -1, -1)
 CUE_BG_COLOR = (1, 1, 1)
 BG_COLOR = (0, 0, 0)
 
-# Cue positions (x, y) in deg: 4 locations at 2 deg, rotation 45° (TargetDistance=2, TargetLocRotation=pi/4)
-TARGET_DISTANCE_DEG = 2.0
-TARGET_LOC_ROTATION_RAD = math.pi / 4
-POSITIONS_DEG = [
-    (
-        TARGET_DISTANCE_DEG * math.cos(i * 2 * math.pi / 4 + TARGET_LOC_ROTATION_RAD),
-        TARGET_DISTANCE_DEG * math.sin(i * 2 * math.pi / 4 + TARGET_LOC_ROTATION_RAD)
-    )
-    for i in range(4)
-]
-
-# Index	    Angle	cos	sin	(x, y)	Screen location
-# 0	45°	    +0.707	+0.707	(1.414, 1.414)	top-right
-# 1	135°	-0.707	+0.707	(-1.414, 1.414)	top-left
-# 2	225°	-0.707	-0.707	(-1.414, -1.414)	bottom-left
-# 3	315°	+0.707	-0.707	(1.414, -1.414)	bottom-right
-
 # Stimulus sizes (deg): ColorTargetSize=0.8 radius, CueBoxSize/2=0.35, CueTextSize=0.56 (StimFactor=0.04, CueScaleFactor=0.7)
 CUE_OUTER_RADIUS_DEG = 0.8   # ColorTargetSize
 CUE_INNER_RADIUS_DEG = 0.35  # CueBoxSize/2
 CUE_TEXT_HEIGHT_DEG = 0.56   # CueTextSize
 STIMULUS_OPACITY = 1.0       # Paradigm StimulusOpacity
 
-# Cue number text (match paradigm TextStim: ori=0, no font/bold, antialias, center anchor)
-CUE_TEXT_ORI = 0
-CUE_TEXT_ANTIALIAS = True
 FIXATION_SIZE_DEG = 0.16     # FixationSize = 4*StimFactor
 FIXATION_POINT_COLOR = (-1, -1, -1)  # Black for CCRP (ExperimentType 3)
 
@@ -164,22 +145,14 @@ MONITOR_WIDTH_CM = 52
 MONITOR_DISTANCE_CM = 60
 USE_UNITS = "deg"
 USE_COLOR_SPACE = "rgb" #same as the defult value
-MULTI_SAMPLE = True   # same as defult value, Anti-aliasing for smooth edges (paradigm has smooth circles)
+MULTI_SAMPLE = False  # Circles are pre-rasterized anti-aliased sprites (cue_sprites.py), so no MSAA is needed
 NUM_SAMPLES = 4      # Samples per pixel when multiSample enabled
-CIRCLE_EDGES = 200   # Paradigm uses edges=200 for smooth circles (default ~32 is jagged)
 
 # Startup display validation (logged in .dat header; mismatch → warning screen: C = continue, ESC = exit)
 EXPECTED_REFRESH_HZ = 100
 REFRESH_RATE_TOLERANCE_HZ = 10
-
-# Possible reward values (points 1–4). 
-REWARD_VALUES = [1, 2, 3, 4]
-
-# Color-to-key mapping: Red→D, Green→C, Blue→K, Yellow→M
-# Position i has fixed color: 0=Red, 1=Green, 2=Blue, 3=Yellow (from STIMULUS_TARGET_COLORS_RGB)
-COLOR_KEYS = ['d', 'c', 'k', 'm']  # key for position/color 0,1,2,3
-
-NUM_POSITIONS = 4
+# Share of each feedback frame that may be spent preparing the next trial and building this trial's row
+FEEDBACK_IDLE_BUDGET_FRAMES = 0.5
 
 
 # Session dialog: run one session per launch (6+ uses experimental config: 8 blocks × 50 trials)
@@ -207,6 +180,11 @@ session_dlg.addField(
     initial=MONITOR_NAME,
     choices=MONITOR_CHOICES,
 )
+session_dlg.addField(
+    "Start at trial",
+    initial=1,
+    tip="1 = new session; N > 1 resumes an interrupted session at trial N (same seeded trial order)",
+)
 session_dlg.show()
 if not session_dlg.OK:
     raise SystemExit("Session dialog cancelled")
@@ -222,12 +200,57 @@ EYE_VISION = str(session_dlg.data[6]).strip() or "NA"
 RESPONSE_DEVICE = session_dlg.data[7]
 COLOR_MAP_LAYOUT = session_dlg.data[8]  # "horizontal" or "keyboard"
 MONITOR_NAME = str(session_dlg.data[9]).strip() or MONITOR_NAME
+START_TRIAL = int(session_dlg.data[10])  # 1-based trial to start at (> 1 = resume)
+if START_TRIAL < 1:
+    raise SystemExit("Start at trial must be 1 or higher.")
+SESSION_SEED = derive_seed(PARTICIPANT, SESSION)  # seeds trial order and jitter; same participant/session -> same plan
+RUN_COLUMNS = run_columns(  # leading columns of every trial row
+    color_map_layout=COLOR_MAP_LAYOUT,
+    response_device=RESPONSE_DEVICE,
+    participant=PARTICIPANT,
+    handedness=HANDEDNESS,
+    color_vision=COLOR_VISION,
+    eye_vision=EYE_VISION,
+)
 
 _out_dir = (Path(__file__).resolve().parent / "data_written").resolve()
 _base_stem = f"CCRP_subj{PARTICIPANT}_ses{SESSION}"
 _out_trials_path = (_out_dir / f"{_base_stem}_trials.csv").resolve()
 _out_metadata_path = (_out_dir / f"{_base_stem}_metadata.json").resolve()
-if _out_trials_path.exists() or _out_metadata_path.exists():
+_out_columns_path = (_out_dir / f"{_base_stem}_trials.npz").resolve()  # typed columnar copy of the CSV
+_out_plan_path = (_out_dir / "plans" / f"{_base_stem}_plan.npz").resolve()  # cached seeded trial schedule
+# A journal left next to the CSV means the last run crashed: rebuild its CSV first.
+_recovered_rows = recover_trial_journal(_out_trials_path, SessionColumnStore(_out_columns_path))
+if _recovered_rows:
+    print(f"Recovered {_recovered_rows} trial rows from the journal of an interrupted run into {_out_trials_path}")
+if START_TRIAL > 1:
+    # Resume: keep the rows logged before START_TRIAL, continue the cumulative reward from the last one.
+    _, _logged_rows = read_logged_rows(_out_trials_path)
+    if not _logged_rows:
+        raise SystemExit(f"Cannot resume at trial {START_TRIAL}: no trial data found in {_out_trials_path}.")
+    _logged_trials = [int(row["Trial"]) for row in _logged_rows]
+    if START_TRIAL > _logged_trials[-1] + 1:
+        raise SystemExit(
+            f"Cannot resume at trial {START_TRIAL}: {_out_trials_path} ends at trial {_logged_trials[-1]}; "
+            f"start at trial {_logged_trials[-1] + 1} or earlier."
+        )
+    # Escape-skipped trials have no row, so the kept rows are those numbered below START_TRIAL, not the first START_TRIAL - 1.
+    RESUME_KEEP_ROWS = sum(1 for trial in _logged_trials if trial < START_TRIAL)
+    _kept_trials = _logged_trials[:RESUME_KEEP_ROWS]
+    if any(trial < START_TRIAL for trial in _logged_trials[RESUME_KEEP_ROWS:]) or any(
+        later <= earlier for earlier, later in zip(_kept_trials, _kept_trials[1:])
+    ):
+        raise SystemExit(
+            f"Cannot resume at trial {START_TRIAL}: the Trial numbers of {_out_trials_path} before trial {START_TRIAL} "
+            "are not strictly increasing."
+        )
+    _resume_rows = _logged_rows[:RESUME_KEEP_ROWS]
+    RESUME_CUM_REWARD = float(_resume_rows[-1]["CumReward"]) if _resume_rows else 0.0
+    print(f"Resuming at trial {START_TRIAL}: keeping {RESUME_KEEP_ROWS} logged rows of {_out_trials_path}")
+else:
+    RESUME_KEEP_ROWS = None
+    RESUME_CUM_REWARD = 0.0
+if START_TRIAL == 1 and (_out_trials_path.exists() or _out_metadata_path.exists()):
     _dup_msg = (
         f"Participant data already exists (participant {PARTICIPANT}, session {SESSION}).\n"
         "Delete existing data or try another participant number."
@@ -242,172 +265,6 @@ if _out_trials_path.exists() or _out_metadata_path.exists():
     raise SystemExit("Data file already exists. Exiting after showing popup message.")
 
 
-def _session_config_idx(session: int) -> int:
-    """Return config index for session (1-based). Session 6+ uses same config as session 6."""
-    return min(session - 1, 5)
-
-
-def _build_trial_row(
-    *,
-    position_to_color_id,
-    position_to_reward,
-    colors_shown,
-    selected_position,
-    selected_color,
-    pressed_key,
-    keys,
-    cue_time,
-    response_time,
-    rt_ms,
-    rt_computer_clock_ms,
-    end_trial_time,
-    actual_reward,
-    max_reward,
-    cum_reward,
-    session,
-    block,
-    trial_index,
-    trial_condition_label,
-    num_cues,
-    warm_up=0,
-    trial_start_jitter_time_ms=0,
-    trial_wall_clock_str="",
-    session_elapsed_sec=0.0,
-):
-    """Build a trial data row """
-    # Color layout: 4-digit strings (position 0..3). Rewards from position_to_reward.
-    colors = [position_to_color_id[i] or 0 for i in range(NUM_POSITIONS)]
-    reward_vals = [position_to_reward[i] or 0 for i in range(NUM_POSITIONS)]
-    sorted_reward_values = sorted((value for value in reward_vals if value), reverse=True)
-    reward_rank_by_value = {value: rank + 1 for rank, value in enumerate(sorted_reward_values)}
-    reward_ranks = [reward_rank_by_value.get(value, 4) if value else 4 for value in reward_vals]
-
-    # Response
-    sel = selected_position
-    has_response = sel is not None
-    sel_color = position_to_color_id[sel] if has_response else None
-
-    if rt_ms is None:
-        rt_ms = MAX_WAIT_TIME * 1000 if not keys else 0.0
-    if rt_computer_clock_ms is None:
-        rt_computer_clock_ms = rt_ms
-    rt_sec = rt_ms / 1000
-    rt_difference = rt_computer_clock_ms - rt_ms
-    late = rt_sec > RESPONSE_DEADLINE
-    intr = 1 if (has_response and sel_color is None) else 0
-    # ACC: correct = selected the circle with highest reward (color-to-key rule)
-    acc = 1 if actual_reward == max_reward and max_reward > 0 else 0
-    chosen_location_idx = next(
-        (i for i in range(NUM_POSITIONS) if position_to_color_id.get(i) == selected_color),
-        None,
-    ) if selected_color is not None else None
-    resp_loc = (chosen_location_idx + 1) if chosen_location_idx is not None else 0
-    point_target = "".join("1" if i == chosen_location_idx else "0" for i in range(NUM_POSITIONS)) if chosen_location_idx is not None else "0000"
-    cue_response_exp_value = reward_vals[chosen_location_idx] if chosen_location_idx is not None else 0
-    cue_rank_response = reward_ranks[chosen_location_idx] if chosen_location_idx is not None else 0
-    exp_reward = max((value for value in reward_vals if value), default=0)
-
-    return {
-        "ExperimentName": EXPERIMENT_NAME,
-        "ExperimentNumber": EXPERIMENT_NUMBER,
-        "CodeVersion": CODE_VERSION,
-        "ColorMapLayout": COLOR_MAP_LAYOUT,
-        "ColorKeyMapping": COLOR_KEY_MAPPING,
-        "ResponseDevice": RESPONSE_DEVICE,
-        "Subject": PARTICIPANT,
-        "Handedness": HANDEDNESS,
-        "ColorVision": COLOR_VISION,
-        "EyeVision": EYE_VISION,
-        "Session": session + 1,
-        "Block": block,
-        "Trial": trial_index + 1,
-        "WarmUpTrial": warm_up,
-        "CueCondition": trial_condition_label,
-        "NumCues": num_cues,
-        "TrialStartJitterTime": round(trial_start_jitter_time_ms, 2),  # ms
-        "CueSOA": 0,
-        "Cues": "".join(str(c) for c in colors),
-        "CueValues": "".join(str(v) for v in reward_vals),
-        "CueRanks": "".join(str(r) for r in reward_ranks),
-        "Response": pressed_key or "timeout",
-
-        # RespLoc: location id of the participant's chosen cue.
-        "RespLoc": resp_loc,
-        # PointTargetResponse: 4-digit one-hot vector of chosen cue location.
-        "PointTargetResponse": point_target,
-
-        "RT": round(rt_ms, 2),  # ms
-        "RTComputerClock": round(rt_computer_clock_ms, 2),  # ms
-        "RTDifference": round(rt_difference, 2),  # RTComputerClock - RT
-        "LateResponse": late, # 1 - late response, 0 - on time response
-        "ACC": acc, # 1 - correct response, 0 - incorrect response
-        "INTR": intr, # 1 - intrusion error, 0 - no intrusion error, if respond to the non-cued position
-        "CueResponseValue": actual_reward, # the value of the cue at the selected position
-        "CueResponseExpValue": cue_response_exp_value, # expected reward value at chosen location
-        "CueRankResponse": cue_rank_response, # reward-value rank at chosen location
-        "ExpectedReward": exp_reward, # the highest available reward for the trial
-        "Reward": actual_reward, # the actual reward for the trial
-        "MaxReward": max_reward, # the maximum reward for the trial
-        "CumReward": cum_reward, # the cumulative reward for the session
-        "CueTime": round(cue_time * 1000, 2),  # ms
-        "PointTargetTime": round((cue_time + rt_sec) * 1000, 2) if rt_sec else round(cue_time * 1000, 2),  # ms
-        "ColorTargetTime": round(cue_time * 1000, 2),  # ms
-        "EndTrialTime": round(end_trial_time * 1000, 2),  # ms
-        "TrialWallClockTime": trial_wall_clock_str,
-        "SessionElapsedSec": round(session_elapsed_sec, 3),
-        "Note": "",
-    }
-
-
-# Descriptions for each trial-data column (keys must match _build_trial_row).
-DAT_COLUMN_DESCRIPTIONS = {
-    "ExperimentName": "Short experiment label constant.",
-    "ExperimentNumber": "Numeric experiment ID constant.",
-    "CodeVersion": "Experiment code version configured at the top of the script.",
-    "ColorMapLayout": "Color-key legend layout: horizontal row or keyboard-matched 2x2.",
-    "ColorKeyMapping": "Four-character response-color mapping string. Current fixed value rgby means red, green, blue, yellow.",
-    "ResponseDevice": "Response input device used for this run: keyboard, response_box_cedrus, or self-made-response-box.",
-    "Subject": "Participant ID from the session dialog.",
-    "Handedness": "Participant handedness from the session dialog.",
-    "ColorVision": "Participant color vision status from the session dialog.",
-    "EyeVision": "Participant eye vision status from the session dialog.",
-    "Session": "Session index written as 0-based internal index plus 1 (matches dialog session number).",
-    "Block": "Block number (1-based) within the session.",
-    "Trial": "Trial index within the session (1-based, increments across warmup and main).",
-    "WarmUpTrial": "1 if warmup trial, 0 if main trial.",
-    "CueCondition": "Label for reward-value combination among non-zero CueValues in this trial. Allowed conditions: (1), (2), (3), (4), (2,1), (3,1), (4,1), (3,2), (4,2), (4,3). Order is descending reward value and ignores location order.",
-    "NumCues": "Count of cued stimulus locations this trial.",
-    "TrialStartJitterTime": "Duration of fixation before stimulus onset (ms); actual drawn jitter or DEBUG substitute.",
-    "CueSOA": "Cue–target stimulus onset asynchrony (ms); 0 here (no separate cue–mask SOA in this script).",
-    "Cues": "Four digits: color ID 1–4 at each spatial slot 0–3; 0 = no stimulus at that slot.",
-    "CueValues": "Four digits: reward digit at each slot; 0 = no reward at that slot.",
-    "CueRanks": "Four digits: reward-value rank at each location; 1 = highest reward, 2 = second-highest reward when two cues are present, 4 = no reward at that location.",
-    "Response": "Key pressed (lowercase) or timeout; escape not logged as a trial row.",
-    "RespLoc": "Location id (1-4) of where the participant's chosen cue is on screen; 0 if no valid chosen location.",
-    "PointTargetResponse": "Four-digit one-hot vector from location 1 to 4: 1 marks where the participant's chosen cue is, 0 marks all other locations; 0000 if no valid chosen location.",
-    "RT": "Reaction time (ms). For response_box_cedrus and self-made-response-box, this uses the device timer; for keyboard, this matches RTComputerClock.",
-    "RTComputerClock": "Reaction time (ms) using the PsychoPy computer clock.",
-    "RTDifference": "RTComputerClock minus RT (ms). For keyboard this is 0; for serial response boxes this shows computer-clock minus device-clock RT.",
-    "LateResponse": "True if RT (seconds) exceeded RESPONSE_DEADLINE; False otherwise.",
-    "ACC": "1 if obtained reward equals max possible reward on that trial and max > 0; else 0.",
-    "INTR": "1 if participant responded with a key whose mapped color was absent on screen; else 0.",
-    "CueResponseValue": "Reward points obtained from the chosen color’s on-screen location (0 if wrong/absent).",
-    "CueResponseExpValue": "Expected reward value at location chosen.",
-    "CueRankResponse": "Rank of value at location chosen; 1 = highest reward, 2 = second-highest reward when two cues are present, 4 = chosen location has no reward, 0 = no valid chosen location.",
-    "ExpectedReward": "Highest possible reward in this trial, computed as max non-zero digit in CueValues (0 if no non-zero CueValues).",
-    "Reward": "Same as obtained points for this trial (CueResponseValue).",
-    "MaxReward": "Maximum reward digit among cued locations this trial.",
-    "CumReward": "Cumulative monetary-style score (points × REWARD_MONEY_FACTOR), running total.",
-    "CueTime": "Stimulus onset time from trial clock (ms).",
-    "PointTargetTime": "Time of keypress from trial clock (ms), or cue time if no RT.",
-    "ColorTargetTime": "Same as cue onset time here (ms); reserved for paradigms with separate color-target onset.",
-    "EndTrialTime": "Trial clock time (ms) at end of feedback phase.",
-    "TrialWallClockTime": "Local wall-clock date and time when this trial row was logged (YYYY-MM-DD HH:MM:SS.mmm).",
-    "SessionElapsedSec": "Seconds since session timing start (monotonic clock), from immediately before the first trial loop iteration after instructions.",
-    "Note": "Free-text notes (e.g. escape path); usually empty.",
-}
-
-
 def _build_metadata(
     *,
     exp_start_time_str: str,
@@ -426,52 +283,31 @@ def _build_metadata(
         psychopy_version = "unknown"
 
     program_name = Path(__file__).name
-    reward_conditions = cfg.get("reward_conditions", [])
-    reward_labels = [cond["label"] for cond in reward_conditions]
-    n_reward_conds = len(reward_conditions)
-    reps_per_condition = (n_trials_per_block // n_reward_conds) if n_reward_conds else 0
-    color_names = ["Red", "Green", "Blue", "Yellow"]
-    location_names = ["upper right", "upper left", "lower left", "lower right"]
     debug_on = bool(DEBUG_CONFIG.get("enabled"))
     jitter_note = (
         f"DEBUG: fixation/jitter replaced by {DEBUG_CONFIG.get('trial_duration', 0) * 1000:.4f} ms when enabled."
         if debug_on
-        else "Jitter sampled as min(offset + Exp(mean), max) per trial."
+        else "Jitter sampled as min(offset + Exp(mean), max) per trial, drawn once in the seeded session plan."
     )
 
     return {
-        "trial_timing_and_design": {
-            "cue_soa_ms": 0,
-            "trial_start_jitter_offset_s": TRIAL_START_JITTER_OFFSET,
-            "trial_start_jitter_exponential_mean_s": TRIAL_START_JITTER_MEAN,
-            "trial_start_jitter_max_cap_s": TRIAL_START_JITTER_MAX,
-            "trial_start_jitter_note": jitter_note,
-            "response_key_wait_max_s": MAX_WAIT_TIME,
-            "late_response_threshold_s": RESPONSE_DEADLINE,
-            "feedback_duration_s": FEEDBACK_WAIT_TIME,
-            "warmup_trials_first_block": FIRST_WARMUP_TRIALS,
-            "warmup_trials_other_blocks": OTHER_WARMUP_TRIALS,
-            "blocks": n_blocks,
-            "main_trials_per_block": n_trials_per_block,
-            "total_warmup_trials": total_warmup,
-            "total_trials_warmup_plus_main": n_trials_total,
-            "single_stimulus_at_center": bool(cfg.get("center", False)),
-            "color_key_legend_on_screen_sessions_1_to_3": SESSION in (1, 2, 3),
-            "cue_condition_labels": reward_labels,
-            "number_of_reward_conditions": n_reward_conds,
-            "main_trials_per_reward_condition_per_block_balanced": reps_per_condition,
-            "color_id_mapping_for_cues": {str(i + 1): color_names[i] for i in range(NUM_POSITIONS)},
-            "color_to_key_mapping": {color_names[i]: COLOR_KEYS[i].upper() for i in range(NUM_POSITIONS)},
-            "location_id_mapping": {
-                str(i + 1): {
-                    "screen_location": location_names[i],
-                    "position_deg_x_y": [round(POSITIONS_DEG[i][0], 3), round(POSITIONS_DEG[i][1], 3)],
-                }
-                for i in range(NUM_POSITIONS)
+        "trial_timing_and_design": design_metadata(
+            session=SESSION,
+            cfg=cfg,
+            n_blocks=n_blocks,
+            n_trials_total=n_trials_total,
+            n_trials_per_block=n_trials_per_block,
+            total_warmup=total_warmup,
+            refresh_hz=SCHEDULER_REFRESH_HZ,
+            jitter_note=jitter_note,
+            session_plan={
+                "seed": SESSION_SEED,
+                "plan_hash_sha256": session_plan.plan_hash,
+                "plan_file": _out_plan_path.name,
+                "start_trial": START_TRIAL,
+                "rows_kept_from_interrupted_run": RESUME_KEEP_ROWS,
             },
-            "location_id_mapping_note": "Location ids are 1-based positions in Cues, CueValues, CueRanks, RespLoc, and PointTargetResponse.",
-            "per_trial_logging_note": "TrialWallClockTime is local wall time; SessionElapsedSec is monotonic elapsed seconds since pre-loop session start.",
-        },
+        ),
         "run_and_display_metadata": {
             "psychopy_version": psychopy_version,
             "experimental_program": program_name,
@@ -521,9 +357,21 @@ def _build_metadata(
             "cue_text_color": CUE_TEXT_COLOR,
             "stimulus_opacity": STIMULUS_OPACITY,
             "stimulus_target_rgb_color_values": STIMULUS_TARGET_COLORS_RGB,
+            "multi_sample": "Y" if MULTI_SAMPLE else "N",
+            "cue_rendering": "pre-rasterized sprites (cue_sprites.py): supersampled, box-filtered, drawn 1:1 in pixels; one placed ImageStim per (position, color, reward)",
+            "cue_sprite_pool_size": len(cue_sprites),
+            "cue_sprite_size_px": cue_sprites.size_px,
+        },
+        "session_timing_summary": timing_summary.to_dict(),
+        # Next-trial preparation and row building run between feedback flips (trial_pipeline.IdleWork);
+        # tasks_run_after_phase > 0 means some of it spilled past the feedback phase
+        "feedback_idle_work": {
+            "frame_budget_ms": round(FEEDBACK_IDLE_BUDGET_FRAMES * scheduler.frame_s * 1000, 3),
+            **feedback_work.stats(),
         },
-        "column_order": dat_columns,
-        "column_definitions": {col: DAT_COLUMN_DESCRIPTIONS.get(col, "No description defined.") for col in dat_columns},
+        "clock_sync": clock_sync.to_dict() if clock_sync is not None else None,
+        "cedrus_round_trip": round_trip.to_dict() if round_trip is not None else None,
+        **column_metadata(dat_columns),
     }
 
 
@@ -567,6 +415,8 @@ def _run_startup_display_check(win) -> tuple[float, tuple[int, int], bool, bool]
 
 def _find_cedrus_port() -> str:
     """Find the Cedrus FTDI serial port; fall back to the usual Linux name."""
+    if os.environ.get(RESPONSE_BOX_PORT_ENV):
+        return os.environ[RESPONSE_BOX_PORT_ENV]
     if list_ports is not None:
         for port in list_ports.comports():
             if port.vid == CEDRUS_VID and port.pid == CEDRUS_PID:
@@ -575,6 +425,8 @@ def _find_cedrus_port() -> str:
 
 
 def _find_self_made_response_box_port() -> str:
+    if os.environ.get(RESPONSE_BOX_PORT_ENV):
+        return os.environ[RESPONSE_BOX_PORT_ENV]
     if list_ports is not None:
         for port in list_ports.comports():
             if port.vid == CEDRUS_VID and port.pid == CEDRUS_PID:
@@ -617,60 +469,6 @@ def _open_self_made_response_box():
     return box
 
 
-def _wait_for_cedrus_response(box, clock, max_wait):
-    buffer = b""
-    start = clock.getTime()
-
-    while clock.getTime() - start < max_wait:
-        escape_keys = event.getKeys(keyList=["escape"], timeStamped=clock)
-        if escape_keys:
-            return ("escape", escape_keys[0][1])
-
-        buffer += box.read(box.in_waiting or 1)
-
-        while b"k" in buffer:
-            packet_start = buffer.find(b"k")
-            buffer = buffer[packet_start:]
-            if len(buffer) < 6:
-                break
-
-            packet = buffer[:6]
-            buffer = buffer[6:]
-            info = packet[1]
-            button = str((info & 0xE0) >> 5 or 8)
-            button_down = bool(info & 0x10)
-            cedrus_rt_ms = int.from_bytes(packet[2:6], "little")
-
-            if button_down and button in CEDRUS_BUTTON_TO_COLOR_ID:
-                return (button, clock.getTime(), cedrus_rt_ms)
-
-    return None
-
-
-def _wait_for_self_made_response_box(box, clock, max_wait):
-    buffer = ""
-    start = clock.getTime()
-
-    while clock.getTime() - start < max_wait:
-        escape_keys = event.getKeys(keyList=["escape"], timeStamped=clock)
-        if escape_keys:
-            return ("escape", escape_keys[0][1])
-
-        buffer += box.read(box.in_waiting or 1).decode("ascii", errors="ignore")
-
-        while "\n" in buffer:
-            line, buffer = buffer.split("\n", 1)
-            parts = line.strip().split(",")
-            if len(parts) != 2:
-                continue
-
-            pin, latency_us = parts
-            if pin in SELF_MADE_PIN_TO_COLOR_ID:
-                return (pin, clock.getTime(), float(latency_us) / 1000)
-
-    return None
-
-
 # Create window matching paradigm display settings
 mon = monitors.Monitor(MONITOR_NAME)
 mon.setSizePix(WIN_SIZE_PIX)
@@ -692,6 +490,10 @@ win = visual.Window(
 MEASURED_REFRESH_RATE, ACTUAL_WIN_SIZE_PIX, DISPLAY_CHECK_SPEC_OK, DISPLAY_CHECK_MISMATCH_CONTINUED = (
     _run_startup_display_check(win)
 )
+# Fixation and feedback last a whole number of frames at the measured rate (expected rate if measuring failed)
+SCHEDULER_REFRESH_HZ = MEASURED_REFRESH_RATE if MEASURED_REFRESH_RATE > 0 else EXPECTED_REFRESH_HZ
+scheduler = FrameScheduler(win, SCHEDULER_REFRESH_HZ)
+timing_summary = TimingSummary(SCHEDULER_REFRESH_HZ)  # session-level frame timing, written to the metadata JSON
 
 # Define cue positions (4 locations, from POSITIONS_DEG)
 positions = POSITIONS_DEG
@@ -703,35 +505,24 @@ response_keys = COLOR_KEYS
 # Colors for each cue (from paradigm StimulusTargetColorsRGB)
 cue_colors = STIMULUS_TARGET_COLORS_RGB
 
-# cue_stimuli: list of (outer, inner, text) per color
-#   Index 0=Red, 1=Green, 2=Blue, 3=Yellow
-#   outer = colored circle, inner = white circle, text = reward digit (1–4)
-cue_stimuli = []
-for i, pos in enumerate(positions):
-    outer = visual.Circle(win, radius=CUE_OUTER_RADIUS_DEG, fillColor=cue_colors[i], lineColor=None, pos=pos, edges=CIRCLE_EDGES)
-    inner = visual.Circle(win, radius=CUE_INNER_RADIUS_DEG, fillColor=CUE_BG_COLOR, lineColor=None, pos=pos, edges=CIRCLE_EDGES)
-    text = visual.TextStim(
-        win,
-        text="",
-        ori=CUE_TEXT_ORI,
-        pos=pos,
-        height=CUE_TEXT_HEIGHT_DEG,
-        units=USE_UNITS,
-        colorSpace=USE_COLOR_SPACE,
-        opacity=STIMULUS_OPACITY,
-        color=CUE_TEXT_COLOR,
-        antialias=CUE_TEXT_ANTIALIAS,
-        alignText="center",
-        anchorHoriz="center",
-        anchorVert="center",
-    )
-    cue_stimuli.append((outer, inner, text))  # Store as tuple
-
-# Example cue_stimuli after loop:
-#   cue_stimuli[0] = (outer_red, inner_red, text_red)   # Red circle at pos 0
-#   cue_stimuli[1] = (outer_green, inner_green, text_green)  # Green at pos 1
-#   cue_stimuli[2] = (outer_blue, inner_blue, text_blue)     # Blue at pos 2
-#   cue_stimuli[3] = (outer_yellow, inner_yellow, text_yellow)  # Yellow at pos 3
+# cue_sprites: one anti-aliased texture per (color id, reward digit or blank), rasterized once here
+#   at the exact pixel size (colored disc, white centre, reward digit), so a cue is a single
+#   textured quad instead of two 200-edge circles and a TextStim.
+#   The pool holds a placed ImageStim for every (position, color, reward or blank): 4 x 4 x 5 in
+#   sessions 2+, 1 x 4 x 5 in session 1 (its single stimulus sits at the center, position index 0).
+#   Color ids: 1=Red, 2=Green, 3=Blue, 4=Yellow. Trials only select handles and draw them.
+cue_sprites = CueSprites(
+    win,
+    [(0, 0)] if SESSION == 1 else positions,
+    cue_colors,
+    REWARD_VALUES,
+    outer_radius_deg=CUE_OUTER_RADIUS_DEG,
+    inner_radius_deg=CUE_INNER_RADIUS_DEG,
+    text_height_deg=CUE_TEXT_HEIGHT_DEG,
+    bg_color=CUE_BG_COLOR,
+    text_color=CUE_TEXT_COLOR,
+    opacity=STIMULUS_OPACITY,
+)
 
 # color_response_squares: 4 colored Rects at bottom (Session 1 only)
 #   Index 0=Red, 1=Green, 2=Blue, 3=Yellow. Maps colors to key positions.
@@ -774,128 +565,34 @@ for i in range(NUM_POSITIONS):
 
 # -----------------------------------------------------------------------------
 # Trial generation: cue-balanced; color/reward sampled randomly. Same logic all sessions.
-# All conditions enumerated BEFORE experiment.
+# All conditions enumerated BEFORE experiment (trial_table.ConditionTable), drawn from a
+# seeded, cached session plan (session_plan.load_or_compile_plan).
 # -----------------------------------------------------------------------------
 session_idx = SESSION - 1
-config_idx = _session_config_idx(SESSION)
-cfg = SESSION_CONFIG[config_idx]
-n_blocks = cfg["n_blocks"]
-n_trials_per_block = cfg["n_per_block"]
-# Total trials = warm-up (4 + 2*(n_blocks-1)) + main (n_blocks * n_trials_per_block)
-n_warmup_first = FIRST_WARMUP_TRIALS
-n_warmup_other = OTHER_WARMUP_TRIALS
-total_warmup = n_warmup_first + (n_blocks - 1) * n_warmup_other
-total_trials = total_warmup + n_blocks * n_trials_per_block
-
-
-def _pool_for_reward_condition(reward_condition: dict, cfg: dict) -> list:
-    """
-    Enumerate all trial variants for a reward-value condition.
-
-    reward_condition comes from cfg["reward_conditions"], including both reward values
-    and the configured CueCondition label to write.
-
-    Output format:
-      {"position_to_color_id": {0..3: color_id 1–4 or None},
-       "position_to_reward": {0..3: reward (1–4) or None}}
-
-    Color is always independent from reward value. Each position gets a color (1–4);
-    reward values are fixed by the condition.
-    """
-    reward_values = tuple(reward_condition["values"])
-    condition_label = reward_condition["label"]
-
-    def make_trial(position_to_color_id: dict, position_to_reward: dict) -> dict:
-        return {
-            "position_to_color_id": position_to_color_id,
-            "position_to_reward": position_to_reward,
-            "reward_condition_values": reward_values,
-            "cue_condition": condition_label,
-            "num_cues": len(reward_values),
-        }
-
-    n_positions = NUM_POSITIONS
-    all_color_ids = list(range(1, n_positions + 1))
-
-    # -------------------------------------------------------------------------
-    # SESSION 1: one stimulus at center. position 0 = center; others unused.
-    # -------------------------------------------------------------------------
-    if cfg["center"]:
-        reward_value = reward_values[0]
-        out = []
-        for color_id in all_color_ids:
-            position_to_color_id = {i: color_id if i == 0 else None for i in range(n_positions)} #there is only one position so take i = 0
-            position_to_reward = {i: reward_value if i == 0 else None for i in range(n_positions)}
-            out.append(make_trial(position_to_color_id, position_to_reward))
-        return out
+_design = session_design(SESSION)  # Total trials = warm-up (4 + 2*(n_blocks-1)) + main (n_blocks * n_trials_per_block)
+cfg = _design["cfg"]
+n_blocks = _design["n_blocks"]
+n_trials_per_block = _design["n_trials_per_block"]
+total_warmup = _design["total_warmup"]
+total_trials = _design["total_trials"]
+
+
+# The plan is compiled once per participant/session/seed and cached, so a restart
+# (e.g. resuming after a crash) sees exactly the same trials and jitter times.
+session_plan = load_or_compile_plan(
+    _out_plan_path,
+    cfg,
+    seed=SESSION_SEED,
+    n_warmup_first=FIRST_WARMUP_TRIALS,
+    n_warmup_other=OTHER_WARMUP_TRIALS,
+    jitter=(TRIAL_START_JITTER_OFFSET, TRIAL_START_JITTER_MEAN, TRIAL_START_JITTER_MAX),
+)
+if START_TRIAL > len(session_plan):
+    raise SystemExit(f"Start at trial must be at most {len(session_plan)} for this session.")
+trial_data_list = session_plan.schedule
 
-    # -------------------------------------------------------------------------
-    # SESSIONS 2–6: n_positions color circles at n_positions positions. 1 or 2 positions show reward.
-    # Single reward [r]: one pos has reward r; colors permuted across all positions.
-    # Dual reward [r1,r2]: two pos have rewards r1,r2; colors permuted across all positions.
-    # This code builds the full combinatorial set of trial variants for each reward condition.
-    # -------------------------------------------------------------------------
-    if len(reward_values) == 1:
-        reward_value = reward_values[0]
-        out = []
-        for reward_pos in range(n_positions):
-            for color_id_i in permutations(all_color_ids):
-                position_to_color_id = {i: color_id_i[i] for i in range(n_positions)}
-                position_to_reward = {i: None for i in range(n_positions)}
-                position_to_reward[reward_pos] = reward_value
-                out.append(make_trial(position_to_color_id, position_to_reward))
-        return out
-
-    reward_a, reward_b = reward_values[0], reward_values[1]
-    out = []
-    for position_a, position_b in permutations(range(n_positions), 2):
-        for reward_at_a, reward_at_b in [(reward_a, reward_b), (reward_b, reward_a)]:
-            for color_id_i in permutations(all_color_ids):
-                position_to_color_id = {i: color_id_i[i] for i in range(n_positions)}
-                position_to_reward = {i: None for i in range(n_positions)}
-                position_to_reward[position_a], position_to_reward[position_b] = reward_at_a, reward_at_b
-                out.append(make_trial(position_to_color_id, position_to_reward))
-    return out
-
-
-def _build_trials(cfg: dict) -> list:
-    """Reward-value-balanced: each condition reps per block. Warm-up trials prepended per block (match paradigm)."""
-    reward_conditions, n_blocks, n_per_block = cfg["reward_conditions"], cfg["n_blocks"], cfg["n_per_block"]
-    reps_per_condition = n_per_block // len(reward_conditions) #how many trials each condition repeats
-    trial_pools = [_pool_for_reward_condition(reward_condition, cfg) for reward_condition in reward_conditions]
-
-    def _make_block():
-        block = [random.choice(pool) for pool in trial_pools for _ in range(reps_per_condition)]
-        random.shuffle(block)
-        return block
-
-    trials = []
-    for block_idx in range(n_blocks):
-        block_number = block_idx + 1
-        n_warmup = FIRST_WARMUP_TRIALS if block_idx == 0 else OTHER_WARMUP_TRIALS
-
-        # Warm-up: full block, take first N (match paradigm blockFunction + del WarmUpBlockData[N:])
-        warmup_block = _make_block()
-        warmup_trials = warmup_block[:n_warmup]
-
-        # Main block
-        main_block = _make_block()
-        # {
-        # "position_to_color_id": {0: 3, 1: 1, 2: 4, 3: 2},
-        # "position_to_reward": {0: None, 1: 1, 2: None, 3: 4},
-        # "reward_condition_values": (4, 1),
-        # "cue_condition": "(4,1)"
-        # }
-
-        for i, t in enumerate(warmup_trials):
-            trials.append({**t, "warm_up": 1, "block": block_number, "trial_in_block": i + 1})
-        for i, t in enumerate(main_block):
-            trials.append({**t, "warm_up": 0, "block": block_number, "trial_in_block": n_warmup + i + 1})
-    return trials
-
-trial_data_list = _build_trials(cfg)
-
-# trial_data_list[i] = {
+# trial_data_list[i] is a read-only TrialView (dict-like):
+# {
 #   "position_to_color_id": {...},
 #   "position_to_reward": {...},
 #   "reward_condition_values": (2, 1),   # or (1,), (4,), etc.
@@ -906,26 +603,42 @@ trial_data_list = _build_trials(cfg)
 # }
 
 
-# Fixation point (match paradigm: visual.Circle, size=FixationSize, FixationPointColor)
-fixation = visual.Circle(
+# Fixation point (match paradigm: disc of diameter FixationSize, FixationPointColor), pre-rasterized like the cues
+fixation = disc_stim(win, FIXATION_SIZE_DEG / 2, FIXATION_POINT_COLOR)
+
+# Feedback texts (match paradigm Feedback1-4: positions, sizes, opacity), rendered to images at session start
+# feedback1: main trial outcome (actual/max reward or TOO SLOW!), largest text - every possible string is
+#   pre-rendered (feedback_outcomes); per trial feedback1 is just set to the matching handle
+_feedback_rewards = [0] + REWARD_VALUES
+feedback_outcomes = TextCache(
     win,
-    size=FIXATION_SIZE_DEG,
-    units=USE_UNITS,
-    fillColor=FIXATION_POINT_COLOR,
-    lineColor=None,
-    pos=(0, 0),
-    edges=CIRCLE_EDGES,
+    [f"{a} / {m}" for a in _feedback_rewards for m in _feedback_rewards],
+    FEEDBACK_LETTER_SIZE_DEG, FEEDBACK1_POS_DEG, FEEDBACK_TEXT_COLOR, opacity=STIMULUS_OPACITY,
 )
-
-# Feedback texts (match paradigm Feedback1-4: positions, sizes, ori, opacity)
-# feedback1: main trial outcome (actual/max reward), largest text, color-coded (red=0, green>0)
-feedback1 = visual.TextStim(win, text="", pos=FEEDBACK1_POS_DEG, height=FEEDBACK_LETTER_SIZE_DEG, color=(1, 1, 1), units=USE_UNITS, opacity=STIMULUS_OPACITY)
+feedback_too_slow = TextCache(
+    win, [TOO_SLOW_TEXT], FEEDBACK_LETTER_SIZE_DEG, FEEDBACK1_POS_DEG, FEEDBACK_TEXT_COLOR, bold=True, opacity=STIMULUS_OPACITY,
+)[TOO_SLOW_TEXT]
+feedback1 = feedback_too_slow
+# feedback2-4 change every trial: composed from cached digit/letter glyphs (no font layout per trial)
+_feedback_atlas = GlyphAtlas(deg2pix(FEEDBACK_LETTER_SIZE_DEG * 0.6, win.monitor))
+_feedback_small_atlas = GlyphAtlas(deg2pix(FEEDBACK_LETTER_SIZE_DEG * 0.2, win.monitor))
 # feedback2: cumulative reward so far
-feedback2 = visual.TextStim(win, text="", pos=FEEDBACK2_POS_DEG, height=FEEDBACK_LETTER_SIZE_DEG * 0.6, color=(1, 1, 1), units=USE_UNITS, opacity=STIMULUS_OPACITY)
+feedback2 = TextLine(win, _feedback_atlas, FEEDBACK2_POS_DEG, FEEDBACK_TEXT_COLOR, opacity=STIMULUS_OPACITY)
 # feedback3: response time in ms
-feedback3 = visual.TextStim(win, text="", pos=FEEDBACK3_POS_DEG, height=FEEDBACK_LETTER_SIZE_DEG * 0.6, color=(1, 1, 1), units=USE_UNITS, opacity=STIMULUS_OPACITY)
+feedback3 = TextLine(win, _feedback_atlas, FEEDBACK3_POS_DEG, FEEDBACK_TEXT_COLOR, opacity=STIMULUS_OPACITY)
 # feedback4: block and trial number (e.g. "Block 1  Trial 3 / 20")
-feedback4 = visual.TextStim(win, text="", pos=FEEDBACK4_POS_DEG, height=FEEDBACK_LETTER_SIZE_DEG * 0.2, color=(1, 1, 1), units=USE_UNITS, opacity=STIMULUS_OPACITY)
+feedback4 = TextLine(win, _feedback_small_atlas, FEEDBACK4_POS_DEG, FEEDBACK_TEXT_COLOR, opacity=STIMULUS_OPACITY)
+
+
+
+def _draw_feedback():
+    """Draw the feedback screen (FLIP C); redrawn on every frame of the feedback phase."""
+    feedback1.draw()
+    feedback2.draw()
+    feedback3.draw()
+    feedback4.draw()
+    fixation.draw()
+
 
 end_text = visual.TextStim(win, text="End of session!\n\n\nContact the Experimenter", color="white", height=INSTRUCTION_LETTER_SIZE_DEG)
 esc_confirm_text = visual.TextStim(win, text="Press ESC again to exit\n\nPress SPACE to continue", color="white", height=INSTRUCTION_LETTER_SIZE_DEG)
@@ -993,21 +706,149 @@ elif RESPONSE_DEVICE == RESPONSE_DEVICE_CEDRUS:
 elif RESPONSE_DEVICE == RESPONSE_DEVICE_SELF_MADE:
     serial_response_box = _open_self_made_response_box()
 
-# Initialize cumulative reward and trial data log
-cum_reward = 0.0
-trial_index = 0
+# Serial input is drained on a background thread; the trial loop waits on its event queue.
+response_reader = None
+if serial_response_box is not None:
+    response_parser = CedrusPacketParser() if RESPONSE_DEVICE == RESPONSE_DEVICE_CEDRUS else SelfMadeLineParser()
+    response_reader = SerialResponseReader(serial_response_box, response_parser, time_fn=core.getTime).start()
+
+# Self-made box: pings sent during feedback keep an offset/drift model of the Arduino clock (clock_sync.py),
+# used to map its RTs to host time with an error bound.
+clock_sync = None
+if response_reader is not None and RESPONSE_DEVICE == RESPONSE_DEVICE_SELF_MADE:
+    clock_sync = ClockSync(response_reader)
+# Cedrus box: it reports no clock, so _c1 round trips during feedback estimate the transfer of the e5 timer reset.
+round_trip = None
+if response_reader is not None and RESPONSE_DEVICE == RESPONSE_DEVICE_CEDRUS:
+    round_trip = RoundTripProbe(response_reader)
+
+# Self-made box link counters (box_protocol.py): per-row differences of the parser's cumulative counts.
+box_link_last = None
+if response_reader is not None and RESPONSE_DEVICE == RESPONSE_DEVICE_SELF_MADE:
+    box_link_last = response_reader.parser.link_stats()
+
+
+def _box_link_since_last_row():
+    """Lost/duplicate/corrupt self-made box frames since the previous call, or None for other devices."""
+    global box_link_last
+    if box_link_last is None:
+        return None
+    now = response_reader.parser.link_stats()
+    delta = {key: now[key] - box_link_last[key] for key in now}
+    box_link_last = now
+    return {
+        "lost": delta["lost"],
+        "duplicates": delta["duplicates"],
+        "errors": delta["crc_errors"] + delta["malformed_lines"],
+    }
+
+# Response window: all input sources are awaited together on an asyncio loop; the first response wins.
+# Response box presses wake the loop from the reader thread; the keyboard is checked every millisecond.
+if response_reader is not None:
+    response_buttons = CEDRUS_BUTTON_TO_COLOR_ID if RESPONSE_DEVICE == RESPONSE_DEVICE_CEDRUS else SELF_MADE_PIN_TO_COLOR_ID
+    response_mux = ResponseMux([
+        SerialBoxSource(response_reader, response_buttons, clock),
+        KeyboardSource(["escape"], clock),
+    ])
+else:
+    response_mux = ResponseMux([KeyboardSource(response_keys + ["escape"], clock)])
+
+# Filled at the cue flip by _on_cue_onset (run via win.callOnFlip): trial-clock onset time and the
+# host-side delay from the flip until the response box sync command was flushed (NaN without a box).
+cue_onset = {"cue_time": 0.0, "sync_write_delay_ms": float("nan")}
+
+
+def _on_cue_onset():
+    """Cue-flip actions: timestamp the onset and reset the response box timer."""
+    flip_host_time = core.getTime()
+    cue_onset["cue_time"] = clock.getTime()
+    cue_onset["sync_write_delay_ms"] = float("nan")
+    if response_reader is not None:
+        _, sync_flushed = response_reader.send_sync()
+        cue_onset["sync_write_delay_ms"] = (sync_flushed - flip_host_time) * 1000
+
+
+# Initialize cumulative reward and trial data log (continued when resuming)
+cum_reward = RESUME_CUM_REWARD
+trial_index = START_TRIAL - 1
 out_dir = _out_dir
 out_dir.mkdir(parents=True, exist_ok=True)
 out_trials_path = _out_trials_path
 out_metadata_path = _out_metadata_path
 print(f"Trial data will be saved to: {out_trials_path}")
 print(f"Metadata will be saved to: {out_metadata_path}")
-first_trial_save = True  # Write header on first trial
+print(f"Columnar trial data will be saved to: {_out_columns_path}")
 completed_normally = True
 exp_start_time_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-csv_columns = None
+# CSV stays open for the session; header and metadata JSON are written with the first row.
+trial_log = TrialLogWriter(
+    out_trials_path,
+    sync_interval=TRIAL_LOG_SYNC_INTERVAL,
+    metadata_path=out_metadata_path,
+    column_store=SessionColumnStore(_out_columns_path),
+    keep_rows=RESUME_KEEP_ROWS,
+    build_metadata=lambda columns: _build_metadata(
+        exp_start_time_str=exp_start_time_str,
+        n_blocks=n_blocks,
+        n_trials_total=total_trials,
+        n_trials_per_block=n_trials_per_block,
+        total_warmup=total_warmup,
+        cfg=cfg,
+        dat_columns=columns,
+    ),
+)
 session_start_perf = time.perf_counter()
 
+
+
+def _prepare_trial(index):
+    """
+    Everything trial `index` needs before its fixation onset: display handles, jitter,
+    scoring tables and the block/trial feedback line. Runs during the previous trial's feedback.
+    """
+    trial_data = trial_data_list[index]
+    position_to_color_id = trial_data["position_to_color_id"]
+    position_to_reward = trial_data["position_to_reward"]
+    block = trial_data["block"]
+    n_in_block = trials_in_block(block, n_trials_per_block)
+    return {
+        "index": index,
+        "trial_data": trial_data,
+        "block": block,
+        "position_to_color_id": position_to_color_id,
+        "position_to_reward": position_to_reward,
+        # colors_shown, max_reward and the scoring tables: color pressed -> position showing it,
+        # and -> reward there (0 if none)
+        **trial_tables(trial_data),
+        # cue_handles: pooled cue stimuli of this trial's display (nothing is moved or re-texted)
+        "cue_handles": cue_sprites.handles(position_to_color_id, position_to_reward),
+        "jitter_s": (
+            DEBUG_CONFIG["trial_duration"] if DEBUG_CONFIG["enabled"]
+            else float(session_plan.jitter_s[index])  # drawn in the session plan
+        ),
+        "block_trial_text": (
+            "Block  " + str(block) + " / " + str(n_blocks)
+            + "     Trial  " + str(trial_data["trial_in_block"]) + " / " + str(n_in_block)
+        ),
+    }
+
+
+# Trial N+1 is prepared and trial N's row is built between the flips of trial N's feedback
+# (IdleWork runs from the feedback frame callback), so fixation and cue only draw and flip.
+feedback_work = IdleWork(FEEDBACK_IDLE_BUDGET_FRAMES * scheduler.frame_s)
+
+
+def _feedback_frame(frame):
+    """Feedback frame callback: clock-sync ping (self-made box) or round-trip ping (Cedrus), then the idle work."""
+    if clock_sync is not None:
+        clock_sync.service(frame)
+    if round_trip is not None:
+        round_trip.service(frame)
+    feedback_work.on_frame(frame)
+
+
+next_trial = None  # Dictionary from _prepare_trial() for the upcoming trial, or None
+
 # =============================================================================
 # TRIAL LOOP
 # =============================================================================
@@ -1017,10 +858,20 @@ session_start_perf = time.perf_counter()
 #   FLIP C: Feedback (reward, RT, etc.)
 prev_block = None
 
-for trial_in_session in range(total_trials):
-    trial_data = trial_data_list[trial_index]
-    current_block = trial_data["block"]
+for trial_in_session in range(START_TRIAL - 1, total_trials):
+    if next_trial is not None and next_trial["index"] == trial_index:
+        prepared = next_trial
+    else:
+        prepared = _prepare_trial(trial_index)  # first trial, or after an escape-skipped trial
+    next_trial = None
+    trial_data = prepared["trial_data"]
+    current_block = prepared["block"]
     if prev_block is not None and current_block != prev_block:
+        trial_log.checkpoint()
+        if trial_log.error is not None:
+            print(f"WARNING: trial log sync failed ({trial_log.error!r}); the rows stay queued and in the journal, retrying")
+            trial_log.error = None
+        scheduler.release()
         block_break_text.setText(
             f"End of Block {prev_block}.\n\n"
             f"Next: Block {current_block} of {n_blocks}.\n\n"
@@ -1033,28 +884,20 @@ for trial_in_session in range(total_trials):
         else:
             event.waitKeys(keyList=['space'])
 
-    position_to_color_id = trial_data["position_to_color_id"]
-    position_to_reward = trial_data["position_to_reward"]
-
-    # colors_shown: list of color IDs displayed this trial
-    colors_shown = [c for c in position_to_color_id.values() if c is not None]
+    position_to_color_id = prepared["position_to_color_id"]
+    position_to_reward = prepared["position_to_reward"]
+    colors_shown = prepared["colors_shown"]
+    cue_handles = prepared["cue_handles"]
 
     # =========================================================================
     # FLIP A: FIXATION SCREEN
     # =========================================================================
     # Presented: Black fixation dot at center (nothing else)
-    # Duration: jittered (offset + exponential(mean), capped at max) - match paradigm
-    if DEBUG_CONFIG["enabled"]:
-        trial_start_jitter_time = DEBUG_CONFIG["trial_duration"]
-    else:
-        trial_start_jitter_time = min(
-            TRIAL_START_JITTER_OFFSET + random.expovariate(1.0 / TRIAL_START_JITTER_MEAN),
-            TRIAL_START_JITTER_MAX,
-        )
+    # Duration: jittered (offset + exponential(mean), capped at max) - match paradigm,
+    #           rounded to whole frames and flipped frame by frame (scheduler)
+    trial_start_jitter_time = prepared["jitter_s"]  # DEBUG substitute when enabled
     trial_start_jitter_time_ms = trial_start_jitter_time * 1000
-    fixation.draw()
-    win.flip()
-    core.wait(trial_start_jitter_time)
+    fixation_phase = scheduler.present(fixation.draw, trial_start_jitter_time, "fixation")
 
     clock.reset()
 
@@ -1063,55 +906,26 @@ for trial_in_session in range(total_trials):
     # =========================================================================
     # FLIP B: CUE/STIMULUS SCREEN (stays until keypress or timeout)
     # =========================================================================
+    # Session 1: single stimulus at center; sessions 2+: 4 color circles at 4 positions
+    # (selected before fixation, see cue_handles). Reward from position_to_reward (None = blank centre).
     fixation.draw()
-    if SESSION == 1:
-        # Session 1 only: draw single stimulus at center
-        color_id = position_to_color_id[0]
-        outer, inner, text = cue_stimuli[color_id - 1]
-        text.setText(str(position_to_reward[0]))
-        orig_pos = outer.pos
-        for stim in (outer, inner, text):
-            stim.setPos((0, 0))
-        outer.draw()
-        inner.draw()
-        text.draw()
-        for stim in (outer, inner, text):
-            stim.setPos(orig_pos)
-    else:
-        # Sessions 2+: 4 color circles at 4 positions. Reward from position_to_reward.
-        for pos_idx in range(4):
-            color_id = position_to_color_id[pos_idx]
-            outer, inner, text = cue_stimuli[color_id - 1]
-            target_pos = positions[pos_idx]
-            r = position_to_reward.get(pos_idx)
-            text.setText(str(r) if r is not None else "")
-            orig_positions = [outer.pos, inner.pos, text.pos]
-            for stim in (outer, inner, text):
-                stim.setPos(target_pos)
-            outer.draw()
-            inner.draw()
-            text.draw()
-            for stim, orig in zip((outer, inner, text), orig_positions):
-                stim.setPos(orig)
+    for cue_stim in cue_handles:
+        cue_stim.draw()
     if show_color_map:
         for rect in color_response_squares:
             rect.draw()
-    if serial_response_box is not None:
-        serial_response_box.reset_input_buffer()
-    win.flip()
-    cue_time = clock.getTime()
-    if RESPONSE_DEVICE == RESPONSE_DEVICE_CEDRUS and serial_response_box is not None:
-        serial_response_box.write(b"e5")
-        serial_response_box.flush()
-    elif RESPONSE_DEVICE == RESPONSE_DEVICE_SELF_MADE and serial_response_box is not None:
-        serial_response_box.write(b"S")
-        serial_response_box.flush()
+    if response_reader is not None:
+        response_reader.clear()
+    # The onset timestamp and the response box timer reset (Cedrus "e5" / self-made "S") run inside
+    # the flip via callOnFlip, so RT origins sit at the flip instead of after flip() returns.
+    cue_phase = scheduler.show(None, "cue", on_onset=_on_cue_onset)  # ends the fixation phase: its achieved duration is now known
+    cue_time = cue_onset["cue_time"]
+    sync_write_delay_ms = cue_onset["sync_write_delay_ms"]
 
     # -------------------------------------------------------------------------
     # Wait for response. Screen stays at FLIP B until response or timeout.
     # -------------------------------------------------------------------------
-    rewards_at_positions = [r for r in position_to_reward.values() if r is not None]
-    max_reward = max(rewards_at_positions) if rewards_at_positions else 0
+    max_reward = prepared["max_reward"]
     actual_reward = 0
     pressed_key = ""
     rt = None
@@ -1119,6 +933,8 @@ for trial_in_session in range(total_trials):
     selected_position = None
     selected_color = None
     response_time = cue_time
+    clock_sync_error_ms = float("nan")
+    host_to_device_delay_ms = float("nan")
 
     if DEBUG_CONFIG["enabled"] and DEBUG_CONFIG["auto_respond"]:
         core.wait(DEBUG_CONFIG["trial_duration"])
@@ -1134,19 +950,15 @@ for trial_in_session in range(total_trials):
         actual_reward = position_to_reward.get(best_pos) or 0
     else:
         event.clearEvents()
-        if RESPONSE_DEVICE == RESPONSE_DEVICE_CEDRUS:
-            cedrus_response = _wait_for_cedrus_response(serial_response_box, clock, MAX_WAIT_TIME)
-            keys = [cedrus_response] if cedrus_response else None
-        elif RESPONSE_DEVICE == RESPONSE_DEVICE_SELF_MADE:
-            self_made_response = _wait_for_self_made_response_box(serial_response_box, clock, MAX_WAIT_TIME)
-            keys = [self_made_response] if self_made_response else None
-        else:
-            keys = event.waitKeys(keyList=response_keys + ['escape'], maxWait=MAX_WAIT_TIME, timeStamped=clock)
+        # (key/button, trial-clock time[, device RT ms]) of the first response, or ("escape", time)
+        response = response_mux.wait(MAX_WAIT_TIME, onset=cue_time)
+        keys = [response[1]] if response else None
 
     if keys and not DEBUG_CONFIG["enabled"]:
         pressed_key = keys[0][0]
         response_time = keys[0][1]
         if pressed_key == 'escape':
+            scheduler.release()
             esc_confirm_text.draw()
             win.flip()
             k = event.waitKeys(keyList=['escape', 'space'])
@@ -1157,20 +969,29 @@ for trial_in_session in range(total_trials):
             continue
         rt_computer_clock = (response_time - cue_time) * 1000
         if RESPONSE_DEVICE == RESPONSE_DEVICE_CEDRUS:
-            rt = keys[0][2]
+            rt = keys[0][2] + sync_write_delay_ms  # device timer, re-referenced to the cue flip
+            host_to_device_delay_ms = round_trip.one_way_ms() if round_trip is not None else float("nan")
+            if not math.isnan(host_to_device_delay_ms):
+                rt += host_to_device_delay_ms  # e5 reached the box about half a round trip after the flush
+                clock_sync_error_ms = host_to_device_delay_ms
             selected_color = CEDRUS_BUTTON_TO_COLOR_ID[pressed_key]
             selected_position = selected_color - 1
         elif RESPONSE_DEVICE == RESPONSE_DEVICE_SELF_MADE:
-            rt = keys[0][2]
+            mapped = clock_sync.map_latency(keys[0][2]) if clock_sync is not None else None
+            if mapped is not None:
+                rt = sync_write_delay_ms + mapped[0]  # device timer on the host clock, from the cue flip
+                clock_sync_error_ms = mapped[1]
+                host_to_device_delay_ms = clock_sync.model.min_rtt_s / 2 * 1000
+            else:
+                rt = keys[0][2] + sync_write_delay_ms  # device timer, re-referenced to the cue flip
             selected_color = SELF_MADE_PIN_TO_COLOR_ID[pressed_key]
             selected_position = selected_color - 1
         else:
             rt = rt_computer_clock
             selected_position = response_keys.index(pressed_key)
             selected_color = selected_position + 1  # color pressed (1–4)
-        # Find position with that color; reward = position_to_reward[that_pos] (0 if None)
-        pos_with_color = next((p for p in range(4) if position_to_color_id.get(p) == selected_color), None)
-        actual_reward = (position_to_reward.get(pos_with_color) or 0) if pos_with_color is not None else 0
+        # Reward at the position showing that color (0 if the color is not shown or has no reward)
+        actual_reward = prepared["reward_by_color"].get(selected_color, 0)
     elif not DEBUG_CONFIG["enabled"]:
         rt = MAX_WAIT_TIME * 1000
         rt_computer_clock = rt
@@ -1186,38 +1007,19 @@ for trial_in_session in range(total_trials):
     # -------------------------------------------------------------------------
     timed_out = (not keys)
     if timed_out:
-        feedback1.setText(TOO_SLOW_TEXT)
-        feedback1.bold = True
+        feedback1 = feedback_too_slow
     else:
-        feedback1.setText(str(actual_reward) + " / " + str(max_reward))  # e.g. "2 / 4"
-        feedback1.bold = False
-    feedback1.setColor(FEEDBACK_TEXT_COLOR)
-    feedback2.setText("%.2f DKK" % cum_reward)  # cumulative reward
-    feedback3.setText(("%5.0f" % rt + " ms") if rt is not None else "")  # RT in ms
-    current_block = trial_data["block"]
-    trial_in_block = trial_data["trial_in_block"]
-    n_in_block = (n_warmup_first + n_trials_per_block) if current_block == 1 else (n_warmup_other + n_trials_per_block)
-    feedback4.setText("Block  " + str(current_block) + " / " + str(n_blocks) + "     Trial  " + str(trial_in_block) + " / " + str(n_in_block))  # block & trial info
-
-    feedback1.draw()
-    feedback2.draw()
-    feedback3.draw()
-    feedback4.draw()
-    fixation.draw()
-    win.flip()
-    core.wait(
-        DEBUG_CONFIG["trial_duration"]
-        if (DEBUG_CONFIG["enabled"] and DEBUG_CONFIG["short_feedback"])
-        else FEEDBACK_WAIT_TIME
-    )
-    end_trial_time = clock.getTime()
-
-    _now = datetime.now()
-    trial_wall_clock_str = _now.strftime("%Y-%m-%d %H:%M:%S") + f".{_now.microsecond // 1000:03d}"
-    session_elapsed_sec = time.perf_counter() - session_start_perf
-
-    # Build paradigm-style trial row
-    row = _build_trial_row(
+        feedback1 = feedback_outcomes[f"{actual_reward} / {max_reward}"]  # e.g. "2 / 4"
+    feedback2.set_text("%.2f DKK" % cum_reward)  # cumulative reward
+    feedback3.set_text(("%5.0f" % rt + " ms") if rt is not None else "")  # RT in ms
+    feedback4.set_text(prepared["block_trial_text"])  # block & trial info
+
+    # Between the feedback flips: build this trial's row (trial-end fields follow below) and
+    # prepare the next trial; anything that did not fit runs in feedback_work.finish().
+    feedback_work.add(
+        "row",
+        build_trial_row,
+        run_columns=RUN_COLUMNS,
         position_to_color_id=position_to_color_id,
         position_to_reward=position_to_reward,
         colors_shown=colors_shown,
@@ -1229,7 +1031,7 @@ for trial_in_session in range(total_trials):
         response_time=response_time,
         rt_ms=rt,
         rt_computer_clock_ms=rt_computer_clock,
-        end_trial_time=end_trial_time,
+        end_trial_time=0.0,
         actual_reward=actual_reward,
         max_reward=max_reward,
         cum_reward=cum_reward,
@@ -1240,33 +1042,62 @@ for trial_in_session in range(total_trials):
         num_cues=trial_data["num_cues"],
         warm_up=trial_data["warm_up"],
         trial_start_jitter_time_ms=trial_start_jitter_time_ms,
+        fixation_phase=fixation_phase,
+        cue_phase=cue_phase,
+        phase_stats={"fixation": scheduler.phase_stats(fixation_phase)},
+        sync_write_delay_ms=sync_write_delay_ms,
+        host_to_device_delay_ms=host_to_device_delay_ms,
+        clock_sync_error_ms=clock_sync_error_ms,
+        device_clock_drift_ppm=clock_sync.drift_ppm() if clock_sync is not None else float("nan"),
+        clock_sync_samples=clock_sync.model.n_samples if clock_sync is not None and clock_sync.model else 0,
+        box_link=_box_link_since_last_row(),
+    )
+    if trial_index + 1 < total_trials:
+        feedback_work.add("next_trial", _prepare_trial, trial_index + 1)
+
+    feedback_phase = scheduler.present(
+        _draw_feedback,
+        DEBUG_CONFIG["trial_duration"]
+        if (DEBUG_CONFIG["enabled"] and DEBUG_CONFIG["short_feedback"])
+        else FEEDBACK_WAIT_TIME,
+        "feedback",
+        on_frame=_feedback_frame,
+    )
+    feedback_results = feedback_work.finish()
+    next_trial = feedback_results.get("next_trial")
+    phase_stats = {phase.phase: scheduler.phase_stats(phase) for phase in (fixation_phase, cue_phase, feedback_phase)}
+    timing_compromised = _timing_compromised(phase_stats, scheduler.frame_s)
+    timing_summary.add(trial_index + 1, phase_stats, timing_compromised)
+    end_trial_time = clock.getTime()
+
+    _now = datetime.now()
+    trial_wall_clock_str = _now.strftime("%Y-%m-%d %H:%M:%S") + f".{_now.microsecond // 1000:03d}"
+    session_elapsed_sec = time.perf_counter() - session_start_perf
+
+    # Paradigm-style trial row built during feedback, completed with the trial-end fields
+    row = feedback_results["row"]
+    finish_trial_row(
+        row,
+        end_trial_time=end_trial_time,
         trial_wall_clock_str=trial_wall_clock_str,
         session_elapsed_sec=session_elapsed_sec,
+        feedback_phase=feedback_phase,
+        feedback_stats=phase_stats["feedback"],
+        timing_compromised=timing_compromised,
     )
+    scheduler.pop_records()
 
-    if csv_columns is None:
-        csv_columns = list(row.keys())
-    with open(out_trials_path, "w" if first_trial_save else "a", encoding="utf-8", newline="") as fp:
-        writer = csv.DictWriter(fp, fieldnames=csv_columns)
-        if first_trial_save:
-            writer.writeheader()
-            metadata = _build_metadata(
-                exp_start_time_str=exp_start_time_str,
-                n_blocks=n_blocks,
-                n_trials_total=total_trials,
-                n_trials_per_block=n_trials_per_block,
-                total_warmup=total_warmup,
-                cfg=cfg,
-                dat_columns=csv_columns,
-            )
-            with open(out_metadata_path, "w", encoding="utf-8") as meta_fp:
-                json.dump(metadata, meta_fp, indent=2, ensure_ascii=False)
-        writer.writerow(row)
-    first_trial_save = False
+    trial_log.write_row(row)
 
     prev_block = current_block
     trial_index += 1
 
+trial_log.update_metadata()  # final session timing summary
+try:
+    trial_log.close()
+except Exception as e:  # Still close the devices and window; the journal is replayed on the next start
+    print(f"ERROR: could not write the trial log ({e!r}); kept {trial_log.journal_path} for recovery")
+
 # =============================================================================
 # FLIP 4: END MESSAGE (only when experiment completes normally)
 # =============================================================================
@@ -1278,6 +1109,9 @@ if completed_normally:
     else:
         event.waitKeys()
 
+response_mux.close()
+if response_reader is not None:
+    response_reader.stop()
 if serial_response_box is not None:
     serial_response_box.close()
 win.close()
@@ -57,6 +57,12 @@ from psychopy.platform_specific import rush
 
 from checkmonitor import * 
 
+# Pooled display captures (exp/src/capture_pool.py): one reusable texture per display name instead of a new BufferImageStim per trial
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'exp', 'src'))
+from capture_pool import CapturePool
+# Gaze responses (exp/src/gaze_response.py): all point target areas hit-tested at once per batch of eye-tracker samples
+from gaze_response import GazeResponse, GazeTargets
+
 import psychopy.info
 
 #-------------------------------------------------
@@ -1205,6 +1211,9 @@ class trialClass:
         
         self.EyeOffsetTime = 0.0
         
+        self.GazeDetectionLatency = float('nan')   # ms from the arrival of the gaze sample inside the target to its detection
+        self.GazeLoopMaxInterval = 0.0             # ms, longest time between two polls of the gaze response loop
+        
         self.Note = ""
 
         self.NumberEyeSamples = 0
@@ -1914,6 +1923,8 @@ f.write('PointTargetTime\t')
 f.write('ColorTargetTime\t')
 f.write('EndTrialTime\t')
 f.write('EyeOffsetTime\t')
+f.write('GazeDetectionLatency\t')
+f.write('GazeLoopMaxInterval\t')
 
 f.write('Note\t')
 
@@ -1967,7 +1978,8 @@ Fixation = visual.Circle(win, size=FixationSize, units=use_unit_type)
 Fixation.setColor(FixationPointColor)
 
 StimList = [Fixation]
-FixationDisplay = visual.BufferImageStim(win, stim=StimList)
+DisplayCaptures = CapturePool(win)
+FixationDisplay = DisplayCaptures.capture("FixationDisplay", StimList)
 
 
 # Set op cues (reward digits/symbols), cue boxes (squares for the cues digits/symbols), cue arrows (lines from cues to targets), cue masks (#), mask cue box (squares for the cue mask).
@@ -2006,6 +2018,11 @@ for i in range(NoTargets):
 
 PointTargetResponse = visual.Circle(win, lineColor=PointTargetEdgeColor, fillColor=PointTargetResponseFillColor, radius=PointTargetSize, units=use_unit_type, edges = 200, lineWidth=3 )
 
+# Point target areas as circles (centers, squared radius) in gaze coordinates, for the gaze response loop of ExperimentType 2
+PointTargetGaze = GazeTargets(PointTargetLocationXY[:NoTargets], PointTargetAreaSize)
+if ExperimentType == 2:
+    PointTargetGazeResponse = GazeResponse(tracker, PointTargetGaze, trialClock.getTime)
+
 
 # Setup the locations of cues and cue masks
 for i in range(NoCueLocations):
@@ -2373,44 +2390,44 @@ for trial in range(Ntrial):
     if ExperimentType == 1:
         
         StimList = [Fixation]+CueArrows+CueBox+Cue
-        CuesDisplay = visual.BufferImageStim(win, stim=StimList)
+        CuesDisplay = DisplayCaptures.capture("CuesDisplay", StimList)
     
         if MaskCuePresent:
             StimList = [Fixation]+CueArrows+MaskCueBox+MaskCue+LetterStim
-            LetterDisplay = visual.BufferImageStim(win, stim=StimList)
+            LetterDisplay = DisplayCaptures.capture("LetterDisplay", StimList)
         
             StimList = [Fixation]+MaskCueBox+MaskCue+Mask
-            MaskDisplay = visual.BufferImageStim(win, stim=StimList)
+            MaskDisplay = DisplayCaptures.capture("MaskDisplay", StimList)
         else:
             StimList = [Fixation]+CueArrows+CueBox+Cue+LetterStim
-            LetterDisplay = visual.BufferImageStim(win, stim=StimList)
+            LetterDisplay = DisplayCaptures.capture("LetterDisplay", StimList)
         
             StimList = [Fixation]+CueBox+Cue+Mask
-            MaskDisplay = visual.BufferImageStim(win, stim=StimList)
+            MaskDisplay = DisplayCaptures.capture("MaskDisplay", StimList)
     
     elif ExperimentType == 2:
         
         StimList = [Fixation]+CueArrows+CueBox+Cue+PointTargetArea+PointTarget
-        CuePointTargetDisplay = visual.BufferImageStim(win, stim=StimList)
+        CuePointTargetDisplay = DisplayCaptures.capture("CuePointTargetDisplay", StimList)
 
         if MaskCuePresent:
             StimList = [Fixation]+CueArrows+MaskCueBox+MaskCue+PointTargetArea+PointTarget
         else:
             StimList = [Fixation]+CueArrows+CueBox+Cue+PointTargetArea+PointTarget
 
-        CueMaskPointTargetDisplay = visual.BufferImageStim(win, stim=StimList)
+        CueMaskPointTargetDisplay = DisplayCaptures.capture("CueMaskPointTargetDisplay", StimList)
         
     elif ExperimentType == 3:
         
         StimList = [Fixation]+CueArrows+ColorTarget+CueBox+Cue+ColorResponseInstruction
-        CueColorTargetDisplay = visual.BufferImageStim(win, stim=StimList)
+        CueColorTargetDisplay = DisplayCaptures.capture("CueColorTargetDisplay", StimList)
 
         if MaskCuePresent:
             StimList = [Fixation]+CueArrows+ColorTarget+MaskCueBox+MaskCue+ColorResponseInstruction
         else:
             StimList = [Fixation]+CueArrows+ColorTarget+CueBox+Cue+ColorResponseInstruction
         
-        CueMaskColorTargetDisplay = visual.BufferImageStim(win, stim=StimList)
+        CueMaskColorTargetDisplay = DisplayCaptures.capture("CueMaskColorTargetDisplay", StimList)
         
     else:
         print('Experiment type invalid')
@@ -2543,7 +2560,8 @@ for trial in range(Ntrial):
         win.flip()
         t_cue = trialClock.getTime()
         
-        tracker.clearEvents()   # Clear all events in the tracker buffer
+        PointTargetGaze.set_drift(DriftCorrectionXY)   # drift correction applied to the target centers, not to every sample
+        PointTargetGazeResponse.start()   # Clear all events in the tracker buffer
 
 
         while not gaze_inside_target_area:  # has the target been reached?
@@ -2559,27 +2577,20 @@ for trial in range(Ntrial):
                 
                 gaze_cue_masked = True
 
-            gpos_target = tracker.getLastGazePosition()
-            valid_gaze_pos = isinstance(gpos_target, (tuple, list))
+            i = PointTargetGazeResponse.poll()   # Every sample since the last poll, drift corrected and tested against all target areas at once
             
-            if valid_gaze_pos:
-                testgpos = list( map(sub, gpos_target, DriftCorrectionXY) )  # correct the recorded fixation position with the drift correction coordinates)
-
-                Data[trial].PointTargetResponse = 0
+            if i >= 0:
                 
-                for i in range(NoTargets):
-                    if PointTargetArea[i].contains(testgpos):
-                        
-                        gaze_inside_target_area = True
-                        
-                        t_pointtarget = trialClock.getTime()  # Store the time reaching the target (for calculating the RT) of the trial
-                        
-                        Data[trial].PointTargetResponse = i+1
-                        Data[trial].CueResponseExpValue = Data[trial].Cues[i]
-                        Data[trial].CueResponseValue = Data[trial].CuesVal[i]
-                        Data[trial].CueResponseRank = Data[trial].CueRanks[i]
-                        
-                        PointTargetResponse.setPos(PointTargetLocationXY[i])    # Location of feedback point set to location of chosen trial
+                gaze_inside_target_area = True
+                
+                t_pointtarget = trialClock.getTime()  # Store the time reaching the target (for calculating the RT) of the trial
+                
+                Data[trial].PointTargetResponse = i+1
+                Data[trial].CueResponseExpValue = Data[trial].Cues[i]
+                Data[trial].CueResponseValue = Data[trial].CuesVal[i]
+                Data[trial].CueResponseRank = Data[trial].CueRanks[i]
+                
+                PointTargetResponse.setPos(PointTargetLocationXY[i])    # Location of feedback point set to location of chosen trial
             
             
             # Check wither time deadline has been exceeded. If it has set the flag for gaze inside target area to True to end trial.
@@ -2591,6 +2602,10 @@ for trial in range(Ntrial):
                     
         t_endtrial=trialClock.getTime()
         
+        gpos_target = PointTargetGazeResponse.hit_gaze or PointTargetGazeResponse.last_gaze   # gaze in the target area, or the last sample at the deadline
+        Data[trial].GazeDetectionLatency = PointTargetGazeResponse.detection_latency_s * 1000
+        Data[trial].GazeLoopMaxInterval = PointTargetGazeResponse.max_poll_interval_s * 1000
+        
         if t_cuemask <= 0.0:
             t_cuemask = t_endtrial  # set time of cue mask to the end of trial time if response happend before the initiation of the cue mask
 
@@ -2604,7 +2619,7 @@ for trial in range(Ntrial):
             core.wait(.5)
 
         # Extract eye movement data - see https://psychopy.org/api/iohub/device/eyetracker_interface/GazePoint_Implementation_Notes.html
-        ioevents = tracker.getEvents()
+        ioevents = PointTargetGazeResponse.finish()   # samples read by the response loop plus those recorded since
         
         j = 0
         timeoffset = 0
@@ -3210,6 +3225,8 @@ for trial in range(Ntrial):
         f.write( '{0}\t'.format(Data[trial].EndTrialTime) )
         
         f.write( '{0}\t'.format(Data[trial].EyeOffsetTime) )
+        f.write( '{0}\t'.format(Data[trial].GazeDetectionLatency) )
+        f.write( '{0}\t'.format(Data[trial].GazeLoopMaxInterval) )
         
         f.write( '{0}\t'.format(Data[trial].Note) )
 
@@ -3261,6 +3278,9 @@ if len(thisKey)>0 and not ExitTrialFlag:
     event.clearEvents()
     event.waitKeys()
 
+print("Display captures: " + str(DisplayCaptures.stats()))
+DisplayCaptures.close()
+
 core.quit()
 
 